@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+# In-flight work is measured in utterances, not requests
+ADMISSION_BUDGET = 400
+# Past this share of the budget new work is scored on the cheap tier
+DEGRADE_AT = 0.75
+# Relative cost of the cheap tier (mood model only, no emotion/spaCy)
+FAST_TIER_COST = 0.4
+PER_CLIENT_LIMIT = 4
+
+class AdmissionRejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Ticket:
+    """Admitted unit of work. Holds its share of the budget until released."""
+    def __init__(self, controller, client: str, cost: float, tier: str,
+                 deadline: Optional[float]):
+        self._controller = controller
+        self.client = client
+        self.cost = cost
+        self.tier = tier
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self._released = False
+
+    @property
+    def detailed(self) -> bool:
+        return self.tier == 'full'
+
+    def expired(self) -> bool:
+        """True once the client's own timeout has passed and it has given up."""
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def release(self, outcome: str = 'completed', utterances: int = 0):
+        if not self._released:
+            self._released = True
+            self._controller._release(self, outcome, utterances)
+
+class AdmissionController:
+    def __init__(
+        self,
+        budget: float = ADMISSION_BUDGET,
+        degrade_at: float = DEGRADE_AT,
+        fast_tier_cost: float = FAST_TIER_COST,
+        per_client_limit: int = PER_CLIENT_LIMIT,
+        allow_degrade: bool = True
+    ):
+        self.budget = budget
+        self.soft_limit = budget * degrade_at
+        self.fast_tier_cost = fast_tier_cost
+        self.per_client_limit = per_client_limit
+        self.allow_degrade = allow_degrade
+        self._lock = threading.Lock()
+        self._in_flight = 0.0
+        self._requests = 0
+        self._per_client = defaultdict(int)
+        self._throughput = None  # EWMA of utterances/sec, drives Retry-After
+        self.counters = defaultdict(int)
+
+    def admit(self, cost: int, client: str, timeout: Optional[float] = None) -> Ticket:
+        with self._lock:
+            if self._per_client.get(client, 0) >= self.per_client_limit:
+                self.counters['rejected_client_limit'] += 1
+                raise AdmissionRejected(429, 'Too many concurrent requests from client',
+                                        self._retry_after(cost))
+
+            # A request larger than the whole budget still runs on an idle server
+            idle = self._requests == 0
+            if idle or self._in_flight + cost <= self.soft_limit:
+                tier, charged = 'full', cost
+            elif self.allow_degrade and self._in_flight + cost * self.fast_tier_cost <= self.budget:
+                tier, charged = 'fast', cost * self.fast_tier_cost
+            elif not self.allow_degrade and self._in_flight + cost <= self.budget:
+                tier, charged = 'full', cost
+            else:
+                self.counters['rejected_overload'] += 1
+                raise AdmissionRejected(503, 'Server overloaded', self._retry_after(cost))
+
+            self._in_flight += charged
+            self._requests += 1
+            self._per_client[client] += 1
+            self.counters[f'admitted_{tier}'] += 1
+            deadline = time.monotonic() + timeout if timeout else None
+            return Ticket(self, client, charged, tier, deadline)
+
+    def _release(self, ticket: Ticket, outcome: str, utterances: int):
+        elapsed = time.monotonic() - ticket.started
+        with self._lock:
+            self._in_flight -= ticket.cost
+            self._requests -= 1
+            self._per_client[ticket.client] -= 1
+            if not self._per_client[ticket.client]:
+                del self._per_client[ticket.client]
+            self.counters[outcome] += 1
+            if utterances and elapsed > 0:
+                rate = utterances / elapsed
+                self._throughput = rate if self._throughput is None else (
+                    0.8 * self._throughput + 0.2 * rate
+                )
+
+    def _retry_after(self, cost: float) -> int:
+        """Seconds until enough in-flight work drains to fit this request."""
+        if not self._throughput:
+            return 5
+        backlog = max(self._in_flight + cost - self.budget, cost)
+        return int(min(60, max(1, backlog / self._throughput)))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'budget_utterances': self.budget,
+                'in_flight_utterances': round(self._in_flight, 1),
+                'in_flight_requests': self._requests,
+                'throughput_utterances_per_sec': round(self._throughput or 0.0, 2),
+                'counters': dict(self.counters)
+            }
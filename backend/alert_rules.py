@@ -0,0 +1,371 @@
+"""Escalation alerts evaluated as utterances are scored.
+
+Rules are declarative (JSON, see DEFAULT_RULES) and each compiles into a
+small sliding-window state machine, one per matching speaker per call.
+Every utterance costs O(1) per rule, so a single process can watch
+thousands of live calls.
+
+  rolling_mean   mean score of the last `turns` utterances below `below`
+  drop           score fell by at least `by` from the best of the last `turns`
+  emotion_count  at least `count` utterances with `emotion` within `within_seconds`
+
+Alerts are edge-triggered: a rule fires when its condition becomes true
+and re-arms once it clears. Fired alerts go to every configured sink.
+The fast scoring tier reports every emotion as neutral, so emotion rules
+only see calls scored on the full tier.
+
+    python alert_rules.py --rules rules.json          # replay stored analyses
+    python alert_rules.py --bench 5000                # per-utterance cost
+"""
+import os
+import re
+import json
+import time
+import queue
+import logging
+import threading
+import urllib.request
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+from timeline import parse_timestamp
+
+# Anyone who isn't the agent
+NOT_AGENT = r'^(?!.*agent)'
+
+DEFAULT_RULES = [
+    {'name': 'negative_trend', 'kind': 'rolling_mean', 'speaker': NOT_AGENT, 'turns': 3, 'below': -0.5},
+    {'name': 'sharp_drop', 'kind': 'drop', 'speaker': NOT_AGENT, 'turns': 4, 'by': 1.0},
+    {'name': 'repeated_anger', 'kind': 'emotion_count', 'speaker': NOT_AGENT,
+     'emotion': 'anger', 'count': 2, 'within_seconds': 60}
+]
+# Live calls with no utterance for this long are forgotten
+LIVE_IDLE_SECONDS = 30 * 60
+WEBHOOK_QUEUE = 1000
+WEBHOOK_TIMEOUT = 5
+
+class RollingMean:
+    def __init__(self, turns: int, below: float):
+        self.turns = turns
+        self.below = below
+        self._scores = deque(maxlen=turns)
+        self._sum = 0.0
+
+    def update(self, seconds: int, mood: Dict) -> Optional[float]:
+        if len(self._scores) == self.turns:
+            self._sum -= self._scores[0]
+        score = float(mood.get('score', 0.0))
+        self._scores.append(score)
+        self._sum += score
+        if len(self._scores) < self.turns:
+            return None
+        mean = self._sum / self.turns
+        return round(mean, 3) if mean < self.below else None
+
+class ScoreDrop:
+    """Sliding max over the last `turns` scores via a monotonic deque."""
+    def __init__(self, turns: int, by: float):
+        self.turns = turns
+        self.by = by
+        self._best = deque()
+        self._position = 0
+
+    def update(self, seconds: int, mood: Dict) -> Optional[float]:
+        score = float(mood.get('score', 0.0))
+        while self._best and self._best[0][0] <= self._position - self.turns:
+            self._best.popleft()
+        drop = self._best[0][1] - score if self._best else 0.0
+        while self._best and self._best[-1][1] <= score:
+            self._best.pop()
+        self._best.append((self._position, score))
+        self._position += 1
+        return round(drop, 3) if drop >= self.by else None
+
+class EmotionCount:
+    def __init__(self, emotion: str, count: int, within_seconds: float):
+        self.emotions = {e.strip().lower() for e in emotion.split(',')}
+        self.count = count
+        self.within_seconds = within_seconds
+        self._times = deque()
+
+    def update(self, seconds: int, mood: Dict) -> Optional[float]:
+        if str(mood.get('emotion', '')).lower() in self.emotions:
+            self._times.append(seconds)
+        while self._times and seconds - self._times[0] > self.within_seconds:
+            self._times.popleft()
+        return len(self._times) if len(self._times) >= self.count else None
+
+KINDS = {
+    'rolling_mean': (RollingMean, {'turns': int, 'below': float}),
+    'drop': (ScoreDrop, {'turns': int, 'by': float}),
+    'emotion_count': (EmotionCount, {'emotion': str, 'count': int, 'within_seconds': float})
+}
+
+class Rule:
+    def __init__(self, spec: Dict):
+        self.name = spec.get('name') or spec.get('kind')
+        self.kind = spec.get('kind')
+        if self.kind not in KINDS:
+            raise ValueError(f"Rule '{self.name}': kind must be one of {list(KINDS)}")
+        window, params = KINDS[self.kind]
+        try:
+            self.params = {key: cast(spec[key]) for key, cast in params.items()}
+        except KeyError as e:
+            raise ValueError(f"Rule '{self.name}': missing {e.args[0]}")
+        except (TypeError, ValueError):
+            raise ValueError(f"Rule '{self.name}': bad parameter")
+        if self.params.get('turns', 1) < 1 or self.params.get('count', 1) < 1:
+            raise ValueError(f"Rule '{self.name}': turns and count must be positive")
+        self._window = window
+        self.speaker = spec.get('speaker') or ''
+        self._speaker = re.compile(self.speaker, re.IGNORECASE)
+        self.severity = spec.get('severity', 'warning')
+
+    def applies_to(self, speaker: str) -> bool:
+        return bool(self._speaker.search(speaker))
+
+    def window(self):
+        return self._window(**self.params)
+
+    def describe(self) -> Dict:
+        return {'name': self.name, 'kind': self.kind, 'speaker': self.speaker,
+                'severity': self.severity, **self.params}
+
+def compile_rules(specs: List[Dict]) -> List[Rule]:
+    rules = [Rule(spec) for spec in specs]
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError('Rule names must be unique')
+    return rules
+
+def load_rules(path: Optional[str] = None) -> List[Rule]:
+    """Rules from a JSON list, or DEFAULT_RULES."""
+    if not path:
+        return compile_rules(DEFAULT_RULES)
+    with open(path) as f:
+        return compile_rules(json.load(f))
+
+class FileSink:
+    """One JSON alert per line."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def emit(self, alert: Dict):
+        line = json.dumps(alert) + '\n'
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line)
+
+class WebhookSink:
+    """POSTs each alert as JSON from a background thread, so a slow receiver
+    never holds up scoring. Alerts are dropped when the queue is full."""
+    def __init__(self, url: str, timeout: float = WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=WEBHOOK_QUEUE)
+        threading.Thread(target=self._deliver, name='alert-webhook', daemon=True).start()
+
+    def emit(self, alert: Dict):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+
+    def _deliver(self):
+        while True:
+            alert = self._queue.get()
+            request = urllib.request.Request(
+                self.url,
+                data=json.dumps(alert).encode(),
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout):
+                    self.sent += 1
+            except OSError as e:
+                self.failed += 1
+                logging.warning(f"Alert webhook failed: {e}")
+
+class LogSink:
+    def emit(self, alert: Dict):
+        logging.warning(f"ALERT {alert['rule']} call={alert['call_id']} "
+                        f"speaker={alert['speaker']} at {alert['timestamp']}: {alert['message']}")
+
+def build_sinks() -> List:
+    """Log always; ALERT_FILE and ALERT_WEBHOOK_URL add a file and a webhook."""
+    sinks = [LogSink()]
+    if os.environ.get('ALERT_FILE'):
+        sinks.append(FileSink(os.environ['ALERT_FILE']))
+    if os.environ.get('ALERT_WEBHOOK_URL'):
+        sinks.append(WebhookSink(os.environ['ALERT_WEBHOOK_URL']))
+    return sinks
+
+class CallMonitor:
+    """Window state of every rule for one call. Not thread-safe; one call's
+    utterances arrive in order."""
+    def __init__(self, engine, call_id: str, meta: Optional[Dict] = None):
+        self.engine = engine
+        self.call_id = call_id
+        self.meta = meta or {}
+        self.position = 0
+        self.last_seen = time.monotonic()
+        self._seconds = 0
+        # speaker -> [(rule, window, active)]
+        self._windows: Dict[str, List[list]] = {}
+
+    def _speaker_windows(self, speaker: str) -> List[list]:
+        windows = self._windows.get(speaker)
+        if windows is None:
+            windows = [[rule, rule.window(), False] for rule in self.engine.rules if rule.applies_to(speaker)]
+            self._windows[speaker] = windows
+        return windows
+
+    def observe(self, speaker: str, timestamp: str, mood: Dict) -> List[Dict]:
+        """Feed one scored utterance; returns the alerts it fired."""
+        parsed = parse_timestamp(timestamp)
+        if parsed is not None:
+            self._seconds = parsed
+        self.last_seen = time.monotonic()
+        fired = []
+        for state in self._speaker_windows(speaker):
+            rule, window, active = state
+            value = window.update(self._seconds, mood)
+            state[2] = value is not None
+            if value is not None and not active:
+                fired.append(self._alert(rule, speaker, timestamp, value))
+        self.position += 1
+        for alert in fired:
+            self.engine.emit(alert)
+        return fired
+
+    def _alert(self, rule: Rule, speaker: str, timestamp: str, value: float) -> Dict:
+        return {
+            'rule': rule.name,
+            'kind': rule.kind,
+            'severity': rule.severity,
+            'call_id': self.call_id,
+            'speaker': speaker,
+            'position': self.position,
+            'timestamp': timestamp,
+            'value': value,
+            'message': self.engine.message(rule, value),
+            'fired_at': datetime.now().isoformat(),
+            **self.meta
+        }
+
+class AlertEngine:
+    def __init__(self, rules: List[Rule], sinks: Optional[List] = None,
+                 idle_seconds: float = LIVE_IDLE_SECONDS):
+        self.rules = rules
+        self.sinks = sinks if sinks is not None else [LogSink()]
+        self.idle_seconds = idle_seconds
+        self.counters = defaultdict(int)
+        self._live = OrderedDict()
+        self._lock = threading.Lock()
+
+    def monitor(self, call_id: Optional[str], **meta) -> CallMonitor:
+        """Monitor for a whole transcript scored in one go. call_id may be
+        left None and set once the transcript's content hash is known."""
+        return CallMonitor(self, call_id, meta)
+
+    def live(self, call_id: str, **meta) -> CallMonitor:
+        """Monitor kept between requests for a call streamed utterance by utterance."""
+        now = time.monotonic()
+        with self._lock:
+            while self._live:
+                oldest = next(iter(self._live.values()))
+                if now - oldest.last_seen < self.idle_seconds:
+                    break
+                self._live.popitem(last=False)
+                self.counters['live_expired'] += 1
+            monitor = self._live.pop(call_id, None) or CallMonitor(self, call_id, meta)
+            # Most recently fed last, so expiry only looks at the front
+            self._live[call_id] = monitor
+            return monitor
+
+    def end(self, call_id: str) -> bool:
+        with self._lock:
+            return self._live.pop(call_id, None) is not None
+
+    def message(self, rule: Rule, value: float) -> str:
+        p = rule.params
+        if rule.kind == 'rolling_mean':
+            return f"mean score {value} over last {p['turns']} turns (below {p['below']})"
+        if rule.kind == 'drop':
+            return f"score dropped by {value} within {p['turns']} turns"
+        return f"{int(value)} x {p['emotion']} within {p['within_seconds']:g}s"
+
+    def emit(self, alert: Dict):
+        self.counters[f"fired_{alert['rule']}"] += 1
+        for sink in self.sinks:
+            try:
+                sink.emit(alert)
+            except Exception as e:
+                logging.error(f"Alert sink {type(sink).__name__} failed: {str(e)}")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            live = len(self._live)
+        webhooks = [s for s in self.sinks if isinstance(s, WebhookSink)]
+        return {
+            'rules': len(self.rules),
+            'live_calls': live,
+            'live_expired': self.counters['live_expired'],
+            'fired': {rule.name: self.counters[f'fired_{rule.name}'] for rule in self.rules},
+            'sinks': [type(s).__name__ for s in self.sinks],
+            'webhook': {
+                'sent': sum(s.sent for s in webhooks),
+                'failed': sum(s.failed for s in webhooks),
+                'dropped': sum(s.dropped for s in webhooks)
+            } if webhooks else None
+        }
+
+def main():
+    import argparse
+    import random
+    from analysis_store import (
+        USER_DATA_DIR, iter_analysis_files, load_analysis, entry_mood, entry_speaker, entry_when
+    )
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', help='JSON rule list (default: built-in rules)')
+    parser.add_argument('--user-id')
+    parser.add_argument('--data-dir', default=USER_DATA_DIR)
+    parser.add_argument('--bench', type=int, metavar='CALLS',
+                        help='time synthetic calls instead of replaying stored ones')
+    args = parser.parse_args()
+    engine = AlertEngine(load_rules(args.rules), sinks=[])
+
+    if args.bench:
+        emotions = ('neutral', 'joy', 'anger', 'sadness')
+        monitors = [engine.live(f'call-{i}') for i in range(args.bench)]
+        started = time.perf_counter()
+        utterances = 0
+        for turn in range(50):
+            for monitor in monitors:
+                speaker = 'Customer' if turn % 2 else 'Sales Agent'
+                mood = {'score': random.uniform(-1, 1), 'emotion': random.choice(emotions)}
+                monitor.observe(speaker, f'[{turn // 6:02d}:{turn * 10 % 60:02d}]', mood)
+                utterances += 1
+        elapsed = time.perf_counter() - started
+        print(f"{args.bench} live calls, {utterances} utterances, {len(engine.rules)} rules: "
+              f"{elapsed / utterances * 1e6:.1f} us per utterance")
+        print(json.dumps(engine.snapshot()['fired'], indent=2))
+        return
+
+    for record in iter_analysis_files(args.data_dir, args.user_id):
+        monitor = engine.monitor(record['analysis_id'])
+        alerts = []
+        for entry in load_analysis(record['path']).get('timeline', []):
+            alerts += monitor.observe(entry_speaker(entry), entry_when(entry), entry_mood(entry))
+        for alert in alerts:
+            print(f"{record['key']}  {alert['timestamp']:>8}  {alert['speaker']:<16} "
+                  f"{alert['rule']}: {alert['message']}")
+    print(json.dumps(engine.snapshot()['fired'], indent=2))
+
+if __name__ == '__main__':
+    main()
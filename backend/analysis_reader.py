@@ -0,0 +1,236 @@
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from analysis_store import (
+    USER_DATA_DIR, iter_analysis_files, find_analysis, load_analysis,
+    analysis_saved_at, analysis_agent, entry_when
+)
+from timeline import timestamps_to_seconds, build_timeline_pyramid, timeline_window
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+# Points a timeline chart request asks for when it doesn't say
+DEFAULT_CHART_POINTS = 2000
+# Parsed analyses kept in memory, keyed by path and validated by mtime/size
+PARSED_CACHE_ENTRIES = 16
+
+def encode_cursor(record: Dict) -> str:
+    raw = json.dumps([record['mtime'], record['analysis_id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        mtime, analysis_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return float(mtime), str(analysis_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def list_analyses(
+    user_id,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    base_dir: str = USER_DATA_DIR
+) -> Tuple[List[Dict], Optional[str]]:
+    """Newest first. The cursor is the (mtime, id) of the last item returned,
+    so pages stay stable while new analyses are being saved."""
+    records = sorted(
+        iter_analysis_files(base_dir, user_id),
+        key=lambda r: (r['mtime'], r['analysis_id']),
+        reverse=True
+    )
+    if cursor:
+        position = decode_cursor(cursor)
+        records = [r for r in records if (r['mtime'], r['analysis_id']) < position]
+    page = records[:limit]
+    items = []
+    for record in page:
+        saved_at = analysis_saved_at(record['analysis_id'])
+        items.append({
+            'analysis_id': record['analysis_id'],
+            'saved_at': saved_at.isoformat() if saved_at else None,
+            'agent': analysis_agent(record['analysis_id']),
+            'size': record['size'],
+            'etag': record_etag(record)
+        })
+    next_cursor = encode_cursor(page[-1]) if len(records) > limit else None
+    return items, next_cursor
+
+def record_etag(record: Dict, variant: str = '') -> str:
+    """Strong validator from the file's mtime and size, plus the requested
+    projection/slice so each representation has its own tag."""
+    digest = hashlib.sha1(
+        f"{record['key']}:{record['mtime']}:{record['size']}:{variant}".encode()
+    ).hexdigest()[:20]
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+class ParsedAnalysisCache:
+    """Small LRU of parsed analyses plus their timeline seconds, so paging
+    through one large analysis parses the file once. Timeline pyramids are
+    built on the first chart request and kept alongside."""
+    def __init__(self, max_entries: int = PARSED_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._pyramids: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, record: Dict) -> Tuple[Dict, np.ndarray]:
+        version = (record['mtime'], record['size'])
+        with self._lock:
+            cached = self._entries.get(record['path'])
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(record['path'])
+                return cached[1], cached[2]
+        analysis = load_analysis(record['path'])
+        seconds = timestamps_to_seconds([entry_when(e) for e in analysis.get('timeline', [])])
+        with self._lock:
+            self._entries[record['path']] = (version, analysis, seconds)
+            self._entries.move_to_end(record['path'])
+            while len(self._entries) > self.max_entries:
+                path, _ = self._entries.popitem(last=False)
+                self._pyramids.pop(path, None)
+        return analysis, seconds
+
+    def pyramid(self, record: Dict) -> Dict:
+        version = (record['mtime'], record['size'])
+        analysis, seconds = self.get(record)
+        with self._lock:
+            cached = self._pyramids.get(record['path'])
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        pyramid = build_timeline_pyramid(analysis.get('timeline', []), seconds=seconds)
+        with self._lock:
+            if record['path'] in self._entries:
+                self._pyramids[record['path']] = (version, pyramid)
+        return pyramid
+
+class AnalysisQuery:
+    """Field projection and timeline slice requested for one analysis.
+
+    fields       comma-separated top-level keys (default: all)
+    start, end   timeline index range, end exclusive
+    from_s, to_s timeline time range in seconds, to_s inclusive
+    """
+    def __init__(
+        self,
+        fields: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        from_s: Optional[str] = None,
+        to_s: Optional[str] = None
+    ):
+        self.fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        try:
+            self.start = int(start) if start else None
+            self.end = int(end) if end else None
+            self.from_s = float(from_s) if from_s else None
+            self.to_s = float(to_s) if to_s else None
+        except ValueError:
+            raise ValueError('Timeline bounds must be numbers')
+
+    @property
+    def variant(self) -> str:
+        return json.dumps([self.fields, self.start, self.end, self.from_s, self.to_s])
+
+    def apply(self, analysis: Dict, seconds: np.ndarray) -> Dict:
+        keys = self.fields if self.fields is not None else list(analysis)
+        payload = {key: analysis[key] for key in keys if key in analysis}
+        if 'timeline' not in payload:
+            return payload
+
+        timeline = analysis['timeline']
+        positions = np.arange(len(timeline))
+        mask = np.ones(len(timeline), dtype=bool)
+        if self.start is not None:
+            mask &= positions >= self.start
+        if self.end is not None:
+            mask &= positions < self.end
+        if self.from_s is not None:
+            mask &= seconds >= self.from_s
+        if self.to_s is not None:
+            mask &= seconds <= self.to_s
+        selected = np.flatnonzero(mask)
+        if len(selected) != len(timeline):
+            payload['timeline'] = [timeline[i] for i in selected]
+        payload['timeline_slice'] = {
+            'total': len(timeline),
+            'returned': len(selected),
+            'start': int(selected[0]) if len(selected) else None,
+            'end': int(selected[-1]) + 1 if len(selected) else None
+        }
+        return payload
+
+def fetch_analysis(
+    user_id,
+    analysis_id: str,
+    query: AnalysisQuery,
+    cache: ParsedAnalysisCache,
+    if_none_match: Optional[str] = None,
+    base_dir: str = USER_DATA_DIR
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """(payload, etag). payload is None when the client's copy is current;
+    both are None when the analysis does not exist."""
+    record = find_analysis(user_id, analysis_id, base_dir)
+    if record is None:
+        return None, None
+    etag = record_etag(record, query.variant)
+    if etag_matches(if_none_match, etag):
+        return None, etag
+    analysis, seconds = cache.get(record)
+    return query.apply(analysis, seconds), etag
+
+class TimelineQuery:
+    """One chart resolution of a stored analysis' timeline.
+
+    level        raw, lttb, a bucket size in seconds, or auto (default)
+    from_s, to_s window in seconds, inclusive
+    max_points   budget for auto: the finest resolution that fits it
+    """
+    def __init__(
+        self,
+        level: Optional[str] = None,
+        from_s: Optional[str] = None,
+        to_s: Optional[str] = None,
+        max_points: Optional[str] = None
+    ):
+        self.level = level or 'auto'
+        try:
+            self.from_s = float(from_s) if from_s else None
+            self.to_s = float(to_s) if to_s else None
+            self.max_points = max(1, int(max_points)) if max_points else DEFAULT_CHART_POINTS
+        except ValueError:
+            raise ValueError('Timeline bounds must be numbers')
+
+    @property
+    def variant(self) -> str:
+        return json.dumps(['timeline', self.level, self.from_s, self.to_s, self.max_points])
+
+def fetch_timeline_window(
+    user_id,
+    analysis_id: str,
+    query: TimelineQuery,
+    cache: ParsedAnalysisCache,
+    if_none_match: Optional[str] = None,
+    base_dir: str = USER_DATA_DIR
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """Like fetch_analysis, for one window of the timeline pyramid. Raises
+    ValueError for an unknown level."""
+    record = find_analysis(user_id, analysis_id, base_dir)
+    if record is None:
+        return None, None
+    etag = record_etag(record, query.variant)
+    if etag_matches(if_none_match, etag):
+        return None, etag
+    window = timeline_window(
+        cache.pyramid(record), query.from_s, query.to_s, query.level, query.max_points
+    )
+    return {'analysis_id': analysis_id, **window}, etag
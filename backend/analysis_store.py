@@ -0,0 +1,93 @@
+import os
+import re
+import json
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+# Same layout the frontend's FileStorage writes:
+#   <USER_DATA_DIR>/<user_id>/<stem>.txt
+#   <USER_DATA_DIR>/<user_id>/analysis/<stem>_analysis.json
+# DATA_DIR is shared with the frontend: start.sh exports <repo>/data before
+# starting each service from its own directory, the images use /app/data.
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+USER_DATA_DIR = os.environ.get('USER_DATA_DIR', os.path.join(DATA_DIR, 'user_data'))
+INDEX_DIR = os.environ.get('INDEX_DIR', os.path.join(DATA_DIR, 'index'))
+ANALYSIS_SUFFIX = '_analysis.json'
+
+_SAVED_AT = re.compile(r'^(\d{8}_\d{6})_')
+
+def analysis_key(user_id, analysis_id: str) -> str:
+    return f"{user_id}/{analysis_id}"
+
+def iter_analysis_files(base_dir: str = USER_DATA_DIR, user_id=None) -> Iterator[Dict]:
+    """Yield one record per stored analysis without opening the files."""
+    if not os.path.isdir(base_dir):
+        return
+    users = [str(user_id)] if user_id is not None else sorted(os.listdir(base_dir))
+    for user in users:
+        analysis_dir = os.path.join(base_dir, user, 'analysis')
+        if not os.path.isdir(analysis_dir):
+            continue
+        with os.scandir(analysis_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(ANALYSIS_SUFFIX) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                analysis_id = entry.name[:-len(ANALYSIS_SUFFIX)]
+                yield {
+                    'user_id': user,
+                    'analysis_id': analysis_id,
+                    'key': analysis_key(user, analysis_id),
+                    'path': entry.path,
+                    'mtime': stat.st_mtime,
+                    'size': stat.st_size
+                }
+
+def find_analysis(user_id, analysis_id: str, base_dir: str = USER_DATA_DIR) -> Optional[Dict]:
+    if os.sep in analysis_id or analysis_id.startswith('.'):
+        return None
+    path = os.path.join(base_dir, str(user_id), 'analysis', analysis_id + ANALYSIS_SUFFIX)
+    if not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    return {
+        'user_id': str(user_id),
+        'analysis_id': analysis_id,
+        'key': analysis_key(user_id, analysis_id),
+        'path': path,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size
+    }
+
+def load_analysis(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+def transcript_path(record: Dict, base_dir: str = USER_DATA_DIR) -> str:
+    """Raw transcript the analysis was produced from."""
+    return os.path.join(base_dir, record['user_id'], record['analysis_id'] + '.txt')
+
+def analysis_saved_at(analysis_id: str) -> Optional[datetime]:
+    """Upload time from the '%Y%m%d_%H%M%S_' prefix FileStorage adds."""
+    match = _SAVED_AT.match(analysis_id)
+    return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S') if match else None
+
+def analysis_agent(analysis_id: str) -> Optional[str]:
+    """Agent email from dialer exports named '<ts>_<agent email>__<team>__...'."""
+    name = _SAVED_AT.sub('', analysis_id)
+    agent = name.split('__', 1)[0]
+    return agent if '@' in agent else None
+
+# Stored analyses come either straight from the backend (mood/when/who) or
+# after the frontend renamed keys (sentiment/timestamp/speaker).
+def entry_mood(entry: Dict) -> Dict:
+    return entry.get('mood') or entry.get('sentiment') or {}
+
+def entry_speaker(entry: Dict) -> str:
+    return entry.get('who', entry.get('speaker', 'Unknown'))
+
+def entry_when(entry: Dict) -> str:
+    return entry.get('when', entry.get('timestamp', ''))
+
+def overall_mood(analysis: Dict) -> Dict:
+    return analysis.get('overall_mood') or analysis.get('overall_sentiment') or {}
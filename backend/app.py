@@ -1,12 +1,32 @@
 from collections import defaultdict
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import numpy as np
-from sentiment_analyzer import ConversationAnalyzer
+from sentiment_analyzer import ConversationAnalyzer, EMBEDDING_DIM, aggregate_results
+from timeline import pyramid_descriptor
+from vector_index import CallVectorIndex
+from phrase_index import PhraseIndex, analysis_phrases
+from analysis_store import analysis_key
+from analysis_reader import (
+    AnalysisQuery, TimelineQuery, ParsedAnalysisCache, list_analyses, fetch_analysis,
+    fetch_timeline_window, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+)
+from export import TABLES, ExportFilter, parse_date, stream_export, export_filename
+from response_shaping import VIEWS, shape_results, json_response, encode_json
+from profiling import current_profile, profiled, profile_authorized, save_profile
+from admission import AdmissionController, AdmissionRejected, Ticket, ADMISSION_BUDGET, PER_CLIENT_LIMIT
+from scheduler import FairScheduler, Job, BATCH_UTTERANCES, PRIORITY_CLASSES, parse_weights
+from alert_rules import AlertEngine, CallMonitor, load_rules, build_sinks
+from rescore import Rescorer, pipeline_versions
+from dynamics import compute_dynamics
+from tuning import setting
+from ingest import IngestError, read_request, read_batch, read_stream
+import hashlib
 import logging
+import threading
 import time
 from datetime import datetime
 import os
+from typing import Dict, List, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(
@@ -15,7 +35,74 @@ logging.basicConfig(
 )
 
 app = Flask(__name__)
-analyzer = ConversationAnalyzer(debug_mode=True)
+if os.environ.get('ANALYZER_STUB') == '1':
+    # Model-free scoring for load tests (see loadtest.py)
+    from stub_analyzer import StubConversationAnalyzer
+    analyzer = StubConversationAnalyzer(
+        latency_ms=float(os.environ.get('STUB_LATENCY_MS', 20)),
+        debug_mode=True
+    )
+else:
+    analyzer = ConversationAnalyzer(
+        debug_mode=True,
+        memory_budget_mb=float(os.environ.get('ANALYZER_MEMORY_BUDGET_MB', 0)) or None,
+        idle_unload_seconds=float(os.environ.get('ANALYZER_IDLE_UNLOAD_SECONDS', 0)) or None
+    )
+    # Models load on the first request by default; ANALYZER_PRELOAD=1 warms
+    # them in the background so /healthz still answers straight away.
+    # Compiled inference always warms up first; /readyz waits for it.
+    if os.environ.get('ANALYZER_PRELOAD') == '1' or analyzer.compiled:
+        analyzer.preload_in_background()
+
+# Timelines at least this long are charted from a multi-resolution pyramid,
+# served per window by /analyses/<user>/<id>/timeline once the analysis is stored
+PYRAMID_MIN_POINTS = int(os.environ.get('TIMELINE_PYRAMID_MIN_POINTS', 200))
+
+# Admission control: in-flight work is budgeted in utterances
+admission = AdmissionController(
+    budget=float(os.environ.get('ADMISSION_BUDGET_UTTERANCES', ADMISSION_BUDGET)),
+    per_client_limit=int(os.environ.get('ADMISSION_PER_CLIENT', PER_CLIENT_LIMIT)),
+    allow_degrade=os.environ.get('ADMISSION_DEGRADE', '1') == '1'
+)
+DEFAULT_CLIENT_TIMEOUT = float(os.environ.get('DEFAULT_CLIENT_TIMEOUT', 120))
+
+# Inference turns by priority class, fair-shared between users within a class.
+# One slot by default: the analyzer is shared and concurrent forward passes
+# only contend for the same cores. autotune.py measures the best count per host.
+scheduler = FairScheduler(
+    slots=setting('scheduler_slots', 1),
+    weights=parse_weights(os.environ.get('SCHEDULER_USER_WEIGHTS', ''))
+)
+
+# Escalation rules evaluated per utterance; ALERT_RULES_FILE overrides the defaults
+alert_engine = AlertEngine(load_rules(os.environ.get('ALERT_RULES_FILE')), build_sinks())
+# Utterances one live-call request may carry
+LIVE_MAX_UTTERANCES = int(os.environ.get('LIVE_MAX_UTTERANCES', 64))
+
+# Corpus TF-IDF over key phrases of stored analyses, rescanned in the background
+# so /analyze ranks against calls saved since startup
+phrase_index = PhraseIndex(
+    refresh_interval=float(os.environ.get('PHRASE_INDEX_REFRESH_SECONDS', 60))
+)
+threading.Thread(target=phrase_index.run_forever, name='phrase-index', daemon=True).start()
+
+# Stored analyses scored by older models/lexicons are rescored stage by stage
+# as backfill work; off unless RESCORE_INTERVAL_SECONDS is set
+rescorer = Rescorer(
+    analyzer, scheduler,
+    include_legacy=os.environ.get('RESCORE_LEGACY') == '1',
+    phrase_index=phrase_index
+)
+RESCORE_INTERVAL = float(os.environ.get('RESCORE_INTERVAL_SECONDS', 0))
+if RESCORE_INTERVAL > 0:
+    threading.Thread(target=rescorer.run_forever, args=(RESCORE_INTERVAL,), daemon=True).start()
+
+# Parsed stored analyses, so paging through a long timeline parses it once
+parsed_analyses = ParsedAnalysisCache()
+
+# Utterance/call embeddings for similarity search, stored locally
+EMBEDDINGS_ENABLED = os.environ.get('EMBEDDINGS_ENABLED', '1') == '1'
+vector_index = CallVectorIndex(EMBEDDING_DIM) if EMBEDDINGS_ENABLED else None
 
 # Configure CORS with all allowed origins
 ALLOWED_ORIGINS = [
@@ -29,7 +116,7 @@ ALLOWED_ORIGINS = [
 CORS(app, 
      resources={r"/*": {
          "origins": "*",  # Allow all origins temporarily
-         "methods": ["GET", "POST", "OPTIONS"],
+         "methods": ["GET", "POST", "DELETE", "OPTIONS"],
          "allow_headers": ["Content-Type", "Authorization", "Accept"],
          "expose_headers": ["Content-Type", "Authorization"],
          "supports_credentials": True
@@ -51,47 +138,78 @@ def health_check():
         'timestamp': datetime.now().isoformat()
     }), 200
 
-@app.route('/analyze', methods=['POST', 'OPTIONS'])
-def analyze_conversation():
-    """Main endpoint for analyzing conversation transcripts"""
-    # Handle preflight requests
-    if request.method == 'OPTIONS':
-        response = app.make_default_options_response()
-        return response
+def readiness_payload() -> Tuple[Dict, int]:
+    readiness = analyzer.readiness()
+    payload = {
+        'status': readiness['status'],
+        'compiled': analyzer.compiled,
+        'timestamp': datetime.now().isoformat()
+    }
+    if readiness['error']:
+        payload['error'] = readiness['error']
+    return payload, 200 if readiness['status'] == 'ready' else 503
 
-    start_time = time.time()
-    try:
-        logging.info(f"Received analysis request from: {request.remote_addr}")
-        data = request.get_json()
-        if not data or 'transcript' not in data:
-            return jsonify({
-                'error': 'Missing transcript data',
-                'example_format': {
-                    'transcript': [
-                        {'speaker': 'Agent', 'text': 'Hello', 'timestamp': '[00:00]'}
-                    ]
-                }
-            }), 400
+@app.route('/readyz', methods=['GET'])
+def readiness_check():
+    """Ready once models that must warm up before serving have done so"""
+    payload, status = readiness_payload()
+    return jsonify(payload), status
 
-        results = {
-            'overall_mood': {'score': 0.0, 'confidence': 0.0},
-            'speaker_analysis': {},
-            'topics': defaultdict(float),
-            'timeline': []
-        }
+class AnalysisCancelled(Exception):
+    """The client's deadline passed mid-analysis, nobody is waiting for the result."""
 
-        all_moods = []
-        for entry in data['transcript']:
-            if not entry.get('text', '').strip():
-                continue
-                
-            text = analyzer.clean_chat(entry['text'])
+def build_analysis(
+    transcript: List[Dict],
+    ticket: Optional[Ticket] = None,
+    job: Optional[Job] = None,
+    alerts: Optional[CallMonitor] = None
+) -> Dict:
+    """Score every utterance and aggregate. Utterances are scored a batch
+    at a time; with a job, each batch waits for its scheduler turn. Checks
+    the ticket between batches and feeds each scored utterance to the
+    alert monitor, which takes the call's content hash as its id unless
+    the client named the call."""
+    detailed = ticket.detailed if ticket is not None else True
+    profile = current_profile()
+    results = {
+        'overall_mood': {'score': 0.0, 'confidence': 0.0},
+        'speaker_analysis': {},
+        'topics': defaultdict(float),
+        'timeline': [],
+        'alerts': []
+    }
+
+    all_moods = []
+    embed_inputs = []
+    entries = [entry for entry in transcript if entry.get('text', '').strip()]
+    with profile.stage('regex_cleaning'):
+        cleaned = [analyzer.clean_chat(entry['text']) for entry in entries]
+    if cleaned:
+        # The id the vector index and search know the call by
+        results['call_id'] = hashlib.sha1('\n'.join(cleaned).encode()).hexdigest()
+        if alerts is not None and alerts.call_id is None:
+            alerts.call_id = results['call_id']
+    for start in range(0, len(entries), BATCH_UTTERANCES):
+        if ticket is not None and ticket.expired():
+            raise AnalysisCancelled()
+        if job is not None:
+            with profile.stage('queue_wait'):
+                # Only fails once the client deadline has passed in the queue
+                if not scheduler.next_turn(job):
+                    raise AnalysisCancelled()
+        
+        batch = entries[start:start + BATCH_UTTERANCES]
+        texts = cleaned[start:start + BATCH_UTTERANCES]
+        # One scheduler turn's utterances are tokenized and scored together
+        moods = analyzer.get_speaker_moods(texts, detailed=detailed)
+        
+        for entry, text, mood_data in zip(batch, texts, moods):
             speaker = entry.get('speaker', 'Unknown')
             timestamp = entry.get('timestamp', '')
             
             try:
-                mood_data = analyzer.get_speaker_mood(text)
-                topic_data = analyzer.find_topics(text)
+                with profile.stage('topics'):
+                    topic_data = analyzer.find_topics(text)
             except Exception as e:
                 logging.error(f"Analysis error for text: {text[:100]}... Error: {str(e)}")
                 continue
@@ -116,47 +234,526 @@ def analyze_conversation():
             for topic, score in topic_data.items():
                 results['topics'][topic] += score
             
+            if alerts is not None:
+                results['alerts'] += alerts.observe(speaker, timestamp, mood_data)
+            
             all_moods.append(mood_data)
+            embed_inputs.append({'text': text, 'speaker': speaker, 'when': timestamp})
+    
+    if job is not None:
+        scheduler.release(job)
 
-        if all_moods:
-            results['overall_mood'] = {
-                'score': round(np.mean([m['score'] for m in all_moods]), 2),
-                'confidence': round(np.mean([m['confidence'] for m in all_moods]), 2)
-            }
+    with profile.stage('aggregation'):
+        aggregate_results(results, all_moods)
+    
+    with profile.stage('dynamics'):
+        results['dynamics'] = compute_dynamics(
+            [u['when'] for u in embed_inputs],
+            [u['speaker'] for u in embed_inputs],
+            [u['text'] for u in embed_inputs]
+        )
+    
+    with profile.stage('phrase_ranking'):
+        results['ranked_phrases'] = phrase_index.rank(analysis_phrases(results))
+    
+    if embed_inputs and vector_index is not None and detailed:
+        with profile.stage('embedding'):
+            index_call_embeddings(results['call_id'], embed_inputs)
+    
+    if len(results['timeline']) >= PYRAMID_MIN_POINTS:
+        with profile.stage('timeline_pyramid'):
+            results['timeline_pyramid'] = pyramid_descriptor(results['timeline'])
+    
+    return results
+
+def index_call_embeddings(call_id: str, utterances: List[Dict]):
+    """Embedding stage: add a call's utterances to the local vector index."""
+    if vector_index.has_call(call_id):
+        return
+    try:
+        vectors = analyzer.embed([u['text'] for u in utterances])
+        vector_index.add_call(
+            call_id,
+            vectors,
+            [{'index': i, **u} for i, u in enumerate(utterances)]
+        )
+    except Exception as e:
+        logging.error(f"Embedding failed for call {call_id}: {str(e)}")
+
+def finish_profile(session, payload: Dict) -> Dict:
+    """Time JSON encoding of the payload, then save the profile to PROFILE_DIR."""
+    with session.stages.stage('json_encoding'):
+        encode_json(payload)
+    report = session.report()
+    path = save_profile(report)
+    logging.info(f"Saved profile to {path}")
+    # Collapsed stacks stay in the saved file only
+    report['sampling'] = {k: v for k, v in (report['sampling'] or {}).items() if k != 'collapsed'}
+    return {'path': path, **report}
+
+def _client_timeout(headers) -> Optional[float]:
+    """Client-declared timeout; work still running past it is abandoned."""
+    try:
+        return float(headers['X-Request-Timeout'])
+    except (KeyError, ValueError):
+        return DEFAULT_CLIENT_TIMEOUT
+
+def rejection_payload(rejection: AdmissionRejected) -> Dict:
+    return {
+        'error': rejection.reason,
+        'status': 'rejected',
+        'retry_after': rejection.retry_after,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def cancelled_payload() -> Dict:
+    return {
+        'error': 'Client deadline exceeded',
+        'status': 'cancelled',
+        'timestamp': datetime.now().isoformat()
+    }
+
+def _rejection_response(rejection: AdmissionRejected):
+    response = jsonify(rejection_payload(rejection))
+    response.status_code = rejection.status
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+def metrics_payload() -> Dict:
+    return {
+        'admission': admission.snapshot(),
+        'scheduler': scheduler.snapshot(),
+        'alerts': alert_engine.snapshot(),
+        'rescore': rescorer.snapshot(),
+        'memory': analyzer.memory_report(),
+        'inference': analyzer.inference_report()
+    }
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Admission counters, in-flight gauges, queue waits per priority and model memory"""
+    return jsonify(metrics_payload()), 200
+
+def _top_k() -> int:
+    try:
+        return max(1, min(100, int(request.args.get('k', 10))))
+    except ValueError:
+        return 10
+
+@app.route('/phrases/<user_id>/<analysis_id>', methods=['GET'])
+def analysis_phrases_endpoint(user_id, analysis_id):
+    """Top TF-IDF phrases of one stored analysis"""
+    phrase_index.refresh(force=request.args.get('refresh') == '1')
+    phrases = phrase_index.top_phrases(analysis_key(user_id, analysis_id), _top_k())
+    if phrases is None:
+        return jsonify({'error': 'Analysis not indexed'}), 404
+    return jsonify({'analysis_id': analysis_id, 'phrases': phrases}), 200
+
+@app.route('/phrases/agents/<agent>', methods=['GET'])
+def agent_phrases_endpoint(agent):
+    """Top TF-IDF phrases across all of an agent's calls"""
+    phrase_index.refresh(force=request.args.get('refresh') == '1')
+    phrases = phrase_index.agent_top_phrases(agent, _top_k())
+    if phrases is None:
+        return jsonify({'error': 'Unknown agent'}), 404
+    return jsonify({'agent': agent, 'phrases': phrases, 'index': phrase_index.stats()}), 200
+
+@app.route('/analyses/<user_id>', methods=['GET'])
+def list_user_analyses(user_id):
+    """A user's stored analyses, newest first: ?limit=&cursor="""
+    if user_id.startswith('.'):
+        return jsonify({'error': 'Invalid user id'}), 400
+    try:
+        limit = max(1, min(MAX_PAGE_SIZE, int(request.args.get('limit', DEFAULT_PAGE_SIZE))))
+        items, next_cursor = list_analyses(user_id, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'analyses': items, 'next_cursor': next_cursor}), 200
+
+@app.route('/analyses/<user_id>/<analysis_id>', methods=['GET'])
+def get_user_analysis(user_id, analysis_id):
+    """One stored analysis with optional projection and timeline slice:
+    ?fields=overall_mood,timeline&start=0&end=200 or &from=60&to=300 (seconds).
+    Honours If-None-Match."""
+    if user_id.startswith('.'):
+        return jsonify({'error': 'Invalid user id'}), 400
+    try:
+        query = AnalysisQuery(
+            fields=request.args.get('fields'),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            from_s=request.args.get('from'),
+            to_s=request.args.get('to')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    payload, etag = fetch_analysis(
+        user_id, analysis_id, query, parsed_analyses,
+        if_none_match=request.headers.get('If-None-Match')
+    )
+    if etag is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    if payload is None:
+        response = Response(status=304)
+    else:
+        response = json_response(payload, accept_encoding=request.headers.get('Accept-Encoding', ''))
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/analyses/<user_id>/<analysis_id>/timeline', methods=['GET'])
+def get_analysis_timeline(user_id, analysis_id):
+    """One chart resolution of a stored analysis' timeline, per speaker:
+    ?level=raw|lttb|<bucket seconds>|auto&from=60&to=300&max_points=2000.
+    Honours If-None-Match."""
+    if user_id.startswith('.'):
+        return jsonify({'error': 'Invalid user id'}), 400
+    try:
+        query = TimelineQuery(
+            level=request.args.get('level'),
+            from_s=request.args.get('from'),
+            to_s=request.args.get('to'),
+            max_points=request.args.get('max_points')
+        )
+        payload, etag = fetch_timeline_window(
+            user_id, analysis_id, query, parsed_analyses,
+            if_none_match=request.headers.get('If-None-Match')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if etag is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    if payload is None:
+        response = Response(status=304)
+    else:
+        response = json_response(payload, accept_encoding=request.headers.get('Accept-Encoding', ''))
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/export', methods=['GET'])
+def export_analyses():
+    """Stream stored analyses as CSV/Parquet, optionally zipped.
+
+    Query: format=csv|parquet, table=utterances|calls|all, zip=1,
+    user_id, agent, since/until (YYYY-MM-DD, on saved time).
+    """
+    fmt = request.args.get('format', 'csv')
+    table = request.args.get('table', 'utterances')
+    tables = list(TABLES) if table == 'all' else [table]
+    zipped = request.args.get('zip') == '1' or len(tables) > 1
+    try:
+        selection = ExportFilter(
+            user_id=request.args.get('user_id'),
+            agent=request.args.get('agent'),
+            since=parse_date(request.args.get('since')),
+            until=parse_date(request.args.get('until'))
+        )
+        chunks = stream_export(fmt, tables, selection, zipped)
+        # Validation happens on the first chunk; surface it as a 400
+        first = next(chunks, b'')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def body():
+        yield first
+        yield from chunks
+
+    mimetype = (
+        'application/zip' if zipped
+        else 'text/csv' if fmt == 'csv' else 'application/vnd.apache.parquet'
+    )
+    response = Response(body(), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{export_filename(fmt, tables, zipped)}"'
+    )
+    return response
 
-        topic_total = sum(results['topics'].values())
-        if topic_total:
-            results['topics'] = {
-                k: round(v/topic_total, 2) 
-                for k, v in results['topics'].items()
+@app.route('/alerts/rules', methods=['GET'])
+def alert_rules_endpoint():
+    """Compiled escalation rules"""
+    return jsonify({'rules': [rule.describe() for rule in alert_engine.rules]}), 200
+
+@app.route('/calls/<call_id>/utterances', methods=['POST'])
+def live_call_utterances(call_id):
+    """Score utterances of a call in progress and check them against the
+    alert rules. Body: {"utterances": [{speaker, text, timestamp}], "end": false},
+    at most LIVE_MAX_UTTERANCES per request. Admitted and scheduled like
+    /analyze. Window state is kept between requests until the call ends or
+    goes idle."""
+    data = request.get_json(silent=True)
+    utterances = data.get('utterances') if isinstance(data, dict) else None
+    if not isinstance(utterances, list):
+        return jsonify({'error': 'Missing utterances'}), 400
+    if not all(isinstance(entry, dict) and isinstance(entry.get('text', ''), str) for entry in utterances):
+        return jsonify({'error': 'Each utterance must be an object with a text string'}), 400
+    if len(utterances) > LIVE_MAX_UTTERANCES:
+        return jsonify({'error': f"At most {LIVE_MAX_UTTERANCES} utterances per request"}), 413
+    priority = request.headers.get('X-Priority', 'interactive')
+    if priority not in PRIORITY_CLASSES:
+        return jsonify({'error': f"Unknown priority '{priority}'", 'priorities': list(PRIORITY_CLASSES)}), 400
+
+    entries = [entry for entry in utterances if entry.get('text', '').strip()]
+    client = request.headers.get('X-Client-Id', request.remote_addr)
+    req = {
+        'cost': len(entries),
+        'client': client,
+        'user': request.headers.get('X-User-Id', client),
+        'priority': priority,
+        'timeout': _client_timeout(request.headers)
+    }
+    try:
+        ticket, job = admit_analysis(req)
+    except AdmissionRejected as rejection:
+        return _rejection_response(rejection)
+
+    monitor = alert_engine.live(call_id, user=req['user'])
+    scored, fired = [], []
+    try:
+        for start in range(0, len(entries), BATCH_UTTERANCES):
+            if ticket.expired() or not scheduler.next_turn(job):
+                raise AnalysisCancelled()
+            batch = entries[start:start + BATCH_UTTERANCES]
+            texts = [analyzer.clean_chat(entry['text']) for entry in batch]
+            moods = analyzer.get_speaker_moods(texts, detailed=ticket.detailed)
+            for entry, text, mood in zip(batch, texts, moods):
+                if not text.strip():
+                    continue
+                speaker = entry.get('speaker', 'Unknown')
+                timestamp = entry.get('timestamp', '')
+                scored.append({'when': timestamp, 'who': speaker, 'mood': mood})
+                fired += monitor.observe(speaker, timestamp, mood)
+    except AnalysisCancelled:
+        ticket.release('cancelled')
+        return jsonify(cancelled_payload()), 504
+    except Exception:
+        ticket.release('failed')
+        raise
+    finally:
+        scheduler.release(job)
+    ticket.release('completed', len(entries))
+
+    if data.get('end'):
+        alert_engine.end(call_id)
+    return jsonify({
+        'call_id': call_id,
+        'position': monitor.position,
+        'timeline': scored,
+        'alerts': fired,
+        'tier': ticket.tier
+    }), 200
+
+@app.route('/calls/<call_id>', methods=['DELETE'])
+def end_live_call(call_id):
+    """Forget a live call's window state"""
+    if not alert_engine.end(call_id):
+        return jsonify({'error': 'Unknown call'}), 404
+    return jsonify({'call_id': call_id, 'status': 'ended'}), 200
+
+def _search_request() -> Tuple[Dict, int]:
+    """JSON body and k of a search request; ValueError when either is malformed."""
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValueError('Body must be a JSON object')
+    try:
+        k = int(data.get('k', 10))
+    except (TypeError, ValueError):
+        raise ValueError("'k' must be an integer")
+    return data, max(1, min(100, k))
+
+@app.route('/search/utterances', methods=['POST'])
+def search_utterances():
+    """Top-k utterances most similar to a free-text query"""
+    if vector_index is None:
+        return jsonify({'error': 'Embeddings are disabled'}), 404
+    try:
+        data, k = _search_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = (data.get('query') or '').strip()
+    if not query:
+        return jsonify({'error': 'Missing query'}), 400
+    query_vector = analyzer.embed([analyzer.clean_chat(query)])[0]
+    return jsonify({
+        'query': query,
+        'results': vector_index.utterances.search(query_vector, k)
+    }), 200
+
+@app.route('/search/calls', methods=['POST'])
+def search_calls():
+    """Top-k calls similar to a stored call (call_id) or a free-text query"""
+    if vector_index is None:
+        return jsonify({'error': 'Embeddings are disabled'}), 404
+    try:
+        data, k = _search_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    call_id = data.get('call_id')
+    if call_id:
+        query_vector = vector_index.call_vector(call_id)
+        if query_vector is None:
+            return jsonify({'error': 'Unknown call_id'}), 404
+        exclude = {call_id}
+    elif (data.get('query') or '').strip():
+        query_vector = analyzer.embed([analyzer.clean_chat(data['query'])])[0]
+        exclude = None
+    else:
+        return jsonify({'error': 'Provide call_id or query'}), 400
+    return jsonify({
+        'results': vector_index.calls.search(query_vector, k, exclude=exclude),
+        'index': vector_index.stats()
+    }), 200
+
+class AnalysisRequestError(Exception):
+    def __init__(self, status: int, payload: Dict):
+        super().__init__(payload.get('error'))
+        self.status = status
+        self.payload = payload
+
+def parse_analysis_request(args, headers, data, remote_addr) -> Dict:
+    """Validate /analyze input. args/headers are mappings, so this serves
+    both the Flask route and the ASGI server (asgi.py)."""
+    view = args.get('view', 'full')
+    if view not in VIEWS:
+        raise AnalysisRequestError(400, {
+            'error': f"Unknown view '{view}'",
+            'views': list(VIEWS)
+        })
+
+    priority = headers.get('X-Priority', args.get('priority', 'interactive'))
+    if priority not in PRIORITY_CLASSES:
+        raise AnalysisRequestError(400, {
+            'error': f"Unknown priority '{priority}'",
+            'priorities': list(PRIORITY_CLASSES)
+        })
+
+    profile_requested = args.get('profile') == '1'
+    if profile_requested and not profile_authorized(headers.get('X-Profile-Token')):
+        raise AnalysisRequestError(403, {'error': 'Profiling not authorized'})
+
+    if not isinstance(data, dict) or 'transcript' not in data:
+        raise AnalysisRequestError(400, {
+            'error': 'Missing transcript data',
+            'example_format': {
+                'transcript': [
+                    {'speaker': 'Agent', 'text': 'Hello', 'timestamp': '[00:00]'}
+                ]
             }
+        })
 
-        for speaker_data in results['speaker_analysis'].values():
-            if speaker_data['messages']:
-                speaker_data['avg_mood'] = round(
-                    np.mean([m['score'] for m in speaker_data['messages']]), 
-                    2
-                )
-                emotion_counts = defaultdict(int)
-                for emotion in speaker_data['emotions']:
-                    emotion_counts[emotion] += 1
-                speaker_data['top_emotions'] = sorted(
-                    emotion_counts.items(),
-                    key=lambda x: x[1],
-                    reverse=True
-                )[:2]
-        
-        process_time = round(time.time() - start_time, 2)
-        logging.info(f"Processed transcript in {process_time}s")
+    transcript = data['transcript']
+    if not isinstance(transcript, list) or not all(
+        isinstance(entry, dict) and isinstance(entry.get('text', ''), str) for entry in transcript
+    ):
+        raise AnalysisRequestError(400, {
+            'error': 'Malformed transcript: expected a list of {"speaker", "text", "timestamp"} objects'
+        })
+
+    client = headers.get('X-Client-Id', remote_addr)
+    return {
+        'transcript': transcript,
+        'cost': sum(1 for entry in transcript if entry.get('text', '').strip()),
+        'view': view,
+        'priority': priority,
+        'profile': profile_requested,
+        'client': client,
+        # Fair share is per user; callers that don't say who they are share by client
+        'user': headers.get('X-User-Id', client),
+        # None: alerts use the call's content hash, as results['call_id'] does
+        'call_id': headers.get('X-Call-Id'),
+        'timeout': _client_timeout(headers)
+    }
+
+def admit_analysis(req: Dict) -> Tuple[Ticket, Job]:
+    """Raises AdmissionRejected when the server is over budget."""
+    try:
+        ticket = admission.admit(req['cost'], client=req['client'], timeout=req['timeout'])
+    except AdmissionRejected as rejection:
+        logging.warning(f"Rejected {req['cost']} utterances ({rejection.status}): {rejection.reason}")
+        raise
+    return ticket, scheduler.job(req['user'], req['priority'], ticket.deadline)
+
+def run_analysis(req: Dict, ticket: Ticket, job: Job, start_time: float) -> Dict:
+    """Score, release the ticket and shape the payload. Blocking; raises
+    AnalysisCancelled once the client deadline has passed."""
+    session = None
+    cost = req['cost']
+    alerts = alert_engine.monitor(req['call_id'], user=req['user'])
+    try:
+        if req['profile']:
+            with profiled(f"analyze_{cost}") as session:
+                results = build_analysis(req['transcript'], ticket, job, alerts)
+        else:
+            results = build_analysis(req['transcript'], ticket, job, alerts)
+    except AnalysisCancelled:
+        ticket.release('cancelled')
+        logging.warning(f"Abandoned analysis after client deadline ({cost} utterances)")
+        raise
+    except Exception:
+        ticket.release('failed')
+        raise
+    finally:
+        scheduler.release(job)
+    ticket.release('completed', cost)
+    
+    process_time = round(time.time() - start_time, 2)
+    logging.info(f"Processed transcript in {process_time}s ({ticket.tier} tier)")
+    
+    payload = shape_results({
+        **results,
+        'meta': {
+            'process_time': process_time,
+            'utterance_count': len(req['transcript']),
+            'tier': ticket.tier,
+            'priority': req['priority'],
+            'queue_wait': round(job.waited, 3),
+            'versions': pipeline_versions(analyzer)
+        }
+    }, req['view'])
+    if session is not None:
+        payload['meta']['profile'] = finish_profile(session, payload)
+    return payload
+
+@app.route('/analyze', methods=['POST', 'OPTIONS'])
+def analyze_conversation():
+    """Main endpoint for analyzing conversation transcripts"""
+    # Handle preflight requests
+    if request.method == 'OPTIONS':
+        response = app.make_default_options_response()
+        return response
+
+    start_time = time.time()
+    try:
+        logging.info(f"Received analysis request from: {request.remote_addr}")
+        try:
+            data = read_request(
+                read_stream(request.stream, request.headers.get('Content-Encoding', '')),
+                request.content_type
+            )
+            req = parse_analysis_request(request.args, request.headers, data, request.remote_addr)
+        except IngestError as e:
+            return jsonify({'error': e.message}), e.status
+        except AnalysisRequestError as e:
+            return jsonify(e.payload), e.status
+
+        try:
+            ticket, job = admit_analysis(req)
+        except AdmissionRejected as rejection:
+            return _rejection_response(rejection)
+
+        try:
+            payload = run_analysis(req, ticket, job, start_time)
+        except AnalysisCancelled:
+            return jsonify(cancelled_payload()), 504
         
         # Add CORS headers to the response
-        response = jsonify({
-            **results,
-            'meta': {
-                'process_time': process_time,
-                'utterance_count': len(data['transcript'])
-            }
-        })
+        response = json_response(
+            payload,
+            accept_encoding=request.headers.get('Accept-Encoding', '')
+        )
         response.headers.add('Access-Control-Allow-Origin', '*')
         return response
         
@@ -168,6 +765,59 @@ def analyze_conversation():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def analyze_batch_item(item: Dict, args: Dict, headers) -> Dict:
+    """One transcript of a batch: {'name', 'code' (HTTP status), 'result' | 'error'}."""
+    start_time = time.time()
+    name = item['name']
+    if 'error' in item:
+        return {'name': name, 'code': item['error'].status, 'error': item['error'].message}
+    try:
+        req = parse_analysis_request(args, headers, {'transcript': item['transcript']}, request.remote_addr)
+    except AnalysisRequestError as e:
+        return {'name': name, 'code': e.status, **e.payload}
+    if 'X-Call-Id' in headers:
+        # One alert monitor per transcript, not one per batch
+        req['call_id'] = f"{headers['X-Call-Id']}-{name}"
+    try:
+        ticket, job = admit_analysis(req)
+    except AdmissionRejected as rejection:
+        return {'name': name, 'code': rejection.status, **rejection_payload(rejection)}
+    try:
+        return {'name': name, 'code': 200, 'result': run_analysis(req, ticket, job, start_time)}
+    except AnalysisCancelled:
+        return {'name': name, 'code': 504, **cancelled_payload()}
+    except Exception as e:
+        logging.error(f"Batch analysis of {name} failed: {str(e)}")
+        return {'name': name, 'code': 500, 'error': str(e), 'status': 'failed'}
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Several transcripts in one request for bulk clients, as multipart file
+    parts or JSON. They run one after another at 'batch' priority unless
+    X-Priority says otherwise; each is admitted on its own, so an overloaded
+    server rejects items rather than the whole batch."""
+    start_time = time.time()
+    try:
+        items = read_batch(
+            read_stream(request.stream, request.headers.get('Content-Encoding', '')),
+            request.content_type
+        )
+    except IngestError as e:
+        return jsonify({'error': e.message}), e.status
+    args = {**request.args.to_dict(), 'priority': request.args.get('priority', 'batch')}
+    results = [analyze_batch_item(item, args, request.headers) for item in items]
+    codes = defaultdict(int)
+    for result in results:
+        codes[result['code']] += 1
+    return json_response({
+        'results': results,
+        'meta': {
+            'transcripts': len(results),
+            'codes': dict(codes),
+            'process_time': round(time.time() - start_time, 2)
+        }
+    }, accept_encoding=request.headers.get('Accept-Encoding', ''))
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     logging.info("Starting Flask application...")
@@ -0,0 +1,262 @@
+"""ASGI serving mode for the backend.
+
+    python asgi.py                                  # uvicorn on $PORT
+    uvicorn asgi:application --host 0.0.0.0 --port 8080
+
+/healthz, /readyz, /metrics and POST /analyze are served natively: reading
+(and gunzipping) the body, transcript parsing, validation, admission and
+response encoding happen on the event loop, and only the analysis itself runs on a bounded thread
+pool. Health and metrics never wait behind inference. Every other route
+goes to the Flask app through asgiref's WsgiToAsgi, run on a pool of
+ASGI_FALLBACK_THREADS threads so slow routes (/analyze/batch, live
+scoring, /export) don't hold up each other or cheap reads.
+
+On SIGTERM new analyses get a 503, /healthz reports draining, and the
+server waits up to ASGI_DRAIN_SECONDS for in-flight analyses to finish.
+"""
+import os
+import asyncio
+import contextvars
+import gzip
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+from tuning import setting
+
+def torch_threads() -> int:
+    """Intra-op threads torch will use for one forward pass."""
+    threads = setting('torch_threads')
+    if threads:
+        return threads
+    if os.environ.get('OMP_NUM_THREADS', '').isdigit() and int(os.environ['OMP_NUM_THREADS']) > 0:
+        return int(os.environ['OMP_NUM_THREADS'])
+    return os.cpu_count() or 1
+
+def inference_slots() -> int:
+    """Forward passes that can run side by side without oversubscribing cores."""
+    return max(1, (os.cpu_count() or 1) // torch_threads())
+
+# The scheduler in app.py bounds concurrent inference; match it to torch
+# unless this host's tuning profile measured a better count
+os.environ.setdefault('SCHEDULER_SLOTS', str(setting('scheduler_slots', inference_slots())))
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.datastructures import Headers
+import app as backend
+from app import (
+    AnalysisCancelled, AnalysisRequestError, AdmissionRejected, parse_analysis_request,
+    admit_analysis, run_analysis, rejection_payload, cancelled_payload, metrics_payload,
+    readiness_payload
+)
+from response_shaping import encode_json, GZIP_MIN_BYTES, GZIP_LEVEL
+from ingest import BodyDecoder, BodyTooLarge, IngestError, read_request
+
+# Jobs waiting for a scheduler turn hold an executor thread, so the pool is
+# a few times the slot count; otherwise an interactive job could queue in
+# the executor behind a backfill instead of at the scheduler.
+THREADS_PER_SLOT = int(os.environ.get('ASGI_THREADS_PER_SLOT', 4))
+MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_MB', 50)) * 2**20
+DRAIN_SECONDS = float(os.environ.get('ASGI_DRAIN_SECONDS', 60))
+# Flask routes served side by side (the threaded Flask server had no bound)
+FALLBACK_THREADS = int(os.environ.get('ASGI_FALLBACK_THREADS', 16))
+
+async def read_body(receive, content_encoding: str = '') -> bytes:
+    """Request body, gunzipped as chunks arrive (see ingest.BodyDecoder)."""
+    decoder, size = BodyDecoder(content_encoding), 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise BodyTooLarge()
+        decoder.feed(chunk)
+        if not message.get('more_body'):
+            break
+    return decoder.finish()
+
+async def send_json(send, payload, status: int = 200, accept_encoding: str = '',
+                    headers: Optional[Dict[str, str]] = None):
+    body = encode_json(payload)
+    response_headers = {
+        'content-type': 'application/json',
+        'vary': 'Accept-Encoding',
+        'access-control-allow-origin': '*',
+        **(headers or {})
+    }
+    if 'gzip' in accept_encoding and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        response_headers['content-encoding'] = 'gzip'
+    response_headers['content-length'] = str(len(body))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.encode(), v.encode()) for k, v in response_headers.items()]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # asgiref's version is thread_sensitive: every request on one thread
+        wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+        run = sync_to_async(wsgi_app, thread_sensitive=False, executor=self.executor)
+        await run(self, body)
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that runs each request on its own thread from a bounded pool."""
+    def __init__(self, wsgi_application, threads: int = FALLBACK_THREADS):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+class AnalysisServer:
+    def __init__(self, flask_app, slots: int):
+        self.workers = slots * THREADS_PER_SLOT
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analysis')
+        self.fallback = PooledWsgiToAsgi(flask_app)
+        self.in_flight = 0
+        self.draining = False
+        self.routes = {
+            ('GET', '/healthz'): self.healthz,
+            ('GET', '/readyz'): self.readyz,
+            ('GET', '/metrics'): self.metrics,
+            ('POST', '/analyze'): self.analyze
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        handler = self.routes.get((scope.get('method'), scope.get('path')))
+        if handler is None:
+            return await self.fallback(scope, receive, send)
+        await handler(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                logging.info(f"ASGI server ready: {self.workers} analysis threads, "
+                             f"{backend.scheduler.slots} inference slots")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.drain()
+                self.executor.shutdown(wait=False)
+                self.fallback.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def drain(self):
+        self.draining = True
+        deadline = time.monotonic() + DRAIN_SECONDS
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.in_flight:
+            logging.warning(f"Shutting down with {self.in_flight} analyses still running")
+        else:
+            logging.info("Drained in-flight analyses")
+
+    async def healthz(self, scope, receive, send):
+        await send_json(send, {
+            'status': 'draining' if self.draining else 'healthy',
+            'timestamp': datetime.now().isoformat()
+        }, status=503 if self.draining else 200)
+
+    async def readyz(self, scope, receive, send):
+        payload, status = readiness_payload()
+        if self.draining:
+            payload['status'], status = 'draining', 503
+        await send_json(send, payload, status=status)
+
+    async def metrics(self, scope, receive, send):
+        await send_json(send, {
+            **metrics_payload(),
+            'asgi': {
+                'in_flight': self.in_flight,
+                'analysis_threads': self.workers,
+                'draining': self.draining
+            }
+        })
+
+    async def analyze(self, scope, receive, send):
+        start_time = time.time()
+        headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+        accept_encoding = headers.get('Accept-Encoding', '')
+        if self.draining:
+            return await send_json(send, {'error': 'Server is shutting down', 'status': 'rejected'},
+                                   status=503, headers={'retry-after': '5'})
+        try:
+            body = await read_body(receive, headers.get('Content-Encoding', ''))
+            data = read_request(body, headers.get('Content-Type', ''))
+            req = parse_analysis_request(
+                dict(parse_qsl(scope.get('query_string', b'').decode('latin-1'))),
+                headers,
+                data,
+                (scope.get('client') or ('unknown',))[0]
+            )
+        except IngestError as e:
+            return await send_json(send, {'error': e.message}, status=e.status)
+        except AnalysisRequestError as e:
+            return await send_json(send, e.payload, status=e.status)
+
+        try:
+            ticket, job = admit_analysis(req)
+        except AdmissionRejected as rejection:
+            return await send_json(send, rejection_payload(rejection), status=rejection.status,
+                                   headers={'retry-after': str(rejection.retry_after)})
+
+        self.in_flight += 1
+        try:
+            # copy_context carries the request's profile into the worker thread
+            payload = await asyncio.get_running_loop().run_in_executor(
+                self.executor, contextvars.copy_context().run,
+                run_analysis, req, ticket, job, start_time
+            )
+        except AnalysisCancelled:
+            return await send_json(send, cancelled_payload(), status=504)
+        except Exception as e:
+            logging.error(f"Analysis failed: {str(e)}")
+            return await send_json(send, {
+                'error': str(e),
+                'status': 'failed',
+                'timestamp': datetime.now().isoformat()
+            }, status=500)
+        finally:
+            self.in_flight -= 1
+        await send_json(send, payload, accept_encoding=accept_encoding)
+
+application = AnalysisServer(backend.app, backend.scheduler.slots)
+
+def main():
+    import uvicorn
+
+    class DrainingServer(uvicorn.Server):
+        """Flip to draining as soon as the signal arrives, not after
+        uvicorn has closed the listening sockets."""
+        def handle_exit(self, sig, frame):
+            application.draining = True
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(
+        application,
+        host='0.0.0.0',
+        port=int(os.environ.get('PORT', 8080)),
+        lifespan='on',
+        log_level='info',
+        timeout_keep_alive=5
+    )
+    DrainingServer(config).run()
+
+if __name__ == '__main__':
+    main()
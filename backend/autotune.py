@@ -0,0 +1,231 @@
+"""Measures torch threads, inter-op threads, inference batch size and
+scheduler slots on this host and writes the fastest combination as its
+tuning profile (tuning.py), which the analyzer and server load at startup.
+
+torch fixes the inter-op thread count on first use, so each inter-op value
+runs in a fresh subprocess that loads the models once and tries every other
+combination. A trial scores --calls calls of --call-utterances turns,
+sampled from the bundled transcripts, the way /analyze does: scored
+BATCH_UTTERANCES at a time, with `slots` calls in flight. It reports
+utterances/sec and the p50/p95 latency of a call. A p95 over fewer than
+MIN_P95_CALLS calls is mostly the slowest one or two calls, so it is
+flagged approximate and --max-p95-ms refuses such samples. Canonical
+sharing is off and the token cache is emptied per trial, so every trial
+does the same work.
+
+    python autotune.py                                  # default grid, writes the profile
+    python autotune.py --threads 2,4 --batch-sizes 4,8 --max-p95-ms 3000
+    python autotune.py --calls 20                       # quicker, p95 approximate
+    python autotune.py --dry-run                        # list the grid
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import itertools
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from scheduler import BATCH_UTTERANCES
+from transcript_parser import parse_transcript
+from tuning import TUNING_DIR, cpu_model, host_key, profile_path
+
+# Transcripts shipped with the repo
+BUNDLED_TRANSCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'user_data')
+SAMPLE_CALLS = 100
+CALL_UTTERANCES = 16
+# Fewer calls than this and p95 is within a call or two of the maximum
+MIN_P95_CALLS = 100
+
+def _powers_of_two(limit: int) -> List[int]:
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    return values if values[-1] == limit else values + [limit]
+
+def default_grid(cpus: int) -> Dict[str, List[int]]:
+    return {
+        'threads': _powers_of_two(cpus),
+        'interop': [1, 2],
+        'batch_sizes': [1, 4, 8],
+        'slots': _powers_of_two(cpus)
+    }
+
+def trial_grid(threads: List[int], batch_sizes: List[int], slots: List[int], cpus: int) -> List[Dict]:
+    """Every combination that doesn't ask for more threads than cores."""
+    return [
+        {'threads': t, 'batch_size': b, 'slots': s}
+        for t, b, s in itertools.product(threads, batch_sizes, slots)
+        if t * s <= cpus
+    ]
+
+def sample_calls(data_dir: str, calls: int, call_utterances: int, seed: int = 0) -> List[List[str]]:
+    """Random utterances from stored transcripts, grouped into calls.
+    Falls back to inference_bench's synthetic texts when there are none."""
+    texts = []
+    for root, _, files in os.walk(data_dir):
+        for name in sorted(files):
+            if name.endswith('.txt'):
+                with open(os.path.join(root, name), errors='replace') as f:
+                    texts += [turn['text'] for turn in parse_transcript(f.read()) if turn['text'].strip()]
+    if not texts:
+        from inference_bench import load_texts
+        texts = load_texts(count=calls * call_utterances)
+    rng = random.Random(seed)
+    picked = [rng.choice(texts) for _ in range(calls * call_utterances)]
+    return [picked[i:i + call_utterances] for i in range(0, len(picked), call_utterances)]
+
+def _set_threads(threads: int):
+    try:
+        import torch
+    except ImportError:  # stub runs
+        return
+    torch.set_num_threads(threads)
+
+def run_trial(analyzer, calls: List[List[str]], threads: int, batch_size: int, slots: int, detailed: bool) -> Dict:
+    from tokenization import TokenCache
+    _set_threads(threads)
+    analyzer.batch_size = batch_size
+    analyzer.token_cache = TokenCache()
+
+    def score_call(texts: List[str]) -> float:
+        started = time.perf_counter()
+        for start in range(0, len(texts), BATCH_UTTERANCES):
+            analyzer.get_speaker_moods(
+                [analyzer.clean_chat(text) for text in texts[start:start + BATCH_UTTERANCES]], detailed
+            )
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=slots) as pool:
+        latencies = np.array(list(pool.map(score_call, calls))) * 1000
+    elapsed = time.perf_counter() - started
+    return {
+        'utterances_per_second': round(sum(len(call) for call in calls) / elapsed, 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+        'calls': len(calls),
+        'p95_approximate': len(calls) < MIN_P95_CALLS
+    }
+
+def worker(args):
+    """Subprocess side: one inter-op setting, every trial in --grid-json."""
+    from canonical import Canonicalizer
+    if args.stub:
+        from stub_analyzer import StubConversationAnalyzer
+        analyzer = StubConversationAnalyzer(latency_ms=5)
+    else:
+        from sentiment_analyzer import ConversationAnalyzer
+        analyzer = ConversationAnalyzer(preload=True)
+    analyzer.canonical = Canonicalizer('off')
+    calls = sample_calls(args.data_dir, args.calls, args.call_utterances)
+    detailed = args.tier == 'full'
+    # Warm-up pass: first-call allocations and lazy init aren't measured
+    run_trial(analyzer, calls[:1], 1, 8, 1, detailed)
+    for trial in json.loads(args.grid_json):
+        result = run_trial(analyzer, calls, trial['threads'], trial['batch_size'], trial['slots'], detailed)
+        print(json.dumps({**trial, 'interop': args.interop, **result}), flush=True)
+
+def run_interop(args, interop: int, grid: List[Dict]) -> List[Dict]:
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker', '--interop', str(interop),
+        '--grid-json', json.dumps(grid), '--data-dir', args.data_dir, '--tier', args.tier,
+        '--calls', str(args.calls), '--call-utterances', str(args.call_utterances)
+    ] + (['--stub'] if args.stub else [])
+    # The settings under test, not any existing profile or overrides
+    env = {k: v for k, v in os.environ.items() if k not in ('TORCH_NUM_THREADS', 'INFERENCE_BATCH_SIZE')}
+    env.update({'TORCH_INTEROP_THREADS': str(interop), 'TUNING_PROFILE': 'off'})
+    results = []
+    with subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__))) as process:
+        for line in process.stdout:
+            result = json.loads(line)
+            print(f"  interop {result['interop']:>2}  threads {result['threads']:>2}  batch {result['batch_size']:>2}"
+                  f"  slots {result['slots']:>2}  {result['utterances_per_second']:>8} utt/s"
+                  f"  p50 {result['p50_ms']:>8} ms"
+                  f"  p95 {'~' if result['p95_approximate'] else ' '}{result['p95_ms']:>8} ms", flush=True)
+            results.append(result)
+    if process.returncode:
+        raise RuntimeError(f"Trial process for interop={interop} exited with {process.returncode}")
+    return results
+
+def pick_best(results: List[Dict], max_p95_ms: Optional[float] = None) -> Optional[Dict]:
+    """Highest throughput, among trials within the p95 bound if one is given.
+    Ties go to the lower p50, which is stable even on small samples."""
+    eligible = [r for r in results if max_p95_ms is None or r['p95_ms'] <= max_p95_ms]
+    return max(eligible, key=lambda r: (r['utterances_per_second'], -r['p50_ms']), default=None)
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v.strip()]
+
+def main():
+    cpus = os.cpu_count() or 1
+    grid = default_grid(cpus)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=_int_list, default=grid['threads'], help='torch intra-op threads')
+    parser.add_argument('--interop', type=_int_list, default=grid['interop'], help='torch inter-op threads')
+    parser.add_argument('--batch-sizes', type=_int_list, default=grid['batch_sizes'])
+    parser.add_argument('--slots', type=_int_list, default=grid['slots'], help='calls scored concurrently')
+    parser.add_argument('--max-p95-ms', type=float, help='only consider trials with a lower call p95')
+    parser.add_argument('--tier', choices=('full', 'fast'), default='full')
+    parser.add_argument('--data-dir', default=BUNDLED_TRANSCRIPTS, help='transcripts to sample from')
+    parser.add_argument('--calls', type=int, default=SAMPLE_CALLS, help='calls scored per trial')
+    parser.add_argument('--call-utterances', type=int, default=CALL_UTTERANCES)
+    parser.add_argument('--output', help=f"profile path (default {TUNING_DIR}/<host key>.json)")
+    parser.add_argument('--dry-run', action='store_true', help='print the grid and exit')
+    parser.add_argument('--stub', action='store_true', help='use the model-free stub analyzer')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--grid-json', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    args.data_dir = os.path.abspath(args.data_dir)
+    if args.max_p95_ms is not None and args.calls < MIN_P95_CALLS:
+        parser.error(f"--max-p95-ms needs --calls >= {MIN_P95_CALLS} for a meaningful p95")
+    if args.worker:
+        args.interop = args.interop[0]
+        return worker(args)
+
+    trials = trial_grid(args.threads, args.batch_sizes, args.slots, cpus)
+    print(f"{host_key()} ({cpus} cpus, {cpu_model()}): "
+          f"{len(trials) * len(args.interop)} trials, {args.calls} calls of {args.call_utterances} utterances each")
+    if args.dry_run:
+        for interop in args.interop:
+            for trial in trials:
+                print(f"  interop {interop}  {trial}")
+        return
+
+    results = []
+    for interop in args.interop:
+        results += run_interop(args, interop, trials)
+    best = pick_best(results, args.max_p95_ms)
+    if best is None:
+        print(f"No trial met p95 <= {args.max_p95_ms} ms; profile not written")
+        return
+    profile = {
+        'host': {'key': host_key(), 'cpus': cpus, 'cpu_model': cpu_model(), 'hostname': os.uname().nodename},
+        'created': datetime.now().isoformat(),
+        'sample': {'calls': args.calls, 'call_utterances': args.call_utterances,
+                   'tier': args.tier, 'stub': args.stub},
+        'objective': {'max_p95_ms': args.max_p95_ms},
+        'settings': {
+            'torch_threads': best['threads'],
+            'torch_interop_threads': best['interop'],
+            'inference_batch_size': best['batch_size'],
+            'scheduler_slots': best['slots']
+        },
+        'measured': {k: best[k] for k in ('utterances_per_second', 'p50_ms', 'p95_ms', 'p95_approximate')},
+        'trials': results
+    }
+    path = args.output or profile_path() or os.path.join(TUNING_DIR, f"{host_key()}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    print(f"Best: {profile['settings']} -> {profile['measured']}")
+    print(f"Wrote {path}")
+
+if __name__ == '__main__':
+    main()
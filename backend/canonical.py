@@ -0,0 +1,325 @@
+"""Canonical forms of utterances, so variants share one inference result.
+
+Short turns ("OK.", "Ok", "okay", "OK OK.", "Theek hai." / "theek hai")
+differ only in case, punctuation, repetition or spelling of a filler.
+canonicalize() folds those away: it lowercases, drops neutral punctuation
+and squeezes stretched letters ("okkk"). Emoji and a closing "?" or "!"
+change what the models score, so they stay in the key: "thanks 😡",
+"thanks 😊", "thanks!" and "thanks" are four classes. Filler spellings are mapped through
+a configurable map, and repeated words and phrases collapsed, only for
+turns of at most FILLER_TURN_WORDS words or turns made up entirely of
+fillers, so "no no, not that" or "I told you, I told you" keep their
+emphasis. Utterances with the same canonical form are one equivalence
+class.
+
+With CANONICAL_SHARING=minhash, longer turns also join the class of an
+earlier turn whose word shingles are near-identical (MinHash + LSH bands).
+
+Audit mode (CANONICAL_AUDIT_RATE) also scores a sample of shared
+utterances on their own and records how often sharing changed the result.
+
+    CANONICAL_SHARING=off|canonical|minhash     (default off)
+    CANONICAL_FILLER_MAP=fillers.json           {"spelling": "canonical", ...}
+    python canonical.py transcript.txt [...] --audit --stub
+"""
+import os
+import re
+import json
+import random
+import unicodedata
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+SHARING_MODES = ('off', 'canonical', 'minhash')
+# Spelling variants of fillers and acknowledgements, Hinglish included.
+# Spellings that are also other words ('ha', 'ya', 'k') are left out.
+FILLER_MAP = {
+    'okay': 'ok', 'okey': 'ok', 'kk': 'ok', 'oki': 'ok', 'okie': 'ok',
+    'thik hai': 'theek hai', 'thik h': 'theek hai', 'theek h': 'theek hai',
+    'thk hai': 'theek hai', 'tik hai': 'theek hai', 'theekh hai': 'theek hai',
+    'han': 'haan', 'haa': 'haan', 'hanji': 'haan ji', 'haanji': 'haan ji',
+    'acha': 'accha', 'achha': 'accha', 'achcha': 'accha', 'acchha': 'accha',
+    'nahin': 'nahi', 'nai': 'nahi', 'nahi ji': 'nahi ji',
+    'hm': 'hmm', 'hmm': 'hmm', 'mhm': 'hmm', 'mm': 'hmm', 'umm': 'um', 'uhh': 'uh',
+    'yeah': 'yes', 'yep': 'yes', 'yup': 'yes',
+    'thanks': 'thank you', 'thx': 'thank you', 'thank u': 'thank you', 'ty': 'thank you',
+    'dhanyavad': 'dhanyavaad', 'dhanyawad': 'dhanyavaad'
+}
+# Longer turns keep their spelling and repetitions unless they are all fillers
+FILLER_TURN_WORDS = 3
+# Longer turns than this (in canonical words) may be near-duplicate matched
+NEAR_DUPLICATE_MIN_WORDS = 8
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.8
+SHINGLE_WORDS = 3
+NEAR_DUPLICATE_ENTRIES = 20000
+SHARED_RESULT_ENTRIES = int(os.environ.get('SHARED_RESULT_ENTRIES', 50000))
+# Change in score that counts as "sharing changed the result" in audits
+AUDIT_SCORE_TOLERANCE = 0.25
+
+# Kept out of the punctuation strip: emoji and modifiers (So/Sk), ? and !
+_PUNCTUATION = re.compile(r'[^\w\s?!]+')
+_TERMINAL_MARKS = re.compile(r'([?!]+)\s*$')
+_STRETCHED = re.compile(r'([^\W\d_])\1{2,}')
+_MERSENNE = (1 << 61) - 1
+
+def load_filler_map(path: Optional[str] = None) -> Dict[str, str]:
+    """FILLER_MAP plus any overrides from a JSON object file."""
+    fillers = dict(FILLER_MAP)
+    if path:
+        with open(path) as f:
+            fillers.update({k.lower(): v.lower() for k, v in json.load(f).items()})
+    return fillers
+
+def _collapse_repeats(words: List[str], max_phrase: int = 3) -> List[str]:
+    """'ok ok ok' -> 'ok', 'theek hai theek hai' -> 'theek hai'."""
+    for size in range(1, max_phrase + 1):
+        out = []
+        for word in words:
+            out.append(word)
+            if len(out) >= 2 * size and out[-size:] == out[-2 * size:-size]:
+                del out[-size:]
+        words = out
+    return words
+
+def canonicalize(text: str, fillers: Dict[str, str] = FILLER_MAP) -> str:
+    """Case, punctuation and stretched letters folded away; filler spellings
+    and repetition too for short or all-filler turns."""
+    emoji = ''.join(c for c in text if unicodedata.category(c) in ('So', 'Sk'))
+    text = ''.join(c for c in text.lower() if unicodedata.category(c) not in ('So', 'Sk'))
+    text = _PUNCTUATION.sub(' ', text)
+    terminal = _TERMINAL_MARKS.search(text)
+    # '!!!' -> '!', '?!?' -> '?!'; marks inside the turn are dropped
+    marks = [''.join(dict.fromkeys(terminal.group(1)))] if terminal else []
+    if emoji:
+        marks.append(emoji)
+    text = _STRETCHED.sub(r'\1', text.replace('?', ' ').replace('!', ' '))
+    words = text.split()
+    # Canonical spellings count as fillers too
+    fillers = {**{v: v for v in fillers.values()}, **fillers}
+    longest = max((len(k.split()) for k in fillers), default=1)
+    mapped, i, all_fillers = [], 0, True
+    while i < len(words):
+        for size in range(min(longest, len(words) - i), 0, -1):
+            phrase = ' '.join(words[i:i + size])
+            if phrase in fillers:
+                mapped.extend(fillers[phrase].split())
+                i += size
+                break
+        else:
+            all_fillers = False
+            mapped.append(words[i])
+            i += 1
+    if len(words) > FILLER_TURN_WORDS and not all_fillers:
+        return ' '.join(words + marks)
+    return ' '.join(_collapse_repeats(mapped) + marks)
+
+class NearDuplicateIndex:
+    """MinHash signatures of word shingles, bucketed by LSH bands. A turn
+    joins the first indexed class whose estimated Jaccard similarity is
+    at least the threshold."""
+    def __init__(
+        self,
+        permutations: int = MINHASH_PERMUTATIONS,
+        bands: int = MINHASH_BANDS,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        max_entries: int = NEAR_DUPLICATE_ENTRIES
+    ):
+        rng = np.random.default_rng(1)
+        self._a = rng.integers(1, _MERSENNE, permutations, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE, permutations, dtype=np.uint64)
+        self.bands = bands
+        self.rows = permutations // bands
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._signatures = OrderedDict()
+        self._buckets = defaultdict(set)
+
+    def signature(self, words: Sequence[str]) -> np.ndarray:
+        shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big') % _MERSENNE
+             for s in shingles],
+            dtype=np.uint64
+        )
+        # (a * x + b) mod p, per permutation; object math avoids uint64 overflow
+        values = (np.outer(hashes.astype(object), self._a.astype(object)) + self._b.astype(object)) % _MERSENNE
+        return values.min(axis=0).astype(np.uint64)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    def match(self, key: str, words: Sequence[str]) -> str:
+        """Class key of a near-duplicate already indexed, else index `key` and return it."""
+        signature = self.signature(words)
+        bands = self._band_keys(signature)
+        candidates = set()
+        for band in bands:
+            candidates |= self._buckets.get(band, set())
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate][0] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        if best is not None:
+            self._signatures.move_to_end(best)
+            return best
+        self._signatures[key] = (signature, bands)
+        for band in bands:
+            self._buckets[band].add(key)
+        while len(self._signatures) > self.max_entries:
+            old_key, (_, old_bands) = self._signatures.popitem(last=False)
+            for band in old_bands:
+                self._buckets[band].discard(old_key)
+                if not self._buckets[band]:
+                    del self._buckets[band]
+        return key
+
+class Canonicalizer:
+    def __init__(self, mode: str = 'canonical', fillers: Optional[Dict[str, str]] = None):
+        if mode not in SHARING_MODES:
+            raise ValueError(f"CANONICAL_SHARING must be one of {SHARING_MODES}")
+        self.mode = mode
+        self.fillers = fillers or FILLER_MAP
+        self.near_duplicates = NearDuplicateIndex() if mode == 'minhash' else None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'Canonicalizer':
+        return cls(
+            os.environ.get('CANONICAL_SHARING', 'off'),
+            load_filler_map(os.environ.get('CANONICAL_FILLER_MAP'))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def key(self, text: str) -> str:
+        """Equivalence class of a cleaned utterance."""
+        if not self.enabled:
+            return text
+        canonical = canonicalize(text, self.fillers)
+        if not canonical:
+            # Only punctuation or emoji, which carry the sentiment themselves
+            return text
+        words = canonical.split()
+        if self.near_duplicates is None or len(words) < NEAR_DUPLICATE_MIN_WORDS:
+            return canonical
+        with self._lock:
+            return self.near_duplicates.match(canonical, words)
+
+class SharedResults:
+    """Inference results per equivalence class, plus the audit counters."""
+    def __init__(self, max_entries: int = SHARED_RESULT_ENTRIES,
+                 audit_rate: float = float(os.environ.get('CANONICAL_AUDIT_RATE', 0))):
+        self.max_entries = max_entries
+        self.audit_rate = audit_rate
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self._score_deltas = []
+
+    def get(self, key) -> Optional[Tuple[str, Dict]]:
+        """(representative text, fields) for a class, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, text: str, fields: Dict):
+        with self._lock:
+            self._entries[key] = (text, fields)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def should_audit(self) -> bool:
+        return self.audit_rate > 0 and random.random() < self.audit_rate
+
+    def record_audit(self, shared: Dict, individual: Dict):
+        delta = abs(shared.get('score', 0.0) - individual.get('score', 0.0))
+        with self._lock:
+            self.counters['audited'] += 1
+            self.counters['audit_score_changed'] += delta >= AUDIT_SCORE_TOLERANCE
+            self.counters['audit_label_changed'] += shared.get('emotion') != individual.get('emotion')
+            self._score_deltas.append(delta)
+            del self._score_deltas[:-5000]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+            deltas = np.array(self._score_deltas) if self._score_deltas else None
+            entries = len(self._entries)
+        lookups = counters.get('lookups', 0)
+        audited = counters.get('audited', 0)
+        return {
+            'entries': entries,
+            'reuse_rate': round(counters.get('shared', 0) / lookups, 3) if lookups else None,
+            'variant_reuse': counters.get('shared_variant', 0),
+            'audit': {
+                'rate': self.audit_rate,
+                'audited': audited,
+                'score_changed': round(counters.get('audit_score_changed', 0) / audited, 4) if audited else None,
+                'emotion_changed': round(counters.get('audit_label_changed', 0) / audited, 4) if audited else None,
+                'mean_score_delta': round(float(deltas.mean()), 4) if deltas is not None else None
+            }
+        }
+
+def main():
+    import argparse
+    from transcript_parser import parse_transcript
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('transcripts', nargs='+', help='raw .txt transcripts')
+    parser.add_argument('--mode', choices=SHARING_MODES[1:], default='canonical')
+    parser.add_argument('--filler-map', help='JSON filler overrides')
+    parser.add_argument('--audit', action='store_true', help='score every utterance both ways and compare')
+    parser.add_argument('--stub', action='store_true', help='use the model-free stub analyzer for --audit')
+    parser.add_argument('--show', type=int, default=10, help='largest classes to print')
+    args = parser.parse_args()
+
+    if args.stub:
+        from stub_analyzer import StubConversationAnalyzer
+        analyzer = StubConversationAnalyzer(latency_ms=0)
+    else:
+        from sentiment_analyzer import ConversationAnalyzer
+        analyzer = ConversationAnalyzer()
+    analyzer.canonical = Canonicalizer('off')
+
+    texts = []
+    for path in args.transcripts:
+        with open(path, errors='replace') as f:
+            texts += [analyzer.clean_chat(turn['text']) for turn in parse_transcript(f.read())
+                      if turn['text'].strip()]
+    canonicalizer = Canonicalizer(args.mode, load_filler_map(args.filler_map))
+    exact = len(set(texts))
+    classes = defaultdict(list)
+    for text in texts:
+        classes[canonicalizer.key(text)].append(text)
+    print(f"{len(texts)} utterances: {exact} distinct texts, {len(classes)} classes ({args.mode})")
+    print(f"reuse rate: exact {1 - exact / len(texts):.1%}, {args.mode} {1 - len(classes) / len(texts):.1%}")
+    for key, members in sorted(classes.items(), key=lambda kv: -len(kv[1]))[:args.show]:
+        print(f"  {len(members):5}  {key[:50]!r:52} {sorted(set(members))[:4]}")
+
+    if args.audit:
+        # Every utterance scored on its own, compared with its class representative's result
+        individual = dict(zip(texts, analyzer.get_speaker_moods(texts)))
+        shared = SharedResults(audit_rate=1.0)
+        for members in classes.values():
+            for text in members[1:]:
+                if text != members[0]:
+                    shared.record_audit(individual[members[0]], individual[text])
+        print(json.dumps(shared.stats()['audit'], indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""Shape-bucketed compiled inference for the HF classification pipelines.
+
+Eager pipelines see a new sequence length on almost every utterance, and
+the first requests after boot pay for allocator growth and kernel
+selection. Here inputs are padded up to one of a few length buckets,
+each bucket is compiled once (TorchScript trace, or torch.compile), and
+every bucket is warmed up with synthetic input before the model is
+handed out. Attention masks keep the padding out of the result.
+
+Token IDs that fall in the same bucket are scored together, in batches
+of a power of two up to the batch size (and BATCH_TOKEN_BUDGET), so a
+bucket has at most log2(batch size) + 1 compiled shapes, all warmed.
+
+    INFERENCE_COMPILED=trace      # or 'compile'; unset/0 keeps the eager pipelines
+    INFERENCE_BUCKETS=16,32,64,128,256,512
+
+Compare latencies against the eager path with inference_bench.py.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+from tokenization import INFERENCE_BATCH_SIZE, BATCH_TOKEN_BUDGET
+
+COMPILE_MODES = ('trace', 'compile')
+DEFAULT_BUCKETS = (16, 32, 64, 128, 256, 512)
+WARMUP_RUNS = 3
+
+def compile_mode() -> Optional[str]:
+    mode = os.environ.get('INFERENCE_COMPILED', '').strip().lower()
+    if mode in ('', '0', 'false', 'off'):
+        return None
+    if mode == '1':
+        return 'trace'
+    if mode not in COMPILE_MODES:
+        raise ValueError(f"INFERENCE_COMPILED must be one of {COMPILE_MODES}")
+    return mode
+
+def length_buckets() -> Tuple[int, ...]:
+    spec = os.environ.get('INFERENCE_BUCKETS')
+    if not spec:
+        return DEFAULT_BUCKETS
+    return tuple(sorted({int(b) for b in spec.split(',') if b.strip()}))
+
+class BucketedClassifier:
+    """Drop-in for a text-classification pipeline: same call signature and
+    top-label output, same preprocess/forward/postprocess steps for
+    profiling, plus .tokenizer and .model for the embedding path."""
+    def __init__(
+        self,
+        pipeline,
+        mode: str = 'trace',
+        buckets: Tuple[int, ...] = DEFAULT_BUCKETS,
+        max_batch: int = INFERENCE_BATCH_SIZE
+    ):
+        import torch
+        self.pipeline = pipeline
+        self.tokenizer = pipeline.tokenizer
+        self.model = pipeline.model.eval()
+        self.mode = mode
+        limit = getattr(self.tokenizer, 'model_max_length', None) or buckets[-1]
+        self.buckets = tuple(b for b in buckets if b <= limit) or (min(buckets[0], limit),)
+        # Longest input; tokenize to this so truncation keeps the end token
+        self.max_length = self.buckets[-1]
+        self.max_batch = max(1, max_batch)
+        self.labels = self.model.config.id2label
+        # Rows scored per bucket; classify_ids runs on several threads
+        self.bucket_hits = {bucket: 0 for bucket in self.buckets}
+        self._hits_lock = threading.Lock()
+        self.compile_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self._lock = threading.Lock()
+        self._logits = _logits_module(self.model)
+        self._compiled = {}
+        if mode == 'compile':
+            self._shared = torch.compile(self._logits, dynamic=False)
+
+    def bucket_for(self, length: int) -> int:
+        for bucket in self.buckets:
+            if length <= bucket:
+                return bucket
+        return self.buckets[-1]
+
+    def batch_limit(self, bucket: int, batch_size: Optional[int] = None) -> int:
+        """Rows per forward pass for a bucket: the largest power of two within
+        the batch size and the token budget."""
+        limit = max(1, min(batch_size or self.max_batch, self.max_batch, BATCH_TOKEN_BUDGET // bucket))
+        return 1 << (limit.bit_length() - 1)
+
+    def batch_shapes(self, bucket: int) -> List[int]:
+        """Every batch size classify_ids may run a bucket at."""
+        return [1 << i for i in range(self.batch_limit(bucket).bit_length())]
+
+    def _count(self, bucket: int, rows: int):
+        with self._hits_lock:
+            self.bucket_hits[bucket] = self.bucket_hits.get(bucket, 0) + rows
+
+    def _module(self, bucket: int, rows: int = 1):
+        """The compiled module for a (rows, bucket) shape, compiling it on first use."""
+        module = self._compiled.get((rows, bucket))
+        if module is not None:
+            return module
+        with self._lock:
+            if (rows, bucket) not in self._compiled:
+                import torch
+                started = time.monotonic()
+                if self.mode == 'trace':
+                    example = self._dummy(bucket, rows)
+                    with torch.inference_mode(False), torch.no_grad():
+                        module = torch.jit.trace(self._logits, example, check_trace=False)
+                else:
+                    module = self._shared
+                self._compiled[(rows, bucket)] = module
+                self.compile_seconds += time.monotonic() - started
+            return self._compiled[(rows, bucket)]
+
+    def _dummy(self, bucket: int, rows: int = 1):
+        import torch
+        input_ids = torch.full((rows, bucket), self.tokenizer.pad_token_id or 0, dtype=torch.long)
+        input_ids[:, 0] = self.tokenizer.cls_token_id or self.tokenizer.bos_token_id or 0
+        return input_ids, torch.ones((rows, bucket), dtype=torch.long)
+
+    def warm_up(self, runs: int = WARMUP_RUNS):
+        """Compile and run every bucket so no request pays first-call costs."""
+        import torch
+        started = time.monotonic()
+        for bucket in self.buckets:
+            for rows in self.batch_shapes(bucket):
+                module = self._module(bucket, rows)
+                # Same grad mode and tensor kind as _classify_batch, or torch.compile
+                # guards would send the first real request back to the compiler
+                with torch.inference_mode():
+                    example = self._dummy(bucket, rows)
+                    for _ in range(runs):
+                        module(*example)
+        self.warmup_seconds = time.monotonic() - started
+        logging.info(
+            f"Compiled ({self.mode}) and warmed {len(self._compiled)} shapes over "
+            f"{len(self.buckets)} buckets {list(self.buckets)} in {self.warmup_seconds:.1f}s"
+        )
+
+    def preprocess(self, text: str) -> Dict:
+        encoded = self.tokenizer(
+            text, truncation=True, max_length=self.max_length, return_tensors='pt'
+        )
+        from torch.nn.functional import pad
+        length = encoded['input_ids'].shape[1]
+        extra = self.bucket_for(length) - length
+        return {
+            'input_ids': pad(encoded['input_ids'], (0, extra), value=self.tokenizer.pad_token_id or 0),
+            'attention_mask': pad(encoded['attention_mask'], (0, extra), value=0)
+        }
+
+    def _run(self, input_ids, attention_mask):
+        import torch
+        rows, bucket = input_ids.shape
+        with torch.no_grad():
+            return self._module(bucket, rows)(input_ids, attention_mask)
+
+    def forward(self, inputs: Dict):
+        self._count(inputs['input_ids'].shape[1], inputs['input_ids'].shape[0])
+        return self._run(inputs['input_ids'], inputs['attention_mask'])
+
+    def postprocess(self, logits) -> Dict:
+        probabilities = logits[0].float().softmax(-1)
+        best = int(probabilities.argmax())
+        return {'label': self.labels[best], 'score': float(probabilities[best])}
+
+    def classify_ids(self, rows: Sequence[List[int]], batch_size: Optional[int] = None) -> List[Dict]:
+        """Top label per row of already-tokenized IDs (see tokenization.py),
+        encoded with max_length=self.max_length. Rows of one bucket are
+        stacked into batches; a short last batch is padded with filler rows
+        up to the next warmed shape."""
+        from tokenization import pad_batch, top_labels
+        pad_id = self.tokenizer.pad_token_id or 0
+        by_bucket = {}
+        for i, row in enumerate(rows):
+            by_bucket.setdefault(self.bucket_for(len(row)), []).append(i)
+        results = [None] * len(rows)
+        for bucket, indices in by_bucket.items():
+            limit = self.batch_limit(bucket, batch_size)
+            for start in range(0, len(indices), limit):
+                batch = indices[start:start + limit]
+                shape = 1 << (len(batch) - 1).bit_length()
+                input_ids, attention_mask = pad_batch(
+                    [rows[i] for i in batch] + [[pad_id]] * (shape - len(batch)), pad_id, bucket
+                )
+                logits = self._run(input_ids, attention_mask)
+                for i, label in zip(batch, top_labels(logits[:len(batch)], self.labels)):
+                    results[i] = label
+            self._count(bucket, len(indices))
+        return results
+
+    def __call__(self, text: str) -> List[Dict]:
+        return [self.postprocess(self.forward(self.preprocess(text)))]
+
+    def stats(self) -> Dict:
+        return {
+            'mode': self.mode,
+            'buckets': list(self.buckets),
+            'bucket_hits': dict(self.bucket_hits),
+            'compile_seconds': round(self.compile_seconds, 2),
+            'warmup_seconds': round(self.warmup_seconds, 2)
+        }
+
+def _logits_module(model):
+    """Module returning logits only, with positional inputs, so it traces."""
+    import torch
+
+    class Logits(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+    return Logits(model).eval()
+
+def compiled_loader(loader, mode: str, buckets: Tuple[int, ...], max_batch: int = INFERENCE_BATCH_SIZE):
+    """Wrap a pipeline loader so the model is compiled and warmed as it loads."""
+    def load():
+        classifier = BucketedClassifier(loader(), mode, buckets, max_batch)
+        classifier.warm_up()
+        return classifier
+    return load
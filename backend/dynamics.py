@@ -0,0 +1,120 @@
+"""Conversation dynamics from the timeline's timestamps and speakers.
+
+Transcripts only carry each turn's start time, to the second, so a turn's
+speaking time is estimated from its word count and capped by the next
+turn's start. Everything is computed in one vectorised pass over arrays
+parsed once from the timeline:
+
+  talk_time        seconds, share and turns per speaker
+  agent_response   gap between a customer finishing and the agent starting
+  longest_customer_monologue
+                   longest run of consecutive customer turns
+  silence          gaps between turns longer than SILENCE_SECONDS
+  overlaps         turns that start while the previous speaker is still talking
+
+Calls with fewer than two distinct parseable timestamps have no timing to
+measure, so they get no dynamics at all rather than all-zero gaps.
+"""
+import re
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from analysis_store import entry_speaker, entry_when
+from timeline import parse_timestamp, timestamps_to_seconds
+
+# Bump when the metrics below change; stored analyses are refreshed by rescore.py
+DYNAMICS_VERSION = '1'
+# ~150 words per minute
+WORDS_PER_SECOND = 2.5
+SILENCE_SECONDS = 3
+# Timestamps are whole seconds; smaller overruns are rounding, not overlap
+OVERLAP_TOLERANCE = 1.0
+AGENT_SPEAKER = re.compile(r'agent', re.IGNORECASE)
+
+def _seconds_summary(values: np.ndarray) -> Dict:
+    if not len(values):
+        return {'count': 0, 'median_seconds': None, 'p90_seconds': None, 'max_seconds': None}
+    return {
+        'count': int(len(values)),
+        'median_seconds': round(float(np.median(values)), 1),
+        'p90_seconds': round(float(np.percentile(values, 90)), 1),
+        'max_seconds': round(float(values.max()), 1)
+    }
+
+def compute_dynamics(whens: Sequence[str], speakers: Sequence[str], texts: Sequence[str]) -> Optional[Dict]:
+    """Dynamics of one call; whens/speakers/texts are aligned with the timeline."""
+    if not len(whens):
+        return None
+    parsed = {parse_timestamp(when) for when in whens} - {None}
+    if len(parsed) < 2:
+        return None
+    starts = timestamps_to_seconds(whens).astype(np.float64)
+    names, codes = np.unique(np.asarray(speakers, dtype=object).astype(str), return_inverse=True)
+    is_agent = np.array([bool(AGENT_SPEAKER.search(name)) for name in names])[codes]
+    speech = np.array([len(text.split()) for text in texts], dtype=np.float64) / WORDS_PER_SECOND
+
+    # Time until the next turn starts; the last turn just talks for its estimate
+    until_next = np.append(np.maximum(np.diff(starts), 0), speech[-1])
+    spoken = np.minimum(speech, until_next)
+    gaps = (until_next - speech)[:-1]
+    switches = codes[1:] != codes[:-1]
+
+    talk = np.bincount(codes, weights=spoken, minlength=len(names))
+    turns = np.bincount(codes, minlength=len(names))
+    total_talk = talk.sum()
+
+    # Customer turn followed by an agent turn
+    handoffs = ~is_agent[:-1] & is_agent[1:]
+    latencies = np.maximum(gaps[handoffs], 0)
+
+    # Runs of consecutive turns by the same speaker
+    run_starts = np.flatnonzero(np.append(True, switches))
+    run_ends = np.append(run_starts[1:], len(codes)) - 1
+    run_seconds = starts[run_ends] + spoken[run_ends] - starts[run_starts]
+    customer_runs = np.flatnonzero(~is_agent[run_starts])
+    monologue = None
+    if len(customer_runs):
+        longest = customer_runs[np.argmax(run_seconds[customer_runs])]
+        monologue = {
+            'speaker': str(names[codes[run_starts[longest]]]),
+            'seconds': round(float(run_seconds[longest]), 1),
+            'turns': int(run_ends[longest] - run_starts[longest] + 1),
+            'start': whens[run_starts[longest]]
+        }
+
+    silences = gaps[gaps > SILENCE_SECONDS]
+    return {
+        'duration_seconds': int(starts[-1] + spoken[-1] - starts[0]),
+        'talk_time': {
+            str(name): {
+                'seconds': round(float(talk[i]), 1),
+                'share': round(float(talk[i] / total_talk), 3) if total_talk else 0.0,
+                'turns': int(turns[i])
+            }
+            for i, name in enumerate(names)
+        },
+        'agent_response': _seconds_summary(latencies),
+        'longest_customer_monologue': monologue,
+        'silence': {
+            'count': int(len(silences)),
+            'total_seconds': round(float(silences.sum()), 1),
+            'longest_seconds': round(float(silences.max()), 1) if len(silences) else None
+        },
+        'overlaps': int(np.count_nonzero(switches & (-gaps > OVERLAP_TOLERANCE))),
+        'speaker_switches': int(np.count_nonzero(switches)),
+        'version': DYNAMICS_VERSION
+    }
+
+def agent_talk_share(dynamics: Dict) -> Optional[float]:
+    """Share of talk time by speakers recognised as the agent."""
+    if not dynamics:
+        return None
+    return round(sum(
+        stats['share'] for speaker, stats in dynamics['talk_time'].items()
+        if AGENT_SPEAKER.search(speaker)
+    ), 3)
+
+def timeline_dynamics(timeline: List[Dict], texts: Sequence[str]) -> Optional[Dict]:
+    """compute_dynamics for a stored timeline (either key naming)."""
+    return compute_dynamics(
+        [entry_when(e) for e in timeline], [entry_speaker(e) for e in timeline], texts
+    )
@@ -0,0 +1,316 @@
+"""Bulk export of stored analyses as flat tables.
+
+Two tables are produced from the files under USER_DATA_DIR:
+  utterances - one row per timeline entry (speaker, time, score, emotion, text)
+  calls      - one row per analysis (overall score, topic coverage, counts)
+
+Rows are streamed one analysis at a time into CSV chunks or Parquet row
+groups, optionally inside a zip, so memory does not grow with the number
+of analyses exported.
+
+    python export.py --since 2025-01-01 --agent someone@example.com -o calls.csv --table calls
+    python export.py --format parquet --zip -o export.zip
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import zipfile
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from analysis_store import (
+    USER_DATA_DIR, iter_analysis_files, load_analysis, transcript_path,
+    analysis_saved_at, analysis_agent, entry_mood, entry_speaker, entry_when,
+    overall_mood
+)
+from transcript_parser import parse_transcript
+from timeline import parse_timestamp
+from dynamics import agent_talk_share
+
+FORMATS = ('csv', 'parquet')
+TABLES = ('utterances', 'calls')
+# Topics scored by ConversationAnalyzer.find_topics
+TOPICS = ('pricing', 'product', 'support', 'technical', 'satisfaction')
+CSV_CHUNK_ROWS = 1000
+PARQUET_ROW_GROUP_ROWS = 50000
+
+# column -> pyarrow type name
+COLUMNS = {
+    'utterances': {
+        'user_id': 'string', 'analysis_id': 'string', 'agent': 'string',
+        'saved_at': 'string', 'position': 'int32', 'speaker': 'string',
+        'timestamp': 'string', 'seconds': 'int32', 'score': 'float32',
+        'confidence': 'float32', 'emotion': 'string', 'key_phrases': 'string',
+        'text': 'string'
+    },
+    'calls': {
+        'user_id': 'string', 'analysis_id': 'string', 'agent': 'string',
+        'saved_at': 'string', 'utterances': 'int32', 'speakers': 'int32',
+        'duration_seconds': 'int32', 'overall_score': 'float32',
+        'overall_confidence': 'float32',
+        **{f'topic_{topic}': 'float32' for topic in TOPICS},
+        'agent_talk_share': 'float32', 'agent_response_median': 'float32',
+        'agent_response_max': 'float32', 'longest_customer_monologue': 'float32',
+        'silence_gaps': 'int32', 'silence_seconds': 'float32', 'overlaps': 'int32'
+    }
+}
+
+class ExportFilter:
+    """Which stored analyses to include; everything here is decided from
+    the file name and mtime, so skipped analyses are never opened."""
+    def __init__(
+        self,
+        user_id: Optional[str] = None,
+        agent: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ):
+        self.user_id = user_id
+        self.agent = agent
+        self.since = since
+        self.until = until
+
+    def matches(self, record: Dict) -> bool:
+        if self.agent and record['agent'] != self.agent:
+            return False
+        saved_at = record['saved_at']
+        if self.since and saved_at < self.since:
+            return False
+        if self.until and saved_at >= self.until:
+            return False
+        return True
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """'YYYY-MM-DD' or a full ISO timestamp."""
+    return datetime.fromisoformat(value) if value else None
+
+def iter_records(selection: ExportFilter, base_dir: str = USER_DATA_DIR) -> Iterator[Dict]:
+    for record in iter_analysis_files(base_dir, selection.user_id):
+        record['agent'] = analysis_agent(record['analysis_id']) or f"user:{record['user_id']}"
+        record['saved_at'] = (
+            analysis_saved_at(record['analysis_id']) or datetime.fromtimestamp(record['mtime'])
+        )
+        if selection.matches(record):
+            yield record
+
+def _transcript_texts(record: Dict, base_dir: str, expected: int) -> List[str]:
+    """Utterance texts from the raw transcript, when it lines up with the timeline."""
+    path = transcript_path(record, base_dir)
+    if not os.path.isfile(path):
+        return []
+    with open(path, errors='replace') as f:
+        transcript = parse_transcript(f.read())
+    return [entry['text'] for entry in transcript] if len(transcript) == expected else []
+
+def _row_keys(record: Dict) -> Dict:
+    return {
+        'user_id': record['user_id'],
+        'analysis_id': record['analysis_id'],
+        'agent': record['agent'],
+        'saved_at': record['saved_at'].isoformat()
+    }
+
+def utterance_rows(record: Dict, analysis: Dict, base_dir: str = USER_DATA_DIR) -> Iterator[Dict]:
+    timeline = analysis.get('timeline', [])
+    texts = _transcript_texts(record, base_dir, len(timeline))
+    keys = _row_keys(record)
+    for position, entry in enumerate(timeline):
+        mood = entry_mood(entry)
+        timestamp = entry_when(entry)
+        yield {
+            **keys,
+            'position': position,
+            'speaker': entry_speaker(entry),
+            'timestamp': timestamp,
+            'seconds': parse_timestamp(timestamp),
+            'score': mood.get('score'),
+            'confidence': mood.get('confidence'),
+            'emotion': mood.get('emotion'),
+            'key_phrases': '; '.join(mood.get('key_phrases', [])),
+            'text': texts[position].strip() if texts else None
+        }
+
+def call_rows(record: Dict, analysis: Dict, base_dir: str = USER_DATA_DIR) -> Iterator[Dict]:
+    timeline = analysis.get('timeline', [])
+    seconds = [s for s in (parse_timestamp(entry_when(e)) for e in timeline) if s is not None]
+    mood = overall_mood(analysis)
+    topics = analysis.get('topics', {})
+    # Stored by the dynamics stage; older analyses get it from rescore.py
+    dynamics = analysis.get('dynamics') or {}
+    response = dynamics.get('agent_response') or {}
+    silence = dynamics.get('silence') or {}
+    yield {
+        **_row_keys(record),
+        'utterances': len(timeline),
+        'speakers': len({entry_speaker(e) for e in timeline}),
+        'duration_seconds': max(seconds) - min(seconds) if seconds else None,
+        'overall_score': mood.get('score'),
+        'overall_confidence': mood.get('confidence'),
+        **{f'topic_{topic}': topics.get(topic, 0.0) for topic in TOPICS},
+        'agent_talk_share': agent_talk_share(dynamics),
+        'agent_response_median': response.get('median_seconds'),
+        'agent_response_max': response.get('max_seconds'),
+        'longest_customer_monologue': (dynamics.get('longest_customer_monologue') or {}).get('seconds'),
+        'silence_gaps': silence.get('count'),
+        'silence_seconds': silence.get('total_seconds'),
+        'overlaps': dynamics.get('overlaps')
+    }
+
+ROW_BUILDERS = {'utterances': utterance_rows, 'calls': call_rows}
+
+def iter_rows(table: str, selection: ExportFilter, base_dir: str = USER_DATA_DIR) -> Iterator[Dict]:
+    build = ROW_BUILDERS[table]
+    for record in iter_records(selection, base_dir):
+        try:
+            analysis = load_analysis(record['path'])
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping {record['path']}: {e}")
+            continue
+        yield from build(record, analysis, base_dir)
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose buffered bytes are handed out and cleared by take()."""
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def _csv_chunks(rows: Iterator[Dict], columns: List[str], sink) -> Iterator[None]:
+    """Write CSV into sink; yields after each chunk so the caller can drain it."""
+    text = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+    writer = csv.DictWriter(text, fieldnames=columns)
+    writer.writeheader()
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % CSV_CHUNK_ROWS == 0:
+            yield
+    text.detach()
+    yield
+
+def _parquet_chunks(rows: Iterator[Dict], table: str, sink) -> Iterator[None]:
+    """Write Parquet into sink, one row group per PARQUET_ROW_GROUP_ROWS rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in COLUMNS[table].items()])
+    columns = {name: [] for name in schema.names}
+
+    def flush(writer):
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        pending = 0
+        for row in rows:
+            for name, values in columns.items():
+                values.append(row[name])
+            pending += 1
+            if pending == PARQUET_ROW_GROUP_ROWS:
+                flush(writer)
+                pending = 0
+                yield
+        if pending:
+            flush(writer)
+    yield
+
+def _table_chunks(fmt: str, table: str, selection: ExportFilter, base_dir: str, sink) -> Iterator[None]:
+    rows = iter_rows(table, selection, base_dir)
+    if fmt == 'parquet':
+        return _parquet_chunks(rows, table, sink)
+    return _csv_chunks(rows, list(COLUMNS[table]), sink)
+
+def export_filename(fmt: str, tables: List[str], zipped: bool) -> str:
+    stamp = datetime.now().strftime('%Y%m%d_%H%M')
+    name = f"analyses_{'_'.join(tables)}_{stamp}"
+    return f"{name}.zip" if zipped else f"{name}.{fmt}"
+
+def stream_export(
+    fmt: str,
+    tables: List[str],
+    selection: ExportFilter,
+    zipped: bool = False,
+    base_dir: str = USER_DATA_DIR
+) -> Iterator[bytes]:
+    """Yield the export as byte chunks. Several tables require zipped=True."""
+    if fmt not in FORMATS or not tables or any(t not in TABLES for t in tables):
+        raise ValueError(f"format must be one of {FORMATS}, tables from {TABLES}")
+    if len(tables) > 1 and not zipped:
+        raise ValueError("Exporting several tables needs zip")
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow installed")
+
+    drain = _Drain()
+    if not zipped:
+        for _ in _table_chunks(fmt, tables[0], selection, base_dir, drain):
+            chunk = drain.take()
+            if chunk:
+                yield chunk
+        return
+
+    # zipfile writes data descriptors when the output is not seekable. Each
+    # table is written to its own drain first since zip members cannot tell().
+    archive_drain = _Drain()
+    with zipfile.ZipFile(archive_drain, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for table in tables:
+            drain = _Drain()
+            info = zipfile.ZipInfo(f"{table}.{fmt}", date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w', force_zip64=True) as member:
+                for _ in _table_chunks(fmt, table, selection, base_dir, drain):
+                    member.write(drain.take())
+                    chunk = archive_drain.take()
+                    if chunk:
+                        yield chunk
+    yield archive_drain.take()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--table', choices=TABLES + ('all',), default='utterances')
+    parser.add_argument('--zip', action='store_true', help='zip archive (implied by --table all)')
+    parser.add_argument('--user-id')
+    parser.add_argument('--agent', help='agent email from the transcript file name')
+    parser.add_argument('--since', help='saved on or after, YYYY-MM-DD')
+    parser.add_argument('--until', help='saved before, YYYY-MM-DD')
+    parser.add_argument('--data-dir', default=USER_DATA_DIR)
+    args = parser.parse_args()
+
+    tables = list(TABLES) if args.table == 'all' else [args.table]
+    selection = ExportFilter(args.user_id, args.agent, parse_date(args.since), parse_date(args.until))
+    chunks = stream_export(
+        args.format, tables, selection, args.zip or len(tables) > 1, args.data_dir
+    )
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    print(f"Wrote {written} bytes", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
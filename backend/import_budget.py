@@ -0,0 +1,147 @@
+"""Import-time budget for the app entry points.
+
+Imports each entry point in a fresh interpreter with `-X importtime`, fails
+if it pulls in a module that should only load on first use (torch,
+transformers, spacy, plotly, ...) or if the median cumulative import time
+goes over its budget. tests/test_import_budget.py enforces it under pytest;
+run it directly for the breakdown:
+
+    python import_budget.py
+    python import_budget.py --runs 5 --top 15 --json import_times.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> directory, module, forbidden modules, budget in ms
+ENTRY_POINTS = {
+    'backend.sentiment_analyzer': {
+        'cwd': 'backend',
+        'module': 'sentiment_analyzer',
+        'forbidden': ['torch', 'transformers', 'spacy'],
+        'budget_ms': float(os.environ.get('IMPORT_BUDGET_ANALYZER_MS', 400))
+    },
+    'backend.app': {
+        'cwd': 'backend',
+        'module': 'app',
+        'forbidden': ['torch', 'transformers', 'spacy', 'sklearn', 'scipy'],
+        'budget_ms': float(os.environ.get('IMPORT_BUDGET_BACKEND_MS', 1500))
+    },
+    'frontend.app': {
+        'cwd': 'frontend',
+        'module': 'app',
+        'forbidden': ['plotly', 'werkzeug'],
+        'budget_ms': float(os.environ.get('IMPORT_BUDGET_FRONTEND_MS', 3000))
+    }
+}
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Rows of (module, self_us, cumulative_us, depth) from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            rows.append({
+                'module': match.group(4),
+                'self_us': int(match.group(1)),
+                'cumulative_us': int(match.group(2)),
+                'depth': (len(match.group(3)) - 1) // 2
+            })
+    return rows
+
+def measure(name: str, spec: Dict, scratch: str) -> Dict:
+    """One cold import of an entry point in a child interpreter."""
+    probe = (
+        f"import sys, json; import {spec['module']}; "
+        "print(json.dumps(sorted(sys.modules)))"
+    )
+    env = dict(
+        os.environ,
+        # Empty stores, so background index loads have nothing to do
+        USER_DATA_DIR=os.path.join(scratch, 'user_data'),
+        INDEX_DIR=os.path.join(scratch, 'index'),
+        ANALYZER_PRELOAD='0'
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=os.path.join(ROOT, spec['cwd']),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300
+    )
+    if result.returncode != 0:
+        tail = result.stderr.strip().splitlines()[-1:] or ['no output']
+        raise RuntimeError(f"{name}: import failed: {tail[0]}")
+    rows = parse_importtime(result.stderr)
+    modules = json.loads(result.stdout.strip().splitlines()[-1])
+    top_level = [r for r in rows if r['depth'] == 0]
+    return {
+        'total_ms': sum(r['cumulative_us'] for r in top_level) / 1000,
+        'modules': modules,
+        'heaviest': sorted(top_level, key=lambda r: -r['cumulative_us'])
+    }
+
+def check(name: str, spec: Dict, runs: int, scratch: str) -> Dict:
+    samples = [measure(name, spec, scratch) for _ in range(runs)]
+    loaded = set(samples[-1]['modules'])
+    leaked = sorted(
+        forbidden for forbidden in spec['forbidden']
+        if any(m == forbidden or m.startswith(forbidden + '.') for m in loaded)
+    )
+    median_ms = statistics.median(s['total_ms'] for s in samples)
+    return {
+        'entry_point': name,
+        'median_ms': round(median_ms, 1),
+        'budget_ms': spec['budget_ms'],
+        'forbidden_loaded': leaked,
+        'ok': not leaked and median_ms <= spec['budget_ms'],
+        'heaviest': [
+            {'module': r['module'], 'cumulative_ms': round(r['cumulative_us'] / 1000, 1)}
+            for r in samples[-1]['heaviest']
+        ]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('entry_points', nargs='*', default=list(ENTRY_POINTS),
+                        help=f"subset of {', '.join(ENTRY_POINTS)}")
+    parser.add_argument('--runs', type=int, default=3, help='cold imports per entry point')
+    parser.add_argument('--top', type=int, default=10, help='heaviest imports to list')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for name in args.entry_points:
+            try:
+                result = check(name, ENTRY_POINTS[name], args.runs, scratch)
+            except RuntimeError as e:
+                print(f"FAIL {e}")
+                results.append({'entry_point': name, 'ok': False, 'error': str(e)})
+                continue
+            results.append(result)
+            status = 'ok' if result['ok'] else 'FAIL'
+            print(f"{status:>4} {name}: {result['median_ms']}ms (budget {result['budget_ms']:.0f}ms)")
+            if result['forbidden_loaded']:
+                print(f"     loaded at import time: {', '.join(result['forbidden_loaded'])}")
+            for row in result['heaviest'][:args.top]:
+                print(f"     {row['cumulative_ms']:>8.1f}ms  {row['module']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if all(r['ok'] for r in results) else 1)
+
+if __name__ == '__main__':
+    main()
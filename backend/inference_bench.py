@@ -0,0 +1,125 @@
+"""Eager vs compiled (length-bucketed) classifier latency.
+
+Runs the same utterances through the eager HF pipeline and through
+BucketedClassifier, and reports load/warm-up time, the first requests
+after load, steady-state p50/p99 and label agreement.
+
+    python inference_bench.py --model mood --texts transcript.txt
+    python inference_bench.py --model emotion --mode compile --runs 5 --json report.json
+"""
+import argparse
+import json
+import random
+import time
+from typing import Dict, List
+import numpy as np
+
+COLD_REQUESTS = 5
+
+def load_texts(path: str = None, count: int = 200) -> List[str]:
+    """Utterances from a transcript, or synthetic ones of mixed length."""
+    if path:
+        from transcript_parser import parse_transcript
+        with open(path) as f:
+            raw = f.read()
+        turns = json.loads(raw) if path.endswith('.json') else parse_transcript(raw)
+        return [turn['text'] for turn in turns if turn.get('text', '').strip()]
+    words = ('the price was fine but support took forever to resolve my billing issue '
+             'thanks so much for the help today I am really happy with the new feature').split()
+    rng = random.Random(0)
+    return [' '.join(rng.choice(words) for _ in range(int(rng.lognormvariate(2.3, 0.8)) + 1))
+            for _ in range(count)]
+
+def _latencies(classify, texts: List[str], runs: int) -> Dict:
+    import torch
+    with torch.inference_mode():
+        cold = []
+        for text in texts[:COLD_REQUESTS]:
+            started = time.perf_counter()
+            classify(text)
+            cold.append(time.perf_counter() - started)
+        steady, labels = [], []
+        for run in range(runs):
+            for text in texts:
+                started = time.perf_counter()
+                result = classify(text)
+                steady.append(time.perf_counter() - started)
+                if run == 0:
+                    labels.append(result[0]['label'])
+    steady = np.array(steady) * 1000
+    return {
+        'first_request_ms': round(cold[0] * 1000, 2),
+        'cold_mean_ms': round(float(np.mean(cold)) * 1000, 2),
+        'p50_ms': round(float(np.percentile(steady, 50)), 2),
+        'p99_ms': round(float(np.percentile(steady, 99)), 2),
+        'mean_ms': round(float(steady.mean()), 2),
+        'requests': len(steady),
+        'labels': labels
+    }
+
+def bench(loader, texts: List[str], mode: str, buckets, runs: int) -> Dict:
+    from compiled_inference import BucketedClassifier
+
+    started = time.monotonic()
+    eager = loader()
+    eager_load = time.monotonic() - started
+    report = {'eager': {'load_seconds': round(eager_load, 2), **_latencies(eager, texts, runs)}}
+
+    started = time.monotonic()
+    compiled = BucketedClassifier(loader(), mode, buckets)
+    compiled.warm_up()
+    report['compiled'] = {
+        'load_seconds': round(time.monotonic() - started, 2),
+        **_latencies(compiled, texts, runs),
+        **compiled.stats()
+    }
+    eager_labels = report['eager'].pop('labels')
+    compiled_labels = report['compiled'].pop('labels')
+    report['label_agreement'] = round(
+        sum(a == b for a, b in zip(eager_labels, compiled_labels)) / max(1, len(eager_labels)), 4
+    )
+    return report
+
+def main():
+    from compiled_inference import COMPILE_MODES, length_buckets
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', choices=('mood', 'emotion'), default='mood')
+    parser.add_argument('--model-path', help='local text-classification model instead of --model')
+    parser.add_argument('--mode', choices=COMPILE_MODES, default='trace')
+    parser.add_argument('--texts', help='transcript .txt or JSON list of turns (default: synthetic)')
+    parser.add_argument('--runs', type=int, default=3, help='passes over the texts')
+    parser.add_argument('--threads', type=int, help='torch intra-op threads')
+    parser.add_argument('--json', help='also write the report here')
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.model_path:
+        from transformers import pipeline
+        loader = lambda: pipeline('text-classification', model=args.model_path, device='cpu')  # noqa: E731
+    else:
+        from sentiment_analyzer import _load_mood_detector, _load_emotion_finder
+        loader = _load_mood_detector if args.model == 'mood' else _load_emotion_finder
+
+    texts = load_texts(args.texts)
+    report = {
+        'model': args.model_path or args.model,
+        'texts': len(texts),
+        'torch_threads': torch.get_num_threads(),
+        **bench(loader, texts, args.mode, length_buckets(), args.runs)
+    }
+    print(f"{report['model']}: {report['texts']} texts x {args.runs} runs, "
+          f"{report['torch_threads']} threads")
+    print(f"{'':10}{'load s':>8}{'first ms':>10}{'cold ms':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for path in ('eager', 'compiled'):
+        r = report[path]
+        print(f"{path:10}{r['load_seconds']:>8}{r['first_request_ms']:>10}{r['cold_mean_ms']:>9}"
+              f"{r['p50_ms']:>9}{r['p99_ms']:>9}")
+    print(f"label agreement {report['label_agreement']:.2%}, buckets used {report['compiled']['bucket_hits']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
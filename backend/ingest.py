@@ -0,0 +1,197 @@
+"""Request bodies for /analyze and /analyze/batch.
+
+Clients can send a transcript the way they have it:
+
+  text/plain            the raw call-recorder file, parsed here
+  application/json      {"transcript": [turns]} or a bare list of turns
+  multipart/form-data   a 'transcript' part (raw or JSON; .gz parts are gunzipped)
+
+With Content-Encoding: gzip the body is decompressed chunk by chunk as it
+is read, so a streamed upload never sits in memory compressed and
+decompressed at once. Raw files are parsed with transcript_parser, the same
+parser the rescorer uses, so the frontend no longer parses or re-encodes
+them as JSON.
+"""
+import os
+import io
+import re
+import zlib
+from typing import Dict, List, Tuple
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
+from werkzeug.http import parse_options_header
+from response_shaping import decode_json
+from transcript_parser import parse_transcript
+
+# Decompressed size of one request
+MAX_TRANSCRIPT_BYTES = int(os.environ.get('MAX_TRANSCRIPT_MB', 50)) * 2**20
+BATCH_MAX_TRANSCRIPTS = int(os.environ.get('BATCH_MAX_TRANSCRIPTS', 100))
+READ_CHUNK_BYTES = 64 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+# Raw transcripts start with '[Speaker 00:00]', JSON lists of turns with '[{'
+_JSON_START = re.compile(rb'\s*(\{|\[\s*[{\]])')
+
+class IngestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class BodyTooLarge(IngestError):
+    def __init__(self):
+        super().__init__(413, 'Request body too large')
+
+class BodyDecoder:
+    """Collects a request body, gunzipping each chunk as it arrives."""
+    def __init__(self, content_encoding: str = '', limit: int = MAX_TRANSCRIPT_BYTES):
+        encoding = (content_encoding or '').strip().lower()
+        if encoding not in ('', 'identity', 'gzip', 'x-gzip'):
+            raise IngestError(415, f"Unsupported Content-Encoding '{encoding}'")
+        self.limit = limit
+        self.size = 0
+        self._gunzip = zlib.decompressobj(wbits=31) if encoding in ('gzip', 'x-gzip') else None
+        self._chunks = []
+
+    def _add(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.limit:
+            raise BodyTooLarge()
+        self._chunks.append(chunk)
+
+    def feed(self, chunk: bytes):
+        if self._gunzip is None:
+            return self._add(chunk)
+        try:
+            # Capped output, so a small bomb can't expand past the limit
+            data = self._gunzip.decompress(chunk, self.limit - self.size + 1)
+        except zlib.error:
+            raise IngestError(400, 'Invalid gzip body')
+        if self._gunzip.unconsumed_tail:
+            raise BodyTooLarge()
+        self._add(data)
+
+    def finish(self) -> bytes:
+        if self._gunzip is not None:
+            self._add(self._gunzip.flush())
+            if not self._gunzip.eof:
+                raise IngestError(400, 'Truncated gzip body')
+        return b''.join(self._chunks)
+
+def read_stream(stream, content_encoding: str = '') -> bytes:
+    """Decoded body of a WSGI input stream."""
+    decoder = BodyDecoder(content_encoding)
+    while True:
+        chunk = stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return decoder.finish()
+        decoder.feed(chunk)
+
+def _gunzip(raw: bytes) -> bytes:
+    decoder = BodyDecoder('gzip')
+    decoder.feed(raw)
+    return decoder.finish()
+
+def _decode_json(raw: bytes):
+    try:
+        return decode_json(raw)
+    except ValueError:
+        raise IngestError(400, 'Invalid JSON body')
+
+def _is_json(mimetype: str, filename: str, raw: bytes) -> bool:
+    if mimetype == 'application/json' or mimetype.endswith('+json') or filename.endswith('.json'):
+        return True
+    if mimetype or filename:
+        return False
+    return _JSON_START.match(raw) is not None
+
+def transcript_turns(raw: bytes, mimetype: str = '', filename: str = '') -> List[Dict]:
+    """Turns of one transcript given as raw text or JSON, gzipped or not."""
+    if filename.endswith('.gz') or raw[:2] == GZIP_MAGIC:
+        raw = _gunzip(raw)
+        filename = filename[:-3] if filename.endswith('.gz') else filename
+    if _is_json(mimetype, filename, raw):
+        data = _decode_json(raw)
+        turns = data.get('transcript') if isinstance(data, dict) else data
+        if not isinstance(turns, list):
+            raise IngestError(400, 'JSON transcripts must be a list of turns')
+        return turns
+    turns = parse_transcript(raw.decode('utf-8', errors='replace'))
+    if not turns:
+        raise IngestError(400, 'No "[Speaker 00:00]" turns found in transcript')
+    return turns
+
+def _form_parts(body: bytes, mimetype: str, options: Dict) -> Tuple[Dict, List[Tuple[str, str, bytes]]]:
+    """(form fields, [(field name, filename, bytes)]) of a multipart body."""
+    try:
+        _, form, files = FormDataParser(max_content_length=MAX_TRANSCRIPT_BYTES, silent=False).parse(
+            io.BytesIO(body), mimetype, len(body), options
+        )
+    except RequestEntityTooLarge:
+        raise BodyTooLarge()
+    except ValueError:
+        # Missing boundary, truncated or otherwise malformed parts
+        raise IngestError(400, 'Invalid multipart body')
+    parts = [(name, f.filename or '', f.read()) for name, f in files.items(multi=True)]
+    return form, parts
+
+def read_request(body: bytes, content_type: str) -> Dict:
+    """/analyze input as {'transcript': turns}; JSON objects pass through
+    unchanged so parse_analysis_request reports what's missing."""
+    mimetype, options = parse_options_header(content_type or '')
+    if mimetype == 'multipart/form-data':
+        form, parts = _form_parts(body, mimetype, options)
+        for name, filename, raw in parts:
+            if name == 'transcript':
+                return {'transcript': transcript_turns(raw, filename=filename)}
+        if 'transcript' in form:
+            return {'transcript': transcript_turns(form['transcript'].encode())}
+        return {}
+    if not body:
+        return {}
+    if _is_json(mimetype, '', body) and body[:2] != GZIP_MAGIC:
+        data = _decode_json(body)
+        return {'transcript': data} if isinstance(data, list) else data
+    if mimetype == 'text/plain':
+        return {'transcript': transcript_turns(body, mimetype)}
+    if mimetype not in ('', 'application/gzip', 'application/octet-stream'):
+        raise IngestError(415, f"Unsupported Content-Type '{mimetype}'")
+    return {'transcript': transcript_turns(body)}
+
+def read_batch(body: bytes, content_type: str) -> List[Dict]:
+    """/analyze/batch input as [{'name', 'transcript'}]. Multipart bodies
+    carry one transcript per file part; JSON bodies are
+    {"transcripts": [{"name": ..., "transcript": [turns] | "text": raw}]}."""
+    mimetype, options = parse_options_header(content_type or '')
+    if mimetype == 'multipart/form-data':
+        _, parts = _form_parts(body, mimetype, options)
+        items = [{'name': filename or f"{name}-{i}", 'raw': raw, 'filename': filename}
+                 for i, (name, filename, raw) in enumerate(parts)]
+    elif _is_json(mimetype, '', body):
+        data = _decode_json(body)
+        transcripts = data.get('transcripts') if isinstance(data, dict) else data
+        if not isinstance(transcripts, list):
+            raise IngestError(400, 'Expected {"transcripts": [...]}')
+        items = []
+        for i, item in enumerate(transcripts):
+            if not isinstance(item, dict):
+                raise IngestError(400, f"transcripts[{i}] must be an object")
+            name = str(item.get('name') or item.get('call_id') or i)
+            if 'text' in item:
+                items.append({'name': name, 'raw': str(item['text']).encode(), 'filename': ''})
+            else:
+                items.append({'name': name, 'transcript': item.get('transcript')})
+    else:
+        raise IngestError(415, 'Send multipart/form-data or application/json batches')
+    if not items:
+        raise IngestError(400, 'No transcripts in batch')
+    if len(items) > BATCH_MAX_TRANSCRIPTS:
+        raise IngestError(413, f"At most {BATCH_MAX_TRANSCRIPTS} transcripts per batch")
+    for item in items:
+        if 'raw' in item:
+            raw, filename = item.pop('raw'), item.pop('filename')
+            # Parse errors stay with their item instead of failing the batch
+            try:
+                item['transcript'] = transcript_turns(raw, filename=filename)
+            except IngestError as e:
+                item['error'] = e
+    return items
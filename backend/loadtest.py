@@ -0,0 +1,280 @@
+"""Load-test harness for the /analyze endpoint.
+
+Synthesizes transcripts by resampling utterances and speaker-turn patterns
+from the stored transcripts, then drives the backend closed-loop (fixed
+concurrency) or open-loop (Poisson arrivals at a fixed rate) and prints
+throughput, latency percentiles and error rates per level.
+
+    python loadtest.py --spawn --stub --mode closed --levels 1,2,4,8,16
+    python loadtest.py --url http://localhost:8080 --mode open --levels 0.5,1,2 --duration 60
+
+Running a --priority backfill load next to an interactive one shows whether
+interactive latency holds; per-class queue waits are on /metrics.
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import urllib.error
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+from transcript_parser import parse_transcript
+from timeline import parse_timestamp
+from analysis_store import USER_DATA_DIR
+
+def speaker_role(speaker: str) -> str:
+    return 'customer' if 'customer' in speaker.lower() else 'agent'
+
+class TranscriptSynthesizer:
+    """Resamples real utterances and turn-taking statistics into new calls."""
+    def __init__(self, data_dir: str = USER_DATA_DIR, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.utterances = defaultdict(list)
+        self.names = {'agent': 'Sales Agent', 'customer': 'Customer'}
+        self.turn_counts = []
+        self.gaps = []
+        switches = turns = 0
+
+        for path in glob.glob(os.path.join(data_dir, '*', '*.txt')):
+            with open(path, errors='replace') as f:
+                transcript = parse_transcript(f.read())
+            if not transcript:
+                continue
+            self.turn_counts.append(len(transcript))
+            previous_role, previous_time = None, None
+            for entry in transcript:
+                role = speaker_role(entry['speaker'])
+                self.names[role] = entry['speaker']
+                if entry['text'].strip():
+                    self.utterances[role].append(entry['text'].strip())
+                if previous_role is not None:
+                    turns += 1
+                    switches += role != previous_role
+                seconds = parse_timestamp(entry['timestamp'])
+                if seconds is not None and previous_time is not None and seconds >= previous_time:
+                    self.gaps.append(seconds - previous_time)
+                previous_role, previous_time = role, seconds
+
+        if not self.utterances:
+            raise SystemExit(f"No transcripts found under {data_dir}")
+        self.switch_probability = switches / turns if turns else 0.7
+        self.gaps = self.gaps or [5]
+
+    def synthesize(self, turns: Optional[int] = None) -> List[Dict]:
+        turns = turns or self.rng.choice(self.turn_counts)
+        role = 'agent'
+        seconds = 0
+        transcript = []
+        for i in range(turns):
+            if i and self.rng.random() < self.switch_probability:
+                role = 'customer' if role == 'agent' else 'agent'
+            pool = self.utterances[role] or self.utterances['agent'] or self.utterances['customer']
+            minutes, secs = divmod(seconds, 60)
+            transcript.append({
+                'speaker': self.names[role],
+                'timestamp': f"[{minutes:02d}:{secs:02d}]",
+                'text': self.rng.choice(pool)
+            })
+            seconds += self.rng.choice(self.gaps)
+        return transcript
+
+class LoadClient:
+    def __init__(self, base_url: str, view: str = 'summary', timeout: float = 30.0,
+                 priority: str = 'interactive'):
+        self.url = f"{base_url.rstrip('/')}/analyze?view={view}"
+        self.timeout = timeout
+        self.priority = priority
+
+    def post(self, transcript: List[Dict], client_id: str):
+        """Returns (status, latency seconds). Status 0 means a transport error."""
+        body = json.dumps({'transcript': transcript}).encode()
+        req = urllib.request.Request(self.url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip',
+            'X-Request-Timeout': str(self.timeout),
+            'X-Client-Id': client_id,
+            'X-Priority': self.priority
+        })
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = 0
+        return status, time.perf_counter() - started
+
+def summarize(level, samples: List[Dict], elapsed: float) -> Dict:
+    ok = [s for s in samples if s['status'] == 200]
+    latencies = np.array([s['latency'] for s in ok]) if ok else np.zeros(0)
+
+    def pct(q):
+        return round(float(np.percentile(latencies, q)), 3) if len(latencies) else None
+
+    return {
+        'level': level,
+        'requests': len(samples),
+        'ok': len(ok),
+        'error_rate': round(1 - len(ok) / len(samples), 3) if samples else 0.0,
+        'status': dict(Counter(s['status'] for s in samples)),
+        'throughput_rps': round(len(ok) / elapsed, 2),
+        'utterances_per_sec': round(sum(s['utterances'] for s in ok) / elapsed, 1),
+        'p50': pct(50), 'p90': pct(90), 'p95': pct(95), 'p99': pct(99)
+    }
+
+def run_closed(client, synth, concurrency: int, duration: float, turns) -> Dict:
+    """Fixed number of workers, each sending its next request when the last returns."""
+    samples, lock = [], threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        worker_synth = copy.copy(synth)
+        worker_synth.rng = random.Random(worker_id)
+        while time.perf_counter() < deadline:
+            transcript = worker_synth.synthesize(turns)
+            status, latency = client.post(transcript, f"loadtest-{worker_id}")
+            with lock:
+                samples.append({'status': status, 'latency': latency, 'utterances': len(transcript)})
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(concurrency, samples, time.perf_counter() - started)
+
+def run_open(client, synth, rate: float, duration: float, turns, max_in_flight: int = 256) -> Dict:
+    """Poisson arrivals at a fixed rate, independent of response times.
+
+    Latency is measured from the scheduled arrival, so client-side queueing
+    behind a saturated server is counted (no coordinated omission).
+    """
+    samples, lock = [], threading.Lock()
+    rng = random.Random(1)
+
+    def send(i, scheduled, transcript):
+        status, _ = client.post(transcript, f"loadtest-{i % max_in_flight}")
+        with lock:
+            samples.append({
+                'status': status,
+                'latency': time.perf_counter() - scheduled,
+                'utterances': len(transcript)
+            })
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        arrival = started
+        i = 0
+        while arrival < started + duration:
+            arrival += rng.expovariate(rate)
+            transcript = synth.synthesize(turns)
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, arrival, transcript)
+            i += 1
+    return summarize(rate, samples, time.perf_counter() - started)
+
+def print_report(mode: str, results: List[Dict]):
+    label = 'concurrency' if mode == 'closed' else 'rate (req/s)'
+    print(f"\n{label:>12} {'reqs':>6} {'ok':>6} {'err%':>6} {'rps':>8} {'utt/s':>8} "
+          f"{'p50':>7} {'p95':>7} {'p99':>7}  status")
+    for r in results:
+        print(f"{r['level']:>12} {r['requests']:>6} {r['ok']:>6} {r['error_rate'] * 100:>5.1f}% "
+              f"{r['throughput_rps']:>8} {r['utterances_per_sec']:>8} "
+              f"{r['p50'] or '-':>7} {r['p95'] or '-':>7} {r['p99'] or '-':>7}  {r['status']}")
+
+    peak = max((r['utterances_per_sec'] for r in results), default=0) or 1
+    print(f"\nThroughput vs {label} (utterances/sec)")
+    for r in results:
+        bar = '#' * int(50 * r['utterances_per_sec'] / peak)
+        print(f"{r['level']:>12} | {bar} {r['utterances_per_sec']}")
+
+def spawn_backend(port: int, stub: bool, stub_latency_ms: float):
+    env = dict(os.environ, PORT=str(port), EMBEDDINGS_ENABLED='0')
+    if stub:
+        env.update(ANALYZER_STUB='1', STUB_LATENCY_MS=str(stub_latency_ms))
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        try:
+            with urllib.request.urlopen(f"{url}/healthz", timeout=2):
+                return process, url
+        except (urllib.error.URLError, OSError):
+            if process.poll() is not None:
+                raise SystemExit("Backend exited during startup")
+            time.sleep(0.5)
+    os.killpg(process.pid, signal.SIGTERM)
+    raise SystemExit("Backend did not become healthy")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8080')
+    parser.add_argument('--spawn', action='store_true', help='start a local backend process')
+    parser.add_argument('--port', type=int, default=8090, help='port for --spawn')
+    parser.add_argument('--stub', action='store_true', help='spawned backend uses stubbed models')
+    parser.add_argument('--stub-latency-ms', type=float, default=20.0)
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    parser.add_argument('--levels', default='1,2,4,8',
+                        help='concurrency levels (closed) or arrival rates in req/s (open)')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per level')
+    parser.add_argument('--turns', type=int, default=None, help='fixed utterances per call')
+    parser.add_argument('--view', default='summary', choices=['full', 'compact', 'summary'])
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--priority', default='interactive', choices=['interactive', 'batch', 'backfill'])
+    parser.add_argument('--data-dir', default=USER_DATA_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    synth = TranscriptSynthesizer(args.data_dir, args.seed)
+    print(f"Corpus: {sum(len(v) for v in synth.utterances.values())} utterances, "
+          f"switch probability {synth.switch_probability:.2f}")
+
+    process = None
+    url = args.url
+    if args.spawn:
+        process, url = spawn_backend(args.port, args.stub, args.stub_latency_ms)
+    client = LoadClient(url, args.view, args.timeout, args.priority)
+
+    results = []
+    try:
+        for level in args.levels.split(','):
+            if args.mode == 'closed':
+                result = run_closed(client, synth, int(level), args.duration, args.turns)
+            else:
+                result = run_open(client, synth, float(level), args.duration, args.turns)
+            results.append(result)
+            print(f"{args.mode} {level}: {result['throughput_rps']} req/s, "
+                  f"p95 {result['p95']}s, errors {result['error_rate']:.1%}")
+    finally:
+        if process is not None:
+            os.killpg(process.pid, signal.SIGTERM)
+
+    print_report(args.mode, results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'mode': args.mode, 'url': url, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""Memory-mapped classifier weights, shared between processes.
+
+With MODEL_LOADING=mmap each HF pipeline is converted once into a snapshot
+in MODEL_SNAPSHOT_DIR: config, tokenizer and a safetensors file holding
+every parameter and buffer, written with safetensors. Later loads build an uninitialised model skeleton
+and point each parameter at a read-only numpy memmap of that file,
+so nothing is deserialized or copied. Startup costs page faults instead of
+a full read, and every process on the node maps the same page-cache pages,
+so replicas add little unique memory.
+
+    python mmap_weights.py convert                   # snapshot the mood/emotion models
+    python mmap_weights.py bench --procs 4           # boot time and USS, eager vs mmap
+    python mmap_weights.py bench --model-path ./local-model
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import warnings
+import argparse
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Tuple
+import numpy as np
+from analysis_store import DATA_DIR
+
+# Next to user_data and the indexes
+MODEL_SNAPSHOT_DIR = os.environ.get('MODEL_SNAPSHOT_DIR', os.path.join(DATA_DIR, 'models'))
+WEIGHTS_FILE = 'model.safetensors'
+SOURCE_FILE = 'source.json'
+LOADING_MODES = ('eager', 'mmap')
+
+# safetensors dtype names; bfloat16 has no numpy type and is mapped as int16
+_DTYPES = {
+    'F64': np.float64, 'F32': np.float32, 'F16': np.float16, 'BF16': np.int16,
+    'I64': np.int64, 'I32': np.int32, 'I16': np.int16, 'I8': np.int8, 'U8': np.uint8, 'BOOL': np.bool_
+}
+
+def model_loading() -> str:
+    mode = os.environ.get('MODEL_LOADING', 'eager')
+    if mode not in LOADING_MODES:
+        raise ValueError(f"MODEL_LOADING must be one of {LOADING_MODES}")
+    return mode
+
+def read_safetensors(path: str) -> Tuple[Dict[str, 'torch.Tensor'], Dict[str, str]]:
+    """(tensors, metadata) as read-only views of one shared memory map.
+    safetensors.torch.load_file would copy every tensor into process memory;
+    this relies on save_file writing wider dtypes first, so every tensor's
+    data is aligned to its element size."""
+    import torch
+    with open(path, 'rb') as f:
+        length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(length))
+    metadata = header.pop('__metadata__', {}) or {}
+    buffer = np.memmap(path, dtype=np.uint8, mode='r', offset=8 + length)
+    tensors = {}
+    with warnings.catch_warnings():
+        # Read-only on purpose: writing through these would fault
+        warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+        for name, info in header.items():
+            start, end = info['data_offsets']
+            array = buffer[start:end].view(_DTYPES[info['dtype']]).reshape(info['shape'])
+            tensor = torch.from_numpy(array)
+            tensors[name] = tensor.view(torch.bfloat16) if info['dtype'] == 'BF16' else tensor
+    return tensors, metadata
+
+def snapshot_dir(model_id: str, base_dir: str = MODEL_SNAPSHOT_DIR) -> str:
+    return os.path.join(base_dir, model_id.strip('/').replace('/', '--'))
+
+def convert_pipeline(classifier, model_id: str, task: str, out_dir: str):
+    """Write a loaded pipeline as a snapshot. Tied parameters are stored once
+    and recorded as aliases; non-persistent buffers are included, since the
+    skeleton is never initialised."""
+    model = classifier.model
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    model.config.save_pretrained(tmp_dir)
+    classifier.tokenizer.save_pretrained(tmp_dir)
+
+    tensors, aliases, seen = {}, {}, {}
+    named = list(model.named_parameters(remove_duplicate=False)) + list(model.named_buffers(remove_duplicate=False))
+    for name, tensor in named:
+        key = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape))
+        if key in seen:
+            aliases[name] = seen[key]
+        else:
+            seen[key] = name
+            tensors[name] = tensor
+    from safetensors.torch import save_file
+    # save_file refuses tensors that share storage; aliases are already out
+    tensors = {name: tensor.detach().clone().contiguous() for name, tensor in tensors.items()}
+    save_file(tensors, os.path.join(tmp_dir, WEIGHTS_FILE), metadata={
+        'aliases': json.dumps(aliases),
+        'parameters': json.dumps([name for name, _ in model.named_parameters(remove_duplicate=False)])
+    })
+    with open(os.path.join(tmp_dir, SOURCE_FILE), 'w') as f:
+        json.dump({'model': model_id, 'task': task, 'converted': datetime.now().isoformat()}, f)
+    try:
+        os.rename(tmp_dir, out_dir)
+    except OSError:
+        # Another process converted it first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def _assign(model, name: str, tensor, parameter: bool):
+    import torch
+    module_name, _, attr = name.rpartition('.')
+    module = model.get_submodule(module_name)
+    if parameter:
+        module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+    else:
+        module._buffers[attr] = tensor
+
+# torch.nn.init functions the layer constructors call
+_INIT_FUNCTIONS = ('uniform_', 'normal_', 'trunc_normal_', 'constant_', 'ones_', 'zeros_',
+                   'xavier_uniform_', 'xavier_normal_', 'kaiming_uniform_', 'kaiming_normal_')
+
+@contextmanager
+def _skip_init():
+    """Layers keep their torch.empty storage: pages that are never written
+    never become resident, and are freed when the mapped tensors replace them.
+    (The meta device would also work, but on newer torch its ops pull in
+    torch.fx and sympy, some 35MB per process.)"""
+    import torch
+    from transformers.modeling_utils import no_init_weights
+    originals = {name: getattr(torch.nn.init, name) for name in _INIT_FUNCTIONS}
+    for name in _INIT_FUNCTIONS:
+        setattr(torch.nn.init, name, lambda tensor, *args, **kwargs: tensor)
+    try:
+        with no_init_weights():
+            yield
+    finally:
+        for name, func in originals.items():
+            setattr(torch.nn.init, name, func)
+
+def load_mmapped(out_dir: str, task: str):
+    """Pipeline whose weights are views of the snapshot's memory map."""
+    from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification, pipeline
+    config = AutoConfig.from_pretrained(out_dir)
+    with _skip_init():
+        model = AutoModelForSequenceClassification.from_config(config)
+    tensors, metadata = read_safetensors(os.path.join(out_dir, WEIGHTS_FILE))
+    parameters = set(json.loads(metadata.get('parameters', '[]')))
+    aliases = json.loads(metadata.get('aliases', '{}'))
+    for name, tensor in tensors.items():
+        _assign(model, name, tensor, name in parameters)
+    for name, target in aliases.items():
+        _assign(model, name, tensors[target], name in parameters)
+    named = list(model.named_parameters(remove_duplicate=False)) + list(model.named_buffers(remove_duplicate=False))
+    missing = [name for name, _ in named if name not in tensors and name not in aliases]
+    if missing:
+        raise ValueError(f"Snapshot {out_dir} has no values for {', '.join(missing[:5])}")
+    model.eval()
+    return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(out_dir), device='cpu')
+
+def mmap_loader(model_id: str, task: str, loader: Callable, base_dir: str = MODEL_SNAPSHOT_DIR) -> Callable:
+    """Wraps a pipeline loader: the first load converts its result to a
+    snapshot, every load after that maps the snapshot."""
+    out_dir = snapshot_dir(model_id, base_dir)
+
+    def load():
+        from tuning import configure_torch
+        configure_torch()
+        if not os.path.isfile(os.path.join(out_dir, SOURCE_FILE)):
+            logging.info(f"Converting {model_id} to a memory-mappable snapshot in {out_dir}")
+            convert_pipeline(loader(), model_id, task, out_dir)
+        return load_mmapped(out_dir, task)
+    return load
+
+def _bench_loaders(mode: str, model_path: str = None) -> Dict[str, Callable]:
+    if model_path:
+        from transformers import pipeline
+        eager = {'model': lambda: pipeline('text-classification', model=model_path, device='cpu')}
+        tasks = {'model': (os.path.abspath(model_path), 'text-classification')}
+    else:
+        from sentiment_analyzer import MOOD_MODEL, EMOTION_MODEL, _load_mood_detector, _load_emotion_finder
+        eager = {'mood': _load_mood_detector, 'emotion': _load_emotion_finder}
+        tasks = {'mood': (MOOD_MODEL, 'sentiment-analysis'), 'emotion': (EMOTION_MODEL, 'text-classification')}
+    if mode == 'eager':
+        return eager
+    return {name: mmap_loader(*tasks[name], eager[name]) for name in eager}
+
+def bench_child(mode: str, model_path: str = None):
+    """Load, classify once, report; report memory once every process is up."""
+    from model_residency import process_memory
+    started = time.monotonic()
+    classifiers = {name: load() for name, load in _bench_loaders(mode, model_path).items()}
+    for classifier in classifiers.values():
+        classifier('The refund still has not arrived and nobody called me back.')
+    print(json.dumps({'load_seconds': round(time.monotonic() - started, 2)}), flush=True)
+    sys.stdin.readline()
+    print(json.dumps(process_memory()), flush=True)
+    # Stay up until every process has measured, or our pages stop being shared
+    sys.stdin.readline()
+
+def bench(mode: str, procs: int, model_path: str = None) -> Dict:
+    command = [sys.executable, os.path.abspath(__file__), '--child', mode]
+    if model_path:
+        command += ['--model-path', model_path]
+    env = {**os.environ, 'TUNING_PROFILE': 'off'}
+    children, boots = [], []
+    for _ in range(procs):
+        started = time.monotonic()
+        child = subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+        line = child.stdout.readline()
+        if not line:
+            raise RuntimeError(f"{mode} bench process exited with {child.wait()}")
+        boots.append({'boot_seconds': round(time.monotonic() - started, 2), **json.loads(line)})
+        children.append(child)
+    # Every process is up: shared pages are now shared
+    memory = []
+    for child in children:
+        child.stdin.write('\n')
+        child.stdin.flush()
+        memory.append(json.loads(child.stdout.readline()))
+    for child in children:
+        child.stdin.close()
+        child.wait()
+    mb = lambda key: [round(m[key] / 2**20, 1) for m in memory]  # noqa: E731
+    return {
+        'boot_seconds': [b['boot_seconds'] for b in boots],
+        'load_seconds': [b['load_seconds'] for b in boots],
+        'uss_mb': mb('uss'),
+        'pss_mb': mb('pss'),
+        'rss_mb': mb('rss')
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', choices=('convert', 'bench'), default='bench')
+    parser.add_argument('--procs', type=int, default=3, help='processes alive at once in the bench')
+    parser.add_argument('--model-path', help='local text-classification model instead of mood/emotion')
+    parser.add_argument('--child', choices=LOADING_MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--json', help='also write the bench report here')
+    args = parser.parse_args()
+
+    if args.child:
+        return bench_child(args.child, args.model_path)
+    if args.command == 'convert':
+        for name, load in _bench_loaders('mmap', args.model_path).items():
+            started = time.monotonic()
+            load()
+            print(f"{name}: snapshot ready in {time.monotonic() - started:.1f}s")
+        return
+
+    # Convert up front so the mmap processes measure loading, not conversion
+    for load in _bench_loaders('mmap', args.model_path).values():
+        load()
+    report = {mode: bench(mode, args.procs, args.model_path) for mode in LOADING_MODES}
+    print(f"{args.procs} processes, {args.model_path or 'mood + emotion'}")
+    print(f"{'':8}{'boot s':>10}{'load s':>10}{'USS MB/proc':>14}{'PSS MB total':>14}")
+    for mode, r in report.items():
+        print(f"{mode:8}{np.mean(r['boot_seconds']):>10.2f}{np.mean(r['load_seconds']):>10.2f}"
+              f"{np.mean(r['uss_mb']):>14.1f}{sum(r['pss_mb']):>14.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
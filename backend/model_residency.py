@@ -0,0 +1,180 @@
+import gc
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+def process_rss_bytes() -> int:
+    """Resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is the peak, in KB on Linux; good enough off-Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def process_memory() -> Dict[str, int]:
+    """rss, pss and uss bytes of this process. uss (unique set size) is what
+    it would free on exit; pages shared with other processes, such as
+    memory-mapped weights in the page cache, only count towards rss/pss."""
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields[key] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return {'rss': process_rss_bytes(), 'pss': None, 'uss': None}
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    }
+
+def _tensor_bytes(obj) -> Optional[int]:
+    """Parameter + buffer bytes of a HF pipeline or torch module, if it is one."""
+    model = getattr(obj, 'model', obj)
+    if not hasattr(model, 'parameters'):
+        return None
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+class LazyModel:
+    """A model that loads on first use and can be dropped again when idle."""
+    def __init__(self, name: str, loader: Callable):
+        self.name = name
+        self._loader = loader
+        self._obj = None
+        self._lock = threading.RLock()
+        self._active = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.resident_bytes = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._obj is not None
+
+    @property
+    def busy(self) -> bool:
+        return self._active > 0
+
+    def _load(self):
+        rss_before = process_rss_bytes()
+        started = time.monotonic()
+        self._obj = self._loader()
+        self.loads += 1
+        tensor_bytes = _tensor_bytes(self._obj)
+        self.resident_bytes = tensor_bytes if tensor_bytes is not None else max(
+            0, process_rss_bytes() - rss_before
+        )
+        logging.info(
+            f"Loaded {self.name} in {time.monotonic() - started:.2f}s "
+            f"({self.resident_bytes / 2**20:.0f} MB)"
+        )
+
+    def get(self):
+        with self._lock:
+            if self._obj is None:
+                self._load()
+            self.last_used = time.monotonic()
+            return self._obj
+
+    @contextmanager
+    def use(self):
+        """Hold the model for one call; busy models are never unloaded."""
+        with self._lock:
+            obj = self.get()
+            self._active += 1
+        try:
+            yield obj
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.last_used = time.monotonic()
+
+    def unload(self) -> bool:
+        with self._lock:
+            if self._obj is None or self._active:
+                return False
+            self._obj = None
+            self.resident_bytes = 0
+        gc.collect()
+        logging.info(f"Unloaded {self.name}")
+        return True
+
+class ModelResidency:
+    """Keeps a set of LazyModels under a memory budget and unloads idle ones."""
+    def __init__(
+        self,
+        models: List[LazyModel],
+        memory_budget_mb: Optional[float] = None,
+        idle_unload_seconds: Optional[float] = None
+    ):
+        self.models = {model.name: model for model in models}
+        self.memory_budget = memory_budget_mb * 2**20 if memory_budget_mb else None
+        self.idle_unload_seconds = idle_unload_seconds
+        self._reaper = None
+        if idle_unload_seconds:
+            self._reaper = threading.Thread(
+                target=self._reap_idle, name='model-reaper', daemon=True
+            )
+            self._reaper.start()
+
+    @contextmanager
+    def use(self, name: str):
+        model = self.models[name]
+        was_loaded = model.loaded
+        with model.use() as obj:
+            if not was_loaded:
+                self._enforce_budget(keep=name)
+            yield obj
+
+    def _enforce_budget(self, keep: str):
+        """Unload least recently used models until the resident total fits."""
+        if not self.memory_budget:
+            return
+        candidates = sorted(
+            (m for m in self.models.values() if m.name != keep and m.loaded),
+            key=lambda m: m.last_used
+        )
+        for model in candidates:
+            if self.resident_total() <= self.memory_budget:
+                break
+            model.unload()
+
+    def _reap_idle(self):
+        interval = max(1.0, min(30.0, self.idle_unload_seconds / 2))
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            for model in self.models.values():
+                if model.loaded and not model.busy and now - model.last_used > self.idle_unload_seconds:
+                    model.unload()
+
+    def resident_total(self) -> int:
+        return sum(m.resident_bytes for m in self.models.values() if m.loaded)
+
+    def report(self) -> Dict:
+        now = time.monotonic()
+        memory = process_memory()
+        return {
+            'process_rss_mb': round(memory['rss'] / 2**20, 1),
+            'process_uss_mb': round(memory['uss'] / 2**20, 1) if memory['uss'] is not None else None,
+            'models_resident_mb': round(self.resident_total() / 2**20, 1),
+            'memory_budget_mb': round(self.memory_budget / 2**20, 1) if self.memory_budget else None,
+            'idle_unload_seconds': self.idle_unload_seconds,
+            'models': {
+                name: {
+                    'loaded': model.loaded,
+                    'resident_mb': round(model.resident_bytes / 2**20, 1),
+                    'loads': model.loads,
+                    'idle_seconds': round(now - model.last_used, 1) if model.loaded else None
+                }
+                for name, model in self.models.items()
+            }
+        }
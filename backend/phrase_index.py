@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from analysis_store import (
+    USER_DATA_DIR, INDEX_DIR, iter_analysis_files, load_analysis,
+    analysis_agent, entry_mood
+)
+
+# Leading words that make "the procedure" and "procedure" separate phrases
+_LEADING_FILLER = {
+    'the', 'a', 'an', 'this', 'that', 'these', 'those', 'some', 'any',
+    'my', 'your', 'our', 'their', 'his', 'her', 'its'
+}
+
+def normalize_phrase(phrase: str) -> Optional[str]:
+    words = phrase.lower().split()
+    while words and words[0] in _LEADING_FILLER:
+        words = words[1:]
+    return ' '.join(words) if words else None
+
+def analysis_phrases(analysis: Dict) -> List[str]:
+    """Key phrases already extracted per utterance; nothing is re-tokenized."""
+    phrases = []
+    for entry in analysis.get('timeline', []):
+        for phrase in entry_mood(entry).get('key_phrases', []):
+            normalized = normalize_phrase(phrase)
+            if normalized:
+                phrases.append(normalized)
+    return phrases
+
+class PhraseIndex:
+    """Corpus-wide phrase counts over stored analyses, ranked by TF-IDF.
+
+    Documents are added incrementally as new analyses appear; the TF-IDF
+    matrix and the per-agent aggregate are recomputed in one sparse pass
+    after each batch of additions and served from memory. run_forever()
+    rescans every refresh_interval seconds, so calls saved while the
+    server runs join the corpus. scipy and sklearn are imported on first
+    use, not with the app.
+    """
+    def __init__(
+        self,
+        base_dir: str = USER_DATA_DIR,
+        index_dir: str = INDEX_DIR,
+        refresh_interval: float = 60.0
+    ):
+        self.base_dir = base_dir
+        self.index_dir = index_dir
+        self.refresh_interval = refresh_interval
+        self.vocabulary: Dict[str, int] = {}
+        self.phrases: List[str] = []
+        self.docs: List[Dict] = []
+        self._doc_rows: Dict[str, int] = {}
+        self._counts = None
+        self._idf = np.zeros(0)
+        self._tfidf = None
+        self._agents: Dict[str, int] = {}
+        self._agent_tfidf = None
+        self._lock = threading.RLock()
+        # One scan at a time; the scan itself runs without _lock
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._loaded = False
+
+    @property
+    def _counts_path(self) -> str:
+        return os.path.join(self.index_dir, 'phrase_counts.npz')
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.index_dir, 'phrase_index.json')
+
+    def _load(self):
+        """Read the persisted index on first use rather than at construction,
+        so sklearn is not imported while the app starts."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not (os.path.exists(self._counts_path) and os.path.exists(self._meta_path)):
+            return
+        from scipy import sparse
+        try:
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            self._counts = sparse.load_npz(self._counts_path).tocsr()
+            self.phrases = meta['phrases']
+            self.docs = meta['docs']
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable phrase index: {e}")
+            return
+        self.vocabulary = {phrase: i for i, phrase in enumerate(self.phrases)}
+        self._doc_rows = {doc['key']: i for i, doc in enumerate(self.docs)}
+        self._fit()
+
+    def _save(self):
+        from scipy import sparse
+        os.makedirs(self.index_dir, exist_ok=True)
+        sparse.save_npz(self._counts_path, self._counts)
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'phrases': self.phrases, 'docs': self.docs}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _count_row(self, phrases: Iterable[str], grow: bool = True):
+        from scipy import sparse
+        columns = []
+        for phrase in phrases:
+            column = self.vocabulary.get(phrase)
+            if column is None:
+                if not grow:
+                    continue
+                column = self.vocabulary[phrase] = len(self.phrases)
+                self.phrases.append(phrase)
+            columns.append(column)
+        columns = np.asarray(columns, dtype=np.int64)
+        return sparse.csr_matrix(
+            (np.ones(len(columns)), (np.zeros(len(columns), dtype=np.int64), columns)),
+            shape=(1, len(self.phrases))
+        )
+
+    def add(self, key: str, agent: str, mtime: float, phrases: List[str]):
+        """Add or replace one document. Call fit() (or refresh()) afterwards."""
+        self.add_many([(key, agent, mtime, phrases)])
+
+    def add_many(self, documents: List[Tuple[str, str, float, List[str]]]):
+        """Add or replace (key, agent, mtime, phrases) documents, rebuilding
+        the count matrix once for the whole batch."""
+        if not documents:
+            return
+        from scipy import sparse
+        with self._lock:
+            rows, columns, counts = [], [], []
+            for key, agent, mtime, phrases in documents:
+                doc = {'key': key, 'agent': agent, 'mtime': mtime}
+                index = self._doc_rows.get(key)
+                if index is None:
+                    index = self._doc_rows[key] = len(self.docs)
+                    self.docs.append(doc)
+                else:
+                    self.docs[index] = doc
+                row = self._count_row(phrases)
+                rows.append(np.full(len(row.indices), index, dtype=np.int64))
+                columns.append(row.indices)
+                counts.append(row.data)
+            replaced = np.array([self._doc_rows[key] for key, _, _, _ in documents], dtype=np.int64)
+            existing = sparse.coo_matrix((0, 0)) if self._counts is None else self._counts.tocoo()
+            keep = ~np.isin(existing.row, replaced)
+            self._counts = sparse.csr_matrix(
+                (
+                    np.concatenate([existing.data[keep]] + counts),
+                    (
+                        np.concatenate([existing.row[keep]] + rows),
+                        np.concatenate([existing.col[keep]] + columns)
+                    )
+                ),
+                shape=(len(self.docs), len(self.phrases))
+            )
+
+    def _fit(self):
+        if not self.docs:
+            return
+        from scipy import sparse
+        from sklearn.feature_extraction.text import TfidfTransformer
+        self._counts.sum_duplicates()
+        transformer = TfidfTransformer(sublinear_tf=True).fit(self._counts)
+        self._idf = transformer.idf_
+        self._tfidf = transformer.transform(self._counts).tocsr()
+
+        agents = sorted({doc['agent'] for doc in self.docs})
+        self._agents = {agent: i for i, agent in enumerate(agents)}
+        membership = sparse.csr_matrix(
+            (
+                np.ones(len(self.docs)),
+                ([self._agents[doc['agent']] for doc in self.docs], np.arange(len(self.docs)))
+            ),
+            shape=(len(agents), len(self.docs))
+        )
+        self._agent_tfidf = (membership @ self._tfidf).tocsr()
+
+    def refresh(self, force: bool = False) -> int:
+        """Index analyses that are new or changed since the last scan. Files
+        are read outside the lock, so rank() is not held up by a full scan."""
+        with self._refresh_lock:
+            with self._lock:
+                self._load()
+                if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+                    return 0
+                self._last_refresh = time.monotonic()
+                indexed = {doc['key']: doc['mtime'] for doc in self.docs}
+
+            documents = []
+            for record in iter_analysis_files(self.base_dir):
+                if indexed.get(record['key'], -1) >= record['mtime']:
+                    continue
+                try:
+                    phrases = analysis_phrases(load_analysis(record['path']))
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Skipping {record['path']}: {e}")
+                    continue
+                agent = analysis_agent(record['analysis_id']) or f"user:{record['user_id']}"
+                documents.append((record['key'], agent, record['mtime'], phrases))
+
+            if documents:
+                with self._lock:
+                    self.add_many(documents)
+                    self._fit()
+                    self._save()
+                logging.info(f"Phrase index: +{len(documents)} analyses, {len(self.docs)} total")
+            return len(documents)
+
+    def run_forever(self):
+        """Rescan every refresh_interval seconds (once when it is 0)."""
+        while True:
+            try:
+                self.refresh(force=True)
+            except Exception as e:
+                logging.error(f"Phrase index refresh failed: {str(e)}")
+            if self.refresh_interval <= 0:
+                return
+            time.sleep(self.refresh_interval)
+
+    @staticmethod
+    def _top(row, phrases: List[str], k: int) -> List[Tuple[str, float]]:
+        order = np.argsort(-row.data)[:k]
+        return [(phrases[row.indices[i]], round(float(row.data[i]), 4)) for i in order]
+
+    def top_phrases(self, key: str, k: int = 10) -> Optional[List[Tuple[str, float]]]:
+        with self._lock:
+            self._load()
+            index = self._doc_rows.get(key)
+            if index is None or self._tfidf is None:
+                return None
+            return self._top(self._tfidf[index], self.phrases, k)
+
+    def agent_top_phrases(self, agent: str, k: int = 10) -> Optional[List[Tuple[str, float]]]:
+        with self._lock:
+            self._load()
+            index = self._agents.get(agent)
+            if index is None or self._agent_tfidf is None:
+                return None
+            return self._top(self._agent_tfidf[index], self.phrases, k)
+
+    def rank(self, phrases: List[str], k: int = 10) -> List[Tuple[str, float]]:
+        """Rank an unindexed transcript's phrases against corpus IDF."""
+        unique, counts = np.unique(np.asarray(phrases, dtype=object), return_counts=True)
+        if not len(unique):
+            return []
+        with self._lock:
+            self._load()
+            n_docs = len(self.docs)
+            # Unseen phrases get the IDF of a phrase with document frequency 0
+            unseen_idf = np.log((1 + n_docs) / 1) + 1
+            idf = np.array([
+                self._idf[self.vocabulary[p]]
+                if p in self.vocabulary and self.vocabulary[p] < len(self._idf) else unseen_idf
+                for p in unique
+            ])
+        weights = (1 + np.log(counts)) * idf
+        weights /= np.linalg.norm(weights)
+        order = np.argsort(-weights)[:k]
+        return [(unique[i], round(float(weights[i]), 4)) for i in order]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._load()
+        return {
+            'documents': len(self.docs),
+            'phrases': len(self.phrases),
+            'agents': len(self._agents)
+        }
@@ -0,0 +1,46 @@
+"""Profile one transcript through the analysis path, like /analyze?profile=1.
+
+    python profile_analysis.py transcript.txt
+    python profile_analysis.py transcript.json --stub --profile-dir /tmp/profiles
+"""
+import argparse
+import json
+import os
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('transcript', help='raw .txt transcript or JSON list of turns')
+    parser.add_argument('--stub', action='store_true', help='use the model-free stub analyzer')
+    parser.add_argument('--profile-dir', help='where to save the profile (default PROFILE_DIR)')
+    args = parser.parse_args()
+
+    # Configuration is read at import time by app/profiling
+    if args.stub:
+        os.environ['ANALYZER_STUB'] = '1'
+    if args.profile_dir:
+        os.environ['PROFILE_DIR'] = args.profile_dir
+
+    from app import build_analysis, finish_profile
+    from profiling import profiled
+    from transcript_parser import parse_transcript
+
+    with open(args.transcript) as f:
+        raw = f.read()
+    transcript = json.loads(raw) if args.transcript.endswith('.json') else parse_transcript(raw)
+
+    label = os.path.splitext(os.path.basename(args.transcript))[0][:40]
+    with profiled(label) as session:
+        results = build_analysis(transcript)
+    report = finish_profile(session, results)
+
+    print(f"{len(transcript)} turns in {report['wall_seconds']:.2f}s -> {report['path']}")
+    print(f"\n{'stage':<20} {'seconds':>9} {'calls':>7}")
+    for stage, row in report['stages'].items():
+        print(f"{stage:<20} {row['seconds']:>9.4f} {row['calls']:>7}")
+    for title, table in (('model', report['by_model']), ('length bucket', report['by_length_bucket'])):
+        for key, stages in table.items():
+            summary = ', '.join(f"{s} {row['seconds']:.3f}s" for s, row in stages.items())
+            print(f"{title} {key}: {summary}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import os
+import sys
+import hmac
+import json
+import time
+import threading
+import contextvars
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Optional
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'data/profiles')
+SAMPLE_INTERVAL = 0.005
+# Utterance length buckets, in words
+LENGTH_BUCKETS = ((0, 8), (9, 32), (33, 128), (129, None))
+
+def length_bucket(words: int) -> str:
+    for low, high in LENGTH_BUCKETS:
+        if high is None or words <= high:
+            return f"{low}+" if high is None else f"{low}-{high}"
+    return 'unknown'
+
+class _NullProfile:
+    """Stand-in when profiling is off: stage() is a shared no-op context."""
+    enabled = False
+    _noop = nullcontext()
+
+    def stage(self, name: str, model: Optional[str] = None, words: Optional[int] = None):
+        return self._noop
+
+NULL_PROFILE = _NullProfile()
+_current = contextvars.ContextVar('analysis_profile', default=NULL_PROFILE)
+
+def current_profile():
+    return _current.get()
+
+class StageProfile:
+    """Wall time per stage, broken down per model and per utterance length bucket."""
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = defaultdict(lambda: [0.0, 0])
+        self.by_model = defaultdict(lambda: defaultdict(lambda: [0.0, 0]))
+        self.by_length = defaultdict(lambda: defaultdict(lambda: [0.0, 0]))
+
+    @contextmanager
+    def stage(self, name: str, model: Optional[str] = None, words: Optional[int] = None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                targets = [self.stages[name]]
+                if model:
+                    targets.append(self.by_model[model][name])
+                if words is not None:
+                    targets.append(self.by_length[length_bucket(words)][name])
+                for target in targets:
+                    target[0] += elapsed
+                    target[1] += 1
+
+    @staticmethod
+    def _table(stages) -> Dict:
+        return {
+            name: {'seconds': round(seconds, 4), 'calls': calls}
+            for name, (seconds, calls) in sorted(stages.items(), key=lambda x: -x[1][0])
+        }
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                'stages': self._table(self.stages),
+                'by_model': {m: self._table(s) for m, s in self.by_model.items()},
+                'by_length_bucket': {b: self._table(s) for b, s in self.by_length.items()}
+            }
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread."""
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.leaf = Counter()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples += 1
+            self.leaf[stack[0]] += 1
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self, top: int = 25) -> Dict:
+        return {
+            'samples': self.samples,
+            'interval': self.interval,
+            'top_frames': [
+                {'frame': frame, 'samples': count, 'share': round(count / self.samples, 3)}
+                for frame, count in self.leaf.most_common(top)
+            ] if self.samples else [],
+            # Collapsed stacks, flamegraph.pl compatible
+            'collapsed': dict(self.stacks.most_common(top * 4))
+        }
+
+@contextmanager
+def _torch_profiler():
+    try:
+        from torch.profiler import profile, ProfilerActivity
+    except ImportError:
+        yield None
+        return
+    with profile(activities=[ProfilerActivity.CPU]) as prof:
+        yield prof
+
+def _torch_report(prof, top: int = 20) -> Optional[list]:
+    if prof is None:
+        return None
+    events = sorted(prof.key_averages(), key=lambda e: -e.self_cpu_time_total)[:top]
+    return [
+        {
+            'op': event.key,
+            'calls': event.count,
+            'self_cpu_ms': round(event.self_cpu_time_total / 1000, 3),
+            'cpu_total_ms': round(event.cpu_time_total / 1000, 3)
+        }
+        for event in events
+    ]
+
+class ProfileSession:
+    """Everything collected while one request ran with profiling on."""
+    def __init__(self, label: str):
+        self.label = label
+        self.stages = StageProfile()
+        self.sampler = None
+        self.torch = None
+        self.wall_seconds = 0.0
+
+    def report(self) -> Dict:
+        return {
+            'label': self.label,
+            'created': datetime.now().isoformat(),
+            'wall_seconds': round(self.wall_seconds, 4),
+            **self.stages.report(),
+            'sampling': self.sampler.report() if self.sampler else None,
+            'torch_ops': _torch_report(self.torch)
+        }
+
+@contextmanager
+def profiled(label: str):
+    """Run the enclosed block with stage timing, stack sampling and the torch profiler."""
+    session = ProfileSession(label)
+    token = _current.set(session.stages)
+    started = time.perf_counter()
+    try:
+        with SamplingProfiler(threading.get_ident()) as sampler, _torch_profiler() as prof:
+            session.sampler, session.torch = sampler, prof
+            yield session
+    finally:
+        session.wall_seconds = time.perf_counter() - started
+        _current.reset(token)
+
+def save_profile(report: Dict, directory: str = PROFILE_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    path = os.path.join(directory, f"{stamp}_{report.get('label', 'profile')}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def profile_authorized(token: Optional[str]) -> bool:
+    """Profiling is off unless PROFILE_TOKEN is configured and presented."""
+    expected = os.environ.get('PROFILE_TOKEN')
+    return bool(expected and token and hmac.compare_digest(expected, token))
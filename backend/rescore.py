@@ -0,0 +1,328 @@
+"""Finds stored analyses produced by older components and rescores only
+the stages that changed.
+
+Every analysis carries meta.versions (pipeline_versions: the analyzer's
+component_versions plus the dynamics stage).
+Comparing it with the running analyzer decides the work per analysis:
+
+  topics changed        per-utterance topics and totals only, no models run
+  mood/emotion/spacy    that model's fields only; the others are kept
+  dynamics changed      conversation dynamics only, from the transcript
+  cleaning changed      every stage, since the models saw different text
+
+Analyses saved before versions were recorded only get their dynamics
+brought up to date (no models run, meta.versions left unset) unless
+--include-legacy asks for a full rescore.
+
+Whenever a model component is rerun, the stored chart descriptor
+(timeline_pyramid) is rebuilt, and ranked_phrases is re-ranked when spaCy
+output changed (dropped when no phrase index is at hand).
+
+Untouched fields are reused from the stored timeline, and freshly scored
+fields are cached per (component, version, cleaned text) so utterances
+repeated across calls are scored once. Model work runs as a 'backfill'
+job in the scheduler and yields to interactive analyses.
+
+    python rescore.py --dry-run
+    python rescore.py --user-id 3 --include-legacy
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from analysis_store import (
+    USER_DATA_DIR, iter_analysis_files, load_analysis, transcript_path,
+    entry_mood, entry_speaker
+)
+from sentiment_analyzer import COMPONENT_FIELDS, FAST_COMPONENTS, aggregate_results
+from dynamics import DYNAMICS_VERSION, timeline_dynamics
+from phrase_index import analysis_phrases
+from timeline import pyramid_descriptor
+from scheduler import BATCH_UTTERANCES
+from transcript_parser import parse_transcript
+
+UTTERANCE_CACHE_ENTRIES = int(os.environ.get('RESCORE_CACHE_ENTRIES', 50000))
+
+def pipeline_versions(analyzer) -> Dict[str, str]:
+    """The analyzer's component versions plus the stages computed outside it."""
+    return {**analyzer.component_versions(), 'dynamics': DYNAMICS_VERSION}
+
+def analysis_versions(analysis: Dict) -> Optional[Dict]:
+    return (analysis.get('meta') or {}).get('versions')
+
+def stale_components(versions: Optional[Dict], current: Dict) -> Set[str]:
+    """Components whose version differs; all of them for unversioned analyses."""
+    if not versions:
+        return set(current)
+    return {name for name, version in current.items() if versions.get(name) != version}
+
+def rescore_plan(stale: Set[str], tier: str = 'full') -> Tuple[List[str], List[str]]:
+    """(model components to rerun, model-free stages to recompute)."""
+    available = list(COMPONENT_FIELDS) if tier == 'full' else list(FAST_COMPONENTS)
+    if 'cleaning' in stale:
+        return available, ['topics', 'dynamics']
+    return [c for c in available if c in stale], [s for s in ('topics', 'dynamics') if s in stale]
+
+def legacy_dynamics_stale(analysis: Dict) -> bool:
+    """Whether an unversioned analysis lacks current dynamics. A stored None
+    (a call without usable timestamps) counts as computed."""
+    if 'dynamics' not in analysis:
+        return True
+    dynamics = analysis['dynamics']
+    return dynamics is not None and dynamics.get('version') != DYNAMICS_VERSION
+
+class UtteranceCache:
+    """LRU of per-utterance model outputs keyed by component version and text."""
+    def __init__(self, max_entries: int = UTTERANCE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(component: str, version: str, text: str) -> Tuple[str, str, str]:
+        return component, version, hashlib.sha1(text.encode()).hexdigest()
+
+    def get(self, key) -> Optional[Dict]:
+        with self._lock:
+            fields = self._entries.get(key)
+            if fields is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return fields
+
+    def put(self, key, fields: Dict):
+        with self._lock:
+            self._entries[key] = fields
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def transcript_texts(record: Dict, base_dir: str = USER_DATA_DIR) -> Optional[List[str]]:
+    """Utterance texts in timeline order, skipping empty turns like /analyze does."""
+    path = transcript_path(record, base_dir)
+    if not os.path.isfile(path):
+        return None
+    with open(path, errors='replace') as f:
+        transcript = parse_transcript(f.read())
+    return [entry['text'] for entry in transcript if entry.get('text', '').strip()]
+
+def _write_analysis(path: str, analysis: Dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(analysis, f, indent=2)
+    os.replace(tmp, path)
+
+def reaggregate(analysis: Dict):
+    """Rebuild totals and per-speaker aggregates from the timeline."""
+    results = {'topics': defaultdict(float), 'speaker_analysis': {}}
+    moods = []
+    for entry in analysis.get('timeline', []):
+        mood = entry_mood(entry)
+        speaker = results['speaker_analysis'].setdefault(
+            entry_speaker(entry), {'messages': [], 'avg_mood': 0.0, 'emotions': []}
+        )
+        speaker['messages'].append(mood)
+        speaker['emotions'].append(mood.get('emotion', 'neutral'))
+        for topic, score in (entry.get('topics') or {}).items():
+            results['topics'][topic] += score
+        moods.append(mood)
+    aggregate_results(results, moods)
+    analysis['topics'] = dict(results['topics'])
+    if 'speaker_analysis' in analysis:
+        analysis['speaker_analysis'] = results['speaker_analysis']
+    if 'overall_mood' in results:
+        overall_key = 'overall_sentiment' if 'overall_sentiment' in analysis else 'overall_mood'
+        analysis[overall_key] = results['overall_mood']
+
+def refresh_derived(analysis: Dict, components: List[str], phrase_index=None):
+    """Fields computed from the per-utterance moods after they changed."""
+    if 'timeline_pyramid' in analysis:
+        # Also replaces full pyramids stored before they were served per window
+        analysis['timeline_pyramid'] = pyramid_descriptor(analysis.get('timeline', []))
+    if 'spacy' in components and 'ranked_phrases' in analysis:
+        if phrase_index is not None:
+            analysis['ranked_phrases'] = phrase_index.rank(analysis_phrases(analysis))
+        else:
+            del analysis['ranked_phrases']
+
+class Rescorer:
+    def __init__(
+        self,
+        analyzer,
+        scheduler=None,
+        cache: Optional[UtteranceCache] = None,
+        base_dir: str = USER_DATA_DIR,
+        include_legacy: bool = False,
+        phrase_index=None
+    ):
+        self.analyzer = analyzer
+        self.scheduler = scheduler
+        self.phrase_index = phrase_index
+        self.cache = cache or UtteranceCache()
+        self.base_dir = base_dir
+        self.include_legacy = include_legacy
+        self.counters = defaultdict(int)
+        self.last_run = None
+        self._run_lock = threading.Lock()
+
+    def scan(self, user_id=None) -> Iterator[Tuple[Dict, Dict, Set[str]]]:
+        """(record, analysis, stale components) of every stale analysis."""
+        current = pipeline_versions(self.analyzer)
+        for record in iter_analysis_files(self.base_dir, user_id):
+            try:
+                analysis = load_analysis(record['path'])
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping {record['path']}: {e}")
+                continue
+            versions = analysis_versions(analysis)
+            if versions is None and not self.include_legacy:
+                self.counters['unversioned'] += 1
+                if legacy_dynamics_stale(analysis):
+                    yield record, analysis, {'dynamics'}
+                continue
+            stale = stale_components(versions, current)
+            if stale:
+                yield record, analysis, stale
+
+    def _score(self, text: str, components: List[str], versions: Dict) -> Dict:
+        fields, missing = {}, []
+        for component in components:
+            cached = self.cache.get(UtteranceCache.key(component, versions[component], text))
+            if cached is None:
+                missing.append(component)
+            else:
+                fields.update(cached)
+        if missing:
+            scored = self.analyzer.score_components(text, missing)
+            for component in missing:
+                part = {name: scored[name] for name in COMPONENT_FIELDS[component]}
+                self.cache.put(UtteranceCache.key(component, versions[component], text), part)
+                fields.update(part)
+        return fields
+
+    def rescore(self, record: Dict, analysis: Dict, stale: Set[str]) -> Optional[Dict]:
+        """Rescore one analysis in place and save it. None when its
+        transcript is missing or no longer lines up with the timeline.
+        Unversioned analyses (without include_legacy) keep no meta.versions,
+        since only their dynamics are refreshed."""
+        current = pipeline_versions(self.analyzer)
+        legacy = analysis_versions(analysis) is None and not self.include_legacy
+        meta = analysis.setdefault('meta', {})
+        components, stages = rescore_plan(stale, meta.get('tier', 'full'))
+        timeline = analysis.get('timeline', [])
+        texts = transcript_texts(record, self.base_dir) if components or stages else []
+        if texts is None or (texts and len(texts) != len(timeline)):
+            self.counters['skipped_no_transcript'] += 1
+            return None
+
+        job = self.scheduler.job('rescore', 'backfill') if components and self.scheduler else None
+        started = time.monotonic()
+        try:
+            for position, (entry, raw) in enumerate(zip(timeline, texts)):
+                text = self.analyzer.clean_chat(raw)
+                if components:
+                    if job is not None and position % BATCH_UTTERANCES == 0:
+                        self.scheduler.next_turn(job)
+                    entry_mood(entry).update(self._score(text, components, current))
+                if 'topics' in stages:
+                    entry['topics'] = self.analyzer.find_topics(text)
+        finally:
+            if job is not None:
+                self.scheduler.release(job)
+
+        if 'dynamics' in stages:
+            analysis['dynamics'] = timeline_dynamics(
+                timeline, [self.analyzer.clean_chat(raw) for raw in texts]
+            )
+        reaggregate(analysis)
+        if components:
+            refresh_derived(analysis, components, self.phrase_index)
+        if not legacy:
+            meta['versions'] = current
+        meta['rescored'] = {
+            'at': datetime.now().isoformat(),
+            'stages': components + stages,
+            'seconds': round(time.monotonic() - started, 3)
+        }
+        _write_analysis(record['path'], analysis)
+        self.counters['legacy_dynamics' if legacy else 'rescored'] += 1
+        self.counters['utterances'] += len(timeline) if components else 0
+        for stage in meta['rescored']['stages']:
+            self.counters[f'stage_{stage}'] += 1
+        return {'key': record['key'], 'stale': sorted(stale), **meta['rescored']}
+
+    def run_once(self, user_id=None, dry_run: bool = False) -> List[Dict]:
+        with self._run_lock:
+            done = []
+            for record, analysis, stale in self.scan(user_id):
+                self.counters['stale'] += 1
+                if dry_run:
+                    components, stages = rescore_plan(stale, (analysis.get('meta') or {}).get('tier', 'full'))
+                    done.append({'key': record['key'], 'stale': sorted(stale),
+                                 'stages': components + stages})
+                    continue
+                try:
+                    result = self.rescore(record, analysis, stale)
+                except Exception as e:
+                    self.counters['failed'] += 1
+                    logging.error(f"Rescoring {record['key']} failed: {str(e)}")
+                    continue
+                if result is not None:
+                    logging.info(f"Rescored {result['key']}: {', '.join(result['stages']) or 'versions only'}")
+                    done.append(result)
+            self.last_run = datetime.now().isoformat()
+            return done
+
+    def run_forever(self, interval: float):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Rescore pass failed: {str(e)}")
+            time.sleep(interval)
+
+    def snapshot(self) -> Dict:
+        return {
+            'versions': pipeline_versions(self.analyzer),
+            'last_run': self.last_run,
+            'counters': dict(self.counters),
+            'cache': {'entries': len(self.cache), 'hits': self.cache.hits, 'misses': self.cache.misses}
+        }
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id')
+    parser.add_argument('--data-dir', default=USER_DATA_DIR)
+    parser.add_argument('--dry-run', action='store_true', help='list stale analyses and planned stages')
+    parser.add_argument('--include-legacy', action='store_true',
+                        help='fully rescore analyses saved before versions were recorded')
+    parser.add_argument('--stub', action='store_true', help='use the model-free stub analyzer')
+    args = parser.parse_args()
+
+    if args.stub:
+        from stub_analyzer import StubConversationAnalyzer
+        analyzer = StubConversationAnalyzer(latency_ms=0)
+    else:
+        from sentiment_analyzer import ConversationAnalyzer
+        analyzer = ConversationAnalyzer()
+    rescorer = Rescorer(analyzer, base_dir=args.data_dir, include_legacy=args.include_legacy)
+    for result in rescorer.run_once(args.user_id, dry_run=args.dry_run):
+        print(f"{result['key']}: stale {', '.join(result['stale'])} -> "
+              f"{', '.join(result['stages']) or 'versions only'}")
+    print(json.dumps(rescorer.snapshot(), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import gzip
+import json
+from typing import Dict
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # plain json fallback
+    orjson = None
+
+VIEWS = ('full', 'compact', 'summary')
+# Smaller bodies are not worth the gzip CPU
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+def summary_view(payload: Dict) -> Dict:
+    """Aggregates only: no timeline, no per-utterance moods."""
+    shaped = {
+        key: payload[key]
+        for key in ('overall_mood', 'topics', 'dynamics', 'alerts', 'meta')
+        if key in payload
+    }
+    shaped['speaker_analysis'] = {
+        speaker: {
+            'avg_mood': data.get('avg_mood', 0.0),
+            'top_emotions': data.get('top_emotions', []),
+            'message_count': len(data.get('messages', []))
+        }
+        for speaker, data in payload.get('speaker_analysis', {}).items()
+    }
+    return shaped
+
+def compact_view(payload: Dict) -> Dict:
+    """Columnar timeline; speakers reference timeline indices instead of
+    repeating every mood dict."""
+    timeline = payload.get('timeline', [])
+    moods = [entry['mood'] for entry in timeline]
+    speaker_index = {}
+    for i, entry in enumerate(timeline):
+        speaker_index.setdefault(entry['who'], []).append(i)
+
+    shaped = {
+        key: value for key, value in payload.items()
+        if key not in ('timeline', 'speaker_analysis')
+    }
+    shaped['timeline'] = {
+        'when': [entry['when'] for entry in timeline],
+        'who': [entry['who'] for entry in timeline],
+        'score': [m['score'] for m in moods],
+        'confidence': [m['confidence'] for m in moods],
+        'emotion': [m['emotion'] for m in moods],
+        'key_phrases': [m['key_phrases'] for m in moods],
+        'topics': [entry['topics'] for entry in timeline]
+    }
+    shaped['speaker_analysis'] = {
+        speaker: {
+            'avg_mood': data.get('avg_mood', 0.0),
+            'top_emotions': data.get('top_emotions', []),
+            'timeline_index': speaker_index.get(speaker, [])
+        }
+        for speaker, data in payload.get('speaker_analysis', {}).items()
+    }
+    return shaped
+
+def shape_results(payload: Dict, view: str = 'full') -> Dict:
+    if view == 'summary':
+        return summary_view(payload)
+    if view == 'compact':
+        return compact_view(payload)
+    return payload
+
+def _default(obj):
+    # numpy scalars from np.mean/round
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def encode_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(
+            payload,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+def decode_json(body: bytes):
+    """Raises ValueError on malformed input (orjson.JSONDecodeError is one)."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def json_response(payload, status: int = 200, accept_encoding: str = '') -> Response:
+    """JSON response using the fast encoder, gzipped when the client accepts it."""
+    body = encode_json(payload)
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    if 'gzip' in accept_encoding and len(body) >= GZIP_MIN_BYTES:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
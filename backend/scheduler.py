@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, Optional
+import numpy as np
+
+# Highest priority first
+PRIORITY_CLASSES = ('interactive', 'batch', 'backfill')
+# Utterances scored per turn; a job can only be preempted between batches
+BATCH_UTTERANCES = 8
+WAIT_SAMPLES = 2000
+
+def parse_weights(spec: str) -> Dict[str, int]:
+    """'alice=3,bob=2' -> {'alice': 3, 'bob': 2}"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        user, _, weight = item.partition('=')
+        weights[user.strip()] = max(1, int(weight or 1))
+    return weights
+
+class Job:
+    """One analysis request, scheduled one utterance batch at a time."""
+    def __init__(self, user: str, priority: str, deadline: Optional[float] = None):
+        self.user = user
+        self.priority = priority
+        self.deadline = deadline
+        self.turns = 0
+        self.waited = 0.0
+        self.holding = False
+        self._granted = False
+
+class FairScheduler:
+    """Hands out inference turns by strict priority class, then weighted
+    round-robin over per-user queues within a class.
+
+    A turn covers one batch of utterances, so an interactive upload waits
+    at most one batch behind a running backfill, and a user bulk-uploading
+    many calls gets the same share of a class as a user with one.
+    """
+    def __init__(self, slots: int = 1, weights: Optional[Dict[str, int]] = None):
+        self.slots = slots
+        self.weights = weights or {}
+        self._cond = threading.Condition()
+        self._free = slots
+        self._queues = {cls: OrderedDict() for cls in PRIORITY_CLASSES}
+        self._credits = {cls: {} for cls in PRIORITY_CLASSES}
+        self._waits = {cls: deque(maxlen=WAIT_SAMPLES) for cls in PRIORITY_CLASSES}
+        self.counters = defaultdict(int)
+
+    def job(self, user: str, priority: str = 'interactive', deadline: Optional[float] = None) -> Job:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        return Job(user, priority, deadline)
+
+    def _waiting(self) -> int:
+        return sum(len(q) for queues in self._queues.values() for q in queues.values())
+
+    def _pick(self, classes: int = len(PRIORITY_CLASSES)) -> Optional[Job]:
+        """Next job from the first `classes` priority classes, or None."""
+        for cls in PRIORITY_CLASSES[:classes]:
+            queues = self._queues[cls]
+            if not queues:
+                continue
+            user = next(iter(queues))
+            waiting = queues[user]
+            job = waiting.popleft()
+            credits = self._credits[cls].get(user, self.weights.get(user, 1)) - 1
+            if not waiting:
+                del queues[user]
+                self._credits[cls].pop(user, None)
+            elif credits <= 0:
+                queues.move_to_end(user)
+                self._credits[cls][user] = self.weights.get(user, 1)
+            else:
+                self._credits[cls][user] = credits
+            return job
+        return None
+
+    def _dequeue(self, job: Job):
+        queues = self._queues[job.priority]
+        waiting = queues.get(job.user)
+        if waiting is not None and job in waiting:
+            waiting.remove(job)
+            if not waiting:
+                del queues[job.user]
+                self._credits[job.priority].pop(job.user, None)
+
+    def _hand_over(self, successor: Job):
+        successor._granted = True
+        self._cond.notify_all()
+
+    def _start_turn(self, job: Job, waited: float, sample: bool = True) -> bool:
+        job.holding = True
+        job.turns += 1
+        job.waited += waited
+        if sample:
+            self._waits[job.priority].append(waited)
+        self.counters[f'turns_{job.priority}'] += 1
+        return True
+
+    def _wait(self, job: Job) -> bool:
+        started = time.monotonic()
+        job._granted = False
+        self._queues[job.priority].setdefault(job.user, deque()).append(job)
+        while not job._granted:
+            timeout = job.deadline - time.monotonic() if job.deadline else None
+            if timeout is not None and timeout <= 0:
+                self._dequeue(job)
+                self.counters[f'timed_out_{job.priority}'] += 1
+                return False
+            self._cond.wait(timeout)
+        return self._start_turn(job, time.monotonic() - started)
+
+    def next_turn(self, job: Job) -> bool:
+        """Block until the job may score its next batch. False if its deadline
+        passed while queued.
+
+        Between batches a job keeps the slot unless someone of the same or a
+        higher priority class is waiting; that is the preemption point.
+        """
+        with self._cond:
+            if not job.holding:
+                if self._free and not self._waiting():
+                    self._free -= 1
+                    return self._start_turn(job, 0.0)
+                return self._wait(job)
+            successor = self._pick(PRIORITY_CLASSES.index(job.priority) + 1)
+            if successor is None:
+                return self._start_turn(job, 0.0, sample=False)
+            job.holding = False
+            self.counters[f'preempted_{job.priority}'] += 1
+            self._hand_over(successor)
+            return self._wait(job)
+
+    def release(self, job: Job):
+        """Give up the slot for good; safe to call whether or not the job holds it."""
+        with self._cond:
+            if not job.holding:
+                return
+            job.holding = False
+            successor = self._pick()
+            if successor is None:
+                self._free += 1
+            else:
+                self._hand_over(successor)
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            classes = {}
+            for cls in PRIORITY_CLASSES:
+                waits = np.array(self._waits[cls]) if self._waits[cls] else np.zeros(0)
+                classes[cls] = {
+                    'queued_jobs': sum(len(q) for q in self._queues[cls].values()),
+                    'queued_users': len(self._queues[cls]),
+                    'turns': self.counters[f'turns_{cls}'],
+                    'preempted': self.counters[f'preempted_{cls}'],
+                    'timed_out': self.counters[f'timed_out_{cls}'],
+                    'wait_seconds': {
+                        'samples': len(waits),
+                        'mean': round(float(waits.mean()), 4) if len(waits) else None,
+                        **{
+                            f'p{q}': round(float(np.percentile(waits, q)), 4) if len(waits) else None
+                            for q in (50, 95, 99)
+                        },
+                        'max': round(float(waits.max()), 4) if len(waits) else None
+                    }
+                }
+            return {
+                'slots': self.slots,
+                'free_slots': self._free,
+                'batch_utterances': BATCH_UTTERANCES,
+                'classes': classes
+            }
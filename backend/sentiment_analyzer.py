@@ -1,37 +1,113 @@
-import spacy
-from transformers import pipeline
 import re
-from typing import Dict, List, Optional
+import json
+import hashlib
+from typing import Dict, Iterable, List, Optional
 import logging
+import threading
 from datetime import datetime
 import numpy as np
 from collections import defaultdict
+from model_residency import LazyModel, ModelResidency
+from compiled_inference import compile_mode, length_buckets, compiled_loader
+from tokenization import (
+    TokenCache, INFERENCE_BATCH_SIZE, MAX_TOKENS, length_batches, pad_batch, top_labels
+)
+from canonical import Canonicalizer, SharedResults
+from tuning import configure_torch, setting
+from mmap_weights import model_loading, mmap_loader
+from profiling import current_profile
 
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s]: %(message)s',
     level=logging.INFO
 )
 
+# Hidden size of the DistilRoBERTa encoder behind the emotion pipeline
+EMBEDDING_DIM = 768
+
+SPACY_MODEL = "en_core_web_sm"
+MOOD_MODEL = "nlptown/bert-base-multilingual-uncased-sentiment"
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+# Bump whenever clean_chat changes what the models see
+CLEANING_VERSION = '1'
+
+# Per-utterance mood fields and the model that produces each
+COMPONENT_FIELDS = {
+    'mood': ('score', 'confidence'),
+    'emotion': ('emotion',),
+    'spacy': ('key_phrases',)
+}
+# The cheap tier only runs the mood model
+FAST_COMPONENTS = ('mood',)
+
+# spacy, torch and transformers are imported where they are first used so
+# importing this module (and starting the app) stays cheap
+
+def _load_spacy():
+    import spacy
+    try:
+        return spacy.load(SPACY_MODEL)
+    except OSError:
+        logging.warning("Downloading spaCy model - first time setup...")
+        import os
+        os.system(f"python -m spacy download {SPACY_MODEL}")
+        return spacy.load(SPACY_MODEL)
+
+def _load_mood_detector():
+    configure_torch()
+    from transformers import pipeline
+    return pipeline(
+        "sentiment-analysis",
+        model=MOOD_MODEL,
+        device='cpu'
+    )
+
+def _load_emotion_finder():
+    configure_torch()
+    from transformers import pipeline
+    return pipeline(
+        "text-classification",
+        model=EMOTION_MODEL
+    )
+
+def _fingerprint(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()[:12]
+
 class ConversationAnalyzer:
-    def __init__(self, debug_mode: bool = False):
+    def __init__(
+        self,
+        debug_mode: bool = False,
+        memory_budget_mb: Optional[float] = None,
+        idle_unload_seconds: Optional[float] = None,
+        preload: bool = False
+    ):
+        """Models load on first use unless preload is set. memory_budget_mb /
+        idle_unload_seconds switch on memory-budget mode: the least recently
+        used model is dropped when the budget is exceeded, and idle ones are
+        unloaded in the background."""
         self._debug = debug_mode
         self._setup_time = datetime.now()
-        try:
-            self.nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            logging.warning("Downloading spaCy model - first time setup...")
-            import os
-            os.system("python -m spacy download en_core_web_sm")
-            self.nlp = spacy.load("en_core_web_sm")
-        self.mood_detector = pipeline(
-            "sentiment-analysis",
-            model="nlptown/bert-base-multilingual-uncased-sentiment",
-            device='cpu'
-        )
-        self.emotion_finder = pipeline(
-            "text-classification",
-            model="j-hartmann/emotion-english-distilroberta-base"
+        # INFERENCE_COMPILED: classifiers padded to length buckets and compiled on load
+        self.compiled = compile_mode()
+        # MODEL_LOADING=mmap: classifier weights memory-mapped from safetensors snapshots
+        self.loading = model_loading()
+        self._warming = False
+        self._warmed = threading.Event()
+        self._warm_error = None
+        # Token IDs per model, shared by every request
+        self.token_cache = TokenCache()
+        # Utterances per forward pass; autotune.py picks it per host (tuning.py)
+        self.batch_size = setting('inference_batch_size', INFERENCE_BATCH_SIZE)
+        # CANONICAL_SHARING: near-identical utterances share one inference result
+        self.canonical = Canonicalizer.from_env()
+        self.shared_results = SharedResults()
+        self.models = ModelResidency(
+            self._model_holders(),
+            memory_budget_mb=memory_budget_mb,
+            idle_unload_seconds=idle_unload_seconds
         )
+        if preload:
+            self.preload()
         self._topic_markers = {
             'pricing': [
                 'price', 'cost', 'fee', 'discount', 'expensive', 'cheap'
@@ -53,6 +129,82 @@ class ConversationAnalyzer:
         if self._debug:
             logging.info(f"Analyzer initialized in {(datetime.now() - self._setup_time).total_seconds():.2f}s")
     
+    def _model_holders(self) -> List[LazyModel]:
+        mood, emotion = _load_mood_detector, _load_emotion_finder
+        if self.loading == 'mmap':
+            mood = mmap_loader(MOOD_MODEL, 'sentiment-analysis', mood)
+            emotion = mmap_loader(EMOTION_MODEL, 'text-classification', emotion)
+        if self.compiled:
+            buckets = length_buckets()
+            mood = compiled_loader(mood, self.compiled, buckets, self.batch_size)
+            emotion = compiled_loader(emotion, self.compiled, buckets, self.batch_size)
+        return [
+            LazyModel('spacy', _load_spacy),
+            LazyModel('mood', mood),
+            LazyModel('emotion', emotion)
+        ]
+    
+    def component_versions(self) -> Dict[str, str]:
+        """What produced an analysis, stamped into its meta so stale stored
+        analyses can be found and rescored stage by stage (rescore.py)."""
+        return {
+            'cleaning': CLEANING_VERSION,
+            'mood': MOOD_MODEL,
+            'emotion': EMOTION_MODEL,
+            'spacy': SPACY_MODEL,
+            'topics': _fingerprint(self._topic_markers)
+        }
+    
+    def preload(self):
+        """Load every model now instead of on the first request. Compiled
+        models are also warmed up over every length bucket. A failure is
+        logged and recorded for readiness() before it is re-raised."""
+        try:
+            for model in self.models.models.values():
+                model.get()
+        except Exception as e:
+            self._warm_error = f"{type(e).__name__}: {e}"
+            logging.error(f"Model preload failed: {self._warm_error}")
+            raise
+        self._warmed.set()
+    
+    def _preload_logged(self):
+        try:
+            self.preload()
+        except Exception:
+            pass  # logged and recorded by preload()
+    
+    def preload_in_background(self):
+        """Preload on a thread; ready() stays False until it finishes."""
+        self._warming = True
+        threading.Thread(target=self._preload_logged, name='model-preload', daemon=True).start()
+    
+    def ready(self) -> bool:
+        return not self._warming or self._warmed.is_set()
+    
+    def readiness(self) -> Dict:
+        """{'status': 'ready' | 'warming' | 'failed', 'error': preload error or None}"""
+        if self._warm_error is not None:
+            return {'status': 'failed', 'error': self._warm_error}
+        return {'status': 'ready' if self.ready() else 'warming', 'error': None}
+    
+    def inference_report(self) -> Dict:
+        """Compile mode and per-bucket usage of the loaded classifiers."""
+        models = {}
+        for name, model in self.models.models.items():
+            obj = model._obj
+            if obj is not None and hasattr(obj, 'stats'):
+                models[name] = obj.stats()
+        return {
+            'compiled': self.compiled,
+            'loading': self.loading,
+            'ready': self.ready(),
+            'batch_size': self.batch_size,
+            'models': models,
+            'token_cache': self.token_cache.stats(),
+            'canonical_sharing': {'mode': self.canonical.mode, **self.shared_results.stats()}
+        }
+    
     def clean_chat(self, text: str) -> str:
         text = re.sub(r'\[.*?\]', '', text)
         text = text.replace('…', '...').replace('️', '')
@@ -60,35 +212,164 @@ class ConversationAnalyzer:
         
         return text.strip()
     
-    def get_speaker_mood(self, text: str) -> Dict:
+    def _classify_batch(self, name: str, texts: List[str]) -> List[Dict]:
+        """Top label per text from one of the classifiers. Token IDs come
+        from the shared cache; texts are scored in batches of similar length."""
+        import torch
+        profile = current_profile()
+        words = sum(len(text.split()) for text in texts)
+        with self.models.use(name) as classifier, torch.inference_mode():
+            with profile.stage('tokenization', model=name, words=words):
+                ids = self.token_cache.encode(
+                    name, classifier.tokenizer, texts,
+                    getattr(classifier, 'max_length', MAX_TOKENS)
+                )
+            results = [None] * len(texts)
+            with profile.stage('model_forward', model=name, words=words):
+                if hasattr(classifier, 'classify_ids'):
+                    # Compiled: rows batched per length bucket
+                    return classifier.classify_ids(ids, self.batch_size)
+                pad_id = classifier.tokenizer.pad_token_id or 0
+                for batch in length_batches([len(row) for row in ids], self.batch_size):
+                    input_ids, attention_mask = pad_batch([ids[i] for i in batch], pad_id)
+                    logits = classifier.model(input_ids=input_ids, attention_mask=attention_mask).logits
+                    for i, label in zip(batch, top_labels(logits, classifier.model.config.id2label)):
+                        results[i] = label
+            return results
+    
+    def score_batch(self, texts: List[str], components: Iterable[str]) -> List[Dict]:
+        """Mood fields of the given components only (see COMPONENT_FIELDS), per text."""
+        components = set(components)
+        fields = [{} for _ in texts]
+        if 'mood' in components:
+            for row, result in zip(fields, self._classify_batch('mood', texts)):
+                row['score'] = round((float(result['label'].split()[0]) - 3) / 2, 2)
+                row['confidence'] = round(result['score'], 2)
+        if 'emotion' in components:
+            for row, result in zip(fields, self._classify_batch('emotion', texts)):
+                row['emotion'] = result['label']
+        if 'spacy' in components:
+            with self.models.use('spacy') as nlp, current_profile().stage(
+                'spacy', model='spacy', words=sum(len(text.split()) for text in texts)
+            ):
+                docs = list(nlp.pipe(texts))
+            for row, doc in zip(fields, docs):
+                key_bits = []
+                for chunk in doc.noun_chunks:
+                    if len(chunk.text.split()) > 1 and not chunk.text.lower().startswith(('the', 'a', 'an')):
+                        key_bits.append(chunk.text)
+                row['key_phrases'] = key_bits[:3]
+        return fields
+    
+    def score_shared(self, texts: List[str], components: Iterable[str]) -> List[Dict]:
+        """score_batch once per equivalence class (see canonical.py); classes
+        scored by earlier requests are reused. With CANONICAL_AUDIT_RATE a
+        sample of reused variants is also scored on its own for comparison."""
+        if not self.canonical.enabled:
+            return self.score_batch(texts, components)
+        components = tuple(sorted(components))
+        with current_profile().stage('canonicalize', words=sum(len(text.split()) for text in texts)):
+            keys = [(components, self.canonical.key(text)) for text in texts]
+
+        classes = {}
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key in classes or key in pending:
+                continue
+            cached = self.shared_results.get(key)
+            if cached is None:
+                pending[key] = text
+            else:
+                classes[key] = cached
+        if pending:
+            for (key, text), fields in zip(pending.items(), self.score_batch(list(pending.values()), components)):
+                self.shared_results.put(key, text, fields)
+                classes[key] = (text, fields)
+
+        results, audits = [], []
+        for i, (key, text) in enumerate(zip(keys, texts)):
+            representative, fields = classes[key]
+            results.append(fields)
+            if pending.get(key) == text:
+                # Scored just now for this very text
+                pending.pop(key)
+                continue
+            self.shared_results.count('shared')
+            if representative != text:
+                self.shared_results.count('shared_variant')
+                if self.shared_results.should_audit():
+                    audits.append(i)
+        self.shared_results.count('lookups', len(texts))
+        if audits:
+            for i, fields in zip(audits, self.score_batch([texts[i] for i in audits], components)):
+                self.shared_results.record_audit(results[i], fields)
+        return results
+    
+    def score_components(self, text: str, components: Iterable[str]) -> Dict:
+        return self.score_batch([text], components)[0]
+    
+    def get_speaker_mood(self, text: str, detailed: bool = True) -> Dict:
+        """Score one utterance. detailed=False is the cheap tier used under
+        load: sentiment only, no emotion model or noun chunks."""
         if not text.strip():
             return self._get_neutral_mood()
             
         try:
-            base_result = self.mood_detector(text)
-            if not base_result:
-                return self._get_neutral_mood()
-                
-            result = base_result[0]
-            mood_score = (float(result['label'].split()[0]) - 3) / 2
-            emotion = self.emotion_finder(text)[0]
-            doc = self.nlp(text)
-            key_bits = []
-            for chunk in doc.noun_chunks:
-                if len(chunk.text.split()) > 1 and not chunk.text.lower().startswith(('the', 'a', 'an')):
-                    key_bits.append(chunk.text)
-            
-            return {
-                'score': round(mood_score, 2),
-                'confidence': round(result['score'], 2),
-                'emotion': emotion['label'],
-                'key_phrases': key_bits[:3]
-            }
+            fields = self.score_components(text, COMPONENT_FIELDS if detailed else FAST_COMPONENTS)
+            return {**self._get_neutral_mood(), **fields}
             
         except Exception as e:
             logging.error(f"Mood analysis failed: {str(e)}")
             return self._get_neutral_mood()
     
+    def get_speaker_moods(self, texts: List[str], detailed: bool = True) -> List[Dict]:
+        """get_speaker_mood for several utterances, tokenized and scored as a
+        batch, one inference per equivalence class. Falls back to one at a
+        time if the batch fails."""
+        moods = [self._get_neutral_mood() for _ in texts]
+        scored = [i for i, text in enumerate(texts) if text.strip()]
+        if not scored:
+            return moods
+        try:
+            batch = self.score_shared(
+                [texts[i] for i in scored], COMPONENT_FIELDS if detailed else FAST_COMPONENTS
+            )
+        except Exception as e:
+            logging.error(f"Batch mood analysis failed, scoring one by one: {str(e)}")
+            return [self.get_speaker_mood(text, detailed) for text in texts]
+        for i, fields in zip(scored, batch):
+            moods[i].update(fields)
+        return moods
+    
+    def embed(self, texts: List[str], batch_size: int = 16) -> np.ndarray:
+        """Mean-pooled, L2-normalised sentence embeddings (float16) from the
+        encoder already loaded for emotion classification."""
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float16)
+        import torch
+        pooled = []
+        with self.models.use('emotion') as emotion_finder, torch.inference_mode():
+            tokenizer = emotion_finder.tokenizer
+            encoder = emotion_finder.model.base_model
+            for start in range(0, len(texts), batch_size):
+                batch = tokenizer(
+                    texts[start:start + batch_size],
+                    padding=True,
+                    truncation=True,
+                    max_length=256,
+                    return_tensors='pt'
+                )
+                hidden = encoder(**batch).last_hidden_state
+                mask = batch['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                vectors = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+                vectors = torch.nn.functional.normalize(vectors, dim=-1)
+                pooled.append(vectors.numpy().astype(np.float16))
+        return np.vstack(pooled)
+    
+    def memory_report(self) -> Dict:
+        """Process RSS and per-model resident memory."""
+        return self.models.report()
+    
     def _get_neutral_mood(self) -> Dict:
         return {
             'score': 0.0,
@@ -108,4 +389,34 @@ class ConversationAnalyzer:
             total = sum(scores.values())
             scores = {k: round(v/total, 2) for k, v in scores.items()}
         
-        return dict(scores)
\ No newline at end of file
+        return dict(scores)
+
+def aggregate_results(results: Dict, all_moods: List[Dict]):
+    """Overall, per-topic and per-speaker aggregates, in place."""
+    if all_moods:
+        results['overall_mood'] = {
+            'score': round(np.mean([m['score'] for m in all_moods]), 2),
+            'confidence': round(np.mean([m['confidence'] for m in all_moods]), 2)
+        }
+
+    topic_total = sum(results['topics'].values())
+    if topic_total:
+        results['topics'] = {
+            k: round(v/topic_total, 2) 
+            for k, v in results['topics'].items()
+        }
+
+    for speaker_data in results['speaker_analysis'].values():
+        if speaker_data['messages']:
+            speaker_data['avg_mood'] = round(
+                np.mean([m['score'] for m in speaker_data['messages']]), 
+                2
+            )
+            emotion_counts = defaultdict(int)
+            for emotion in speaker_data['emotions']:
+                emotion_counts[emotion] += 1
+            speaker_data['top_emotions'] = sorted(
+                emotion_counts.items(),
+                key=lambda x: x[1],
+                reverse=True
+            )[:2]
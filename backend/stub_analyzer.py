@@ -0,0 +1,61 @@
+import time
+import zlib
+from typing import Dict, Iterable, List
+import numpy as np
+from sentiment_analyzer import ConversationAnalyzer, EMBEDDING_DIM
+from model_residency import LazyModel
+from profiling import current_profile
+
+_EMOTIONS = ['neutral', 'neutral', 'neutral', 'joy', 'surprise', 'sadness', 'anger', 'fear']
+# Simulated share of a full-tier utterance's cost per component
+COMPONENT_SHARE = {'mood': 0.4, 'emotion': 0.3, 'spacy': 0.3}
+
+class StubConversationAnalyzer(ConversationAnalyzer):
+    """Model-free analyzer for load tests: deterministic scores and a
+    simulated inference cost that grows with utterance length."""
+    def __init__(self, latency_ms: float = 20.0, ms_per_word: float = 0.5, **kwargs):
+        self.latency_ms = latency_ms
+        self.ms_per_word = ms_per_word
+        super().__init__(**kwargs)
+
+    def _model_holders(self) -> List[LazyModel]:
+        return []
+
+    def component_versions(self) -> Dict[str, str]:
+        return {**super().component_versions(), 'mood': 'stub', 'emotion': 'stub', 'spacy': 'stub'}
+
+    def _simulate(self, text: str, share: float = 1.0):
+        words = len(text.split())
+        cost_ms = (self.latency_ms + self.ms_per_word * words) * share
+        with current_profile().stage('model_forward', model='stub', words=words):
+            time.sleep(cost_ms / 1000)
+
+    def score_batch(self, texts: List[str], components: Iterable[str]) -> List[Dict]:
+        components = set(components)
+        # Mood model is ~40% of the full cost, like the real cheap tier
+        share = sum(COMPONENT_SHARE[c] for c in components)
+        batch = []
+        for text in texts:
+            self._simulate(text, share)
+            seed = zlib.crc32(text.encode())
+            words = text.split()
+            fields = {}
+            if 'mood' in components:
+                fields['score'] = (seed % 5 - 2) / 2
+                fields['confidence'] = round(0.3 + (seed >> 8) % 70 / 100, 2)
+            if 'emotion' in components:
+                fields['emotion'] = _EMOTIONS[(seed >> 16) % len(_EMOTIONS)]
+            if 'spacy' in components:
+                fields['key_phrases'] = [
+                    ' '.join(words[i:i + 2]) for i in range(0, min(len(words) - 1, 6), 2)
+                ]
+            batch.append(fields)
+        return batch
+
+    def embed(self, texts: List[str], batch_size: int = 16) -> np.ndarray:
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % EMBEDDING_DIM] += 1.0
+        norms = np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return (vectors / norms).astype(np.float16)
@@ -0,0 +1,55 @@
+"""Routes the ASGI server hands to Flask run side by side (see asgi.py)."""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing asgi imports app, which opens its indexes under DATA_DIR
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp())
+
+from asgi import PooledWsgiToAsgi
+
+SLOW_SECONDS = 0.5
+
+def slow_app() -> Flask:
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/slow')
+    def slow():
+        time.sleep(SLOW_SECONDS)
+        return 'done'
+
+    return flask_app
+
+async def get(app, path: str) -> int:
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': [],
+        'http_version': '1.1', 'scheme': 'http', 'server': ('test', 80), 'client': ('test', 1)
+    }
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status']
+
+def test_fallback_requests_overlap():
+    app = PooledWsgiToAsgi(slow_app(), threads=4)
+
+    async def overlapping():
+        started = time.monotonic()
+        statuses = await asyncio.gather(*(get(app, '/slow') for _ in range(3)))
+        return statuses, time.monotonic() - started
+
+    statuses, elapsed = asyncio.run(overlapping())
+    assert statuses == [200, 200, 200]
+    # One after another would take 3 * SLOW_SECONDS
+    assert elapsed < 2 * SLOW_SECONDS
@@ -0,0 +1,29 @@
+"""Entry points stay under their import-time budget (see import_budget.py)."""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from import_budget import ENTRY_POINTS, check
+
+# Packages an entry point needs installed to import at all
+REQUIREMENTS = {
+    'frontend.app': ['streamlit']
+}
+
+@pytest.mark.parametrize('name', list(ENTRY_POINTS))
+def test_import_budget(name, tmp_path):
+    missing = [p for p in REQUIREMENTS.get(name, []) if importlib.util.find_spec(p) is None]
+    if missing:
+        pytest.skip(f"{', '.join(missing)} not installed")
+    result = check(name, ENTRY_POINTS[name], runs=3, scratch=str(tmp_path))
+    assert not result['forbidden_loaded'], (
+        f"{name} imports {', '.join(result['forbidden_loaded'])} at import time"
+    )
+    assert result['median_ms'] <= result['budget_ms'], (
+        f"{name} imports in {result['median_ms']}ms, over its {result['budget_ms']:.0f}ms budget; "
+        f"heaviest: {result['heaviest'][:5]}"
+    )
@@ -0,0 +1,189 @@
+import re
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from analysis_store import entry_mood, entry_speaker, entry_when
+
+# Bucket sizes (seconds) of the precomputed sentiment pyramid, finest first
+PYRAMID_BUCKETS = (5, 15, 60, 300)
+# Points kept per speaker in the LTTB-downsampled series
+LTTB_POINTS = 500
+
+_TIMESTAMP = re.compile(r'(?:(\d+):)?(\d+):(\d{2})')
+
+def parse_timestamp(timestamp: str) -> Optional[int]:
+    """Parse '[MM:SS]', '[H:MM:SS]' or 'MM:SS' into whole seconds."""
+    match = _TIMESTAMP.search(timestamp or '')
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+
+def timestamps_to_seconds(timestamps: Sequence[str]) -> np.ndarray:
+    """Parse timestamps once into an int array. Unparseable entries inherit the previous time."""
+    seconds = np.zeros(len(timestamps), dtype=np.int64)
+    last = 0
+    for i, timestamp in enumerate(timestamps):
+        parsed = parse_timestamp(timestamp)
+        if parsed is not None:
+            last = parsed
+        seconds[i] = last
+    return seconds
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling. Returns the kept indices."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+def _bucket_aggregates(seconds: np.ndarray, scores: np.ndarray, size: int) -> Dict:
+    buckets, inverse, counts = np.unique(
+        seconds // size, return_inverse=True, return_counts=True
+    )
+    sums = np.bincount(inverse, weights=scores)
+    mins = np.full(len(buckets), np.inf)
+    maxs = np.full(len(buckets), -np.inf)
+    np.minimum.at(mins, inverse, scores)
+    np.maximum.at(maxs, inverse, scores)
+    return {
+        't': (buckets * size).tolist(),
+        'mean': np.round(sums / counts, 3).tolist(),
+        'min': mins.round(3).tolist(),
+        'max': maxs.round(3).tolist(),
+        'count': counts.tolist()
+    }
+
+def build_timeline_pyramid(
+    timeline: List[Dict],
+    buckets: Sequence[int] = PYRAMID_BUCKETS,
+    max_points: int = LTTB_POINTS,
+    seconds: Optional[np.ndarray] = None
+) -> Dict:
+    """Precompute per-speaker sentiment at several time resolutions.
+
+    `seconds` is aligned with the timeline so a zoom window can be sliced
+    from the full resolution series without re-parsing timestamps.
+    """
+    if seconds is None:
+        seconds = timestamps_to_seconds([entry_when(entry) for entry in timeline])
+    speakers = np.array([entry_speaker(entry) for entry in timeline])
+    scores = np.array(
+        [entry_mood(entry).get('score', 0.0) for entry in timeline],
+        dtype=np.float64
+    )
+
+    masks = {speaker: speakers == speaker for speaker in dict.fromkeys(speakers.tolist())}
+    levels = []
+    for size in buckets:
+        per_speaker = {
+            speaker: _bucket_aggregates(seconds[mask], scores[mask], size)
+            for speaker, mask in masks.items()
+        }
+        levels.append({
+            'bucket_seconds': size,
+            'points': sum(len(s['t']) for s in per_speaker.values()),
+            'speakers': per_speaker
+        })
+
+    raw, lttb = {}, {}
+    for speaker, mask in masks.items():
+        positions = np.flatnonzero(mask)
+        raw[speaker] = {
+            't': seconds[positions].tolist(),
+            'score': scores[positions].tolist(),
+            'index': positions.tolist()
+        }
+        kept = positions[lttb_indices(
+            seconds[positions].astype(np.float64), scores[positions], max_points
+        )]
+        lttb[speaker] = {
+            't': seconds[kept].tolist(),
+            'score': scores[kept].tolist(),
+            'index': kept.tolist()
+        }
+
+    return {
+        'duration': int(seconds.max()) if len(seconds) else 0,
+        'seconds': seconds.tolist(),
+        'raw': raw,
+        'levels': levels,
+        'lttb': lttb
+    }
+
+def pyramid_descriptor(timeline: List[Dict], buckets: Sequence[int] = PYRAMID_BUCKETS) -> Dict:
+    """What /analyze returns instead of the pyramid itself: enough for a
+    client to size its zoom control, with the points fetched per window
+    from the stored analysis (timeline_window)."""
+    seconds = timestamps_to_seconds([entry_when(entry) for entry in timeline])
+    return {
+        'duration': int(seconds.max()) if len(seconds) else 0,
+        'points': len(timeline),
+        'bucket_seconds': list(buckets),
+        'lttb_points': LTTB_POINTS
+    }
+
+def _window(series: Dict, start: float, end: float) -> Dict:
+    keep = [i for i, t in enumerate(series['t']) if start <= t <= end]
+    return {key: [values[i] for i in keep] for key, values in series.items()}
+
+def timeline_window(
+    pyramid: Dict,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    level: str = 'auto',
+    max_points: int = 2000
+) -> Dict:
+    """One resolution of the pyramid, cut to [start, end] seconds.
+
+    level is 'raw', 'lttb', a bucket size in seconds, or 'auto' for the
+    finest resolution whose points inside the window fit max_points.
+    """
+    start = 0 if start is None else start
+    end = pyramid['duration'] if end is None else end
+    candidates = [('raw', None, pyramid['raw'])] + [
+        ('level', entry['bucket_seconds'], entry['speakers']) for entry in pyramid['levels']
+    ] + [('lttb', None, pyramid['lttb'])]
+
+    if level == 'auto':
+        chosen = candidates[-1]
+        for candidate in candidates:
+            points = sum(
+                sum(1 for t in series['t'] if start <= t <= end)
+                for series in candidate[2].values()
+            )
+            if points <= max_points:
+                chosen = candidate
+                break
+    elif level in ('raw', 'lttb'):
+        chosen = next(c for c in candidates if c[0] == level)
+    else:
+        chosen = next((c for c in candidates if str(c[1]) == str(level)), None)
+        if chosen is None:
+            raise ValueError(f"Unknown level '{level}'")
+
+    resolution, bucket_seconds, speakers = chosen
+    return {
+        'duration': pyramid['duration'],
+        'window': [start, end],
+        'resolution': resolution,
+        'bucket_seconds': bucket_seconds,
+        'speakers': {
+            speaker: _window(series, start, end) for speaker, series in speakers.items()
+        }
+    }
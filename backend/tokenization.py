@@ -0,0 +1,117 @@
+"""Tokenization split out of the HF pipelines.
+
+Utterances are tokenized in bulk with the fast tokenizer's batch API and
+the token IDs are cached per model, keyed by cleaned text, so greetings,
+hold messages and repeated complaints are only tokenized once. The
+cached lengths then decide batching: utterances of similar length are
+scored together, so little of each batch is padding.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+TOKEN_CACHE_ENTRIES = int(os.environ.get('TOKEN_CACHE_ENTRIES', 20000))
+MAX_TOKENS = 512
+INFERENCE_BATCH_SIZE = int(os.environ.get('INFERENCE_BATCH_SIZE', 8))
+# Padded tokens per batch; long utterances get smaller batches
+BATCH_TOKEN_BUDGET = int(os.environ.get('INFERENCE_BATCH_TOKENS', 2048))
+
+class TokenCache:
+    """Bounded LRU of token IDs per model."""
+    def __init__(self, max_entries: int = TOKEN_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: Dict[str, OrderedDict] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.tokenize_seconds = 0.0
+        self.tokenized = 0
+
+    def encode(
+        self, name: str, tokenizer, texts: Sequence[str], max_length: int = MAX_TOKENS
+    ) -> List[List[int]]:
+        """Token IDs (with special tokens, truncated to max_length) for each
+        text. A model is always encoded with the same max_length."""
+        ids = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            entries = self._entries.setdefault(name, OrderedDict())
+            for i, text in enumerate(texts):
+                cached = entries.get(text)
+                if cached is None:
+                    missing.setdefault(text, []).append(i)
+                else:
+                    entries.move_to_end(text)
+                    ids[i] = cached
+            self.hits += len(texts) - sum(len(v) for v in missing.values())
+            self.misses += len(missing)
+
+        if missing:
+            started = time.perf_counter()
+            unique = list(missing)
+            encoded = tokenizer(unique, truncation=True, max_length=max_length)['input_ids']
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.tokenize_seconds += elapsed
+                self.tokenized += len(unique)
+                for text, token_ids in zip(unique, encoded):
+                    entries[text] = token_ids
+                    for i in missing[text]:
+                        ids[i] = token_ids
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+        return ids
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': {name: len(entries) for name, entries in self._entries.items()},
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'tokenized': self.tokenized,
+                'tokenize_ms_per_text': (
+                    round(self.tokenize_seconds / self.tokenized * 1000, 3) if self.tokenized else None
+                )
+            }
+
+def length_batches(
+    lengths: Sequence[int],
+    max_batch: int = INFERENCE_BATCH_SIZE,
+    token_budget: int = BATCH_TOKEN_BUDGET
+) -> List[List[int]]:
+    """Indices grouped by similar token length. A batch closes when it is
+    full or when padding everything to its longest member would exceed
+    the token budget."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches, current = [], []
+    for i in order:
+        # Sorted ascending, so lengths[i] is the batch's padded length
+        if current and (len(current) == max_batch or lengths[i] * (len(current) + 1) > token_budget):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+def pad_batch(rows: Sequence[Sequence[int]], pad_id: int, length: int = None):
+    """(input_ids, attention_mask) tensors, right-padded to `length` or the longest row."""
+    import torch
+    length = length or max(len(row) for row in rows)
+    input_ids = torch.full((len(rows), length), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(rows), length), dtype=torch.long)
+    for r, row in enumerate(rows):
+        input_ids[r, :len(row)] = torch.as_tensor(row, dtype=torch.long)
+        attention_mask[r, :len(row)] = 1
+    return input_ids, attention_mask
+
+def top_labels(logits, id2label: Dict) -> List[Dict]:
+    """Pipeline-style {'label', 'score'} from softmaxed logits, one per row."""
+    probabilities = logits.float().softmax(-1)
+    scores, best = probabilities.max(-1)
+    return [
+        {'label': id2label[int(label)], 'score': float(score)}
+        for label, score in zip(best, scores)
+    ]
@@ -0,0 +1,46 @@
+import re
+from typing import Dict, List
+
+# "[Sales Agent 00:10]" speaker headers, as written by the call recorder
+_SPEAKER_HEADER = re.compile(r'\[(.*?)\s+(\d{2}:\d{2})\]')
+
+def parse_transcript(text: str) -> List[Dict]:
+    """Split a raw transcript into {'speaker', 'timestamp', 'text'} turns.
+
+    A header line starts a turn and any following lines are joined onto it.
+    /analyze parses raw uploads with this (see ingest.py), as does rescoring.
+    """
+    transcript = []
+    current_speaker = None
+    current_text = []
+    timestamp = None
+
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        speaker_match = _SPEAKER_HEADER.match(line)
+        if speaker_match:
+            if current_speaker and current_text:
+                transcript.append({
+                    'speaker': current_speaker,
+                    'timestamp': timestamp,
+                    'text': ' '.join(current_text)
+                })
+
+            speaker, clock = speaker_match.groups()
+            current_speaker = speaker.strip()
+            timestamp = f"[{clock}]"
+            current_text = [line[speaker_match.end():].strip()]
+        elif current_speaker:
+            current_text.append(line)
+
+    if current_speaker and current_text:
+        transcript.append({
+            'speaker': current_speaker,
+            'timestamp': timestamp,
+            'text': ' '.join(current_text)
+        })
+
+    return transcript
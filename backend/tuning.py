@@ -0,0 +1,98 @@
+"""Per-host inference settings, written by autotune.py.
+
+A profile is TUNING_DIR/<host key>.json, where the key is the CPU count and
+model, so nodes of the same shape share one. TUNING_PROFILE points at a
+specific file instead ('off' ignores profiles). Explicit environment
+variables always win over the profile:
+
+  torch_threads          TORCH_NUM_THREADS     torch intra-op threads
+  torch_interop_threads  TORCH_INTEROP_THREADS torch inter-op threads
+  inference_batch_size   INFERENCE_BATCH_SIZE  utterances per forward pass
+  scheduler_slots        SCHEDULER_SLOTS       forward passes in flight
+"""
+import os
+import json
+import hashlib
+import logging
+import platform
+import threading
+from typing import Dict, Optional
+
+TUNING_DIR = os.environ.get(
+    'TUNING_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tuning')
+)
+SETTINGS_ENV = {
+    'torch_threads': 'TORCH_NUM_THREADS',
+    'torch_interop_threads': 'TORCH_INTEROP_THREADS',
+    'inference_batch_size': 'INFERENCE_BATCH_SIZE',
+    'scheduler_slots': 'SCHEDULER_SLOTS'
+}
+
+_profile = None
+_loaded = False
+_torch_configured = False
+_lock = threading.Lock()
+
+def cpu_model() -> str:
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+def host_key() -> str:
+    return f"{os.cpu_count() or 1}cpu-{hashlib.sha1(cpu_model().encode()).hexdigest()[:8]}"
+
+def profile_path() -> Optional[str]:
+    path = os.environ.get('TUNING_PROFILE')
+    if path == 'off':
+        return None
+    return path or os.path.join(TUNING_DIR, f"{host_key()}.json")
+
+def load_profile() -> Optional[Dict]:
+    """This host's profile, read once; None when there isn't one."""
+    global _profile, _loaded
+    with _lock:
+        if not _loaded:
+            _loaded = True
+            path = profile_path()
+            if path and os.path.isfile(path):
+                try:
+                    with open(path) as f:
+                        _profile = json.load(f)
+                    logging.info(f"Loaded tuning profile {path}: {_profile.get('settings')}")
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Ignoring tuning profile {path}: {e}")
+        return _profile
+
+def setting(name: str, default=None):
+    """Environment variable, else this host's profile, else default."""
+    env = os.environ.get(SETTINGS_ENV[name], '')
+    if env.isdigit() and int(env) > 0:
+        return int(env)
+    profile = load_profile()
+    value = ((profile or {}).get('settings') or {}).get(name)
+    return default if value is None else value
+
+def configure_torch():
+    """Apply the thread settings once, before torch does any parallel work."""
+    global _torch_configured
+    with _lock:
+        if _torch_configured:
+            return
+        _torch_configured = True
+    threads, interop = setting('torch_threads'), setting('torch_interop_threads')
+    if threads is None and interop is None:
+        return
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    if interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError as e:
+            # Only possible before the first inter-op parallel work
+            logging.warning(f"Could not set inter-op threads to {interop}: {e}")
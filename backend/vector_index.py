@@ -0,0 +1,172 @@
+import os
+import json
+import threading
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+from analysis_store import INDEX_DIR
+
+# Exact search below this many vectors, IVF above it
+IVF_MIN_VECTORS = 20000
+IVF_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit vectors; returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+class VectorStore:
+    """Append-only float16 matrix on disk, read through a memory map.
+
+    Row i of <name>.f16 belongs to line i of <name>.ids.jsonl. Vectors are
+    L2-normalised on the way in so a dot product is the cosine similarity.
+    Past IVF_MIN_VECTORS rows an inverted-file index is trained and only
+    the IVF_NPROBE closest lists are scanned.
+    """
+    def __init__(self, name: str, dim: int, index_dir: str = INDEX_DIR):
+        self.dim = dim
+        self.directory = os.path.join(index_dir, 'vectors')
+        self.vectors_path = os.path.join(self.directory, f'{name}.f16')
+        self.ids_path = os.path.join(self.directory, f'{name}.ids.jsonl')
+        self.ivf_path = os.path.join(self.directory, f'{name}.ivf.npz')
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._ivf = None
+        self.ids: List[Dict] = []
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path) as f:
+                self.ids = [json.loads(line) for line in f if line.strip()]
+        if os.path.exists(self.ivf_path):
+            self._ivf = dict(np.load(self.ivf_path))
+        self._remap()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _remap(self):
+        rows = len(self.ids)
+        if not rows or not os.path.exists(self.vectors_path):
+            self._matrix = np.zeros((0, self.dim), dtype=np.float16)
+            return
+        # Rows written without a sidecar line (crash mid-append) are ignored
+        self._matrix = np.memmap(
+            self.vectors_path, dtype=np.float16, mode='r', shape=(rows, self.dim)
+        )
+
+    def add(self, vectors: np.ndarray, metas: List[Dict]):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            with open(self.vectors_path, 'r+b' if os.path.exists(self.vectors_path) else 'wb') as f:
+                f.seek(len(self.ids) * self.dim * 2)
+                f.write(vectors.astype(np.float16).tobytes())
+                f.truncate()
+            with open(self.ids_path, 'a') as f:
+                for meta in metas:
+                    f.write(json.dumps(meta) + '\n')
+            self.ids.extend(metas)
+            self._remap()
+            if self._ivf is not None:
+                self._assign_new(len(self.ids) - len(metas))
+            self._maybe_train()
+
+    def vector(self, row: int) -> np.ndarray:
+        return np.asarray(self._matrix[row], dtype=np.float32)
+
+    def _maybe_train(self):
+        """(Re)train IVF once the corpus passes the threshold or doubles."""
+        trained_on = int(self._ivf['trained_on']) if self._ivf is not None else 0
+        if len(self.ids) < IVF_MIN_VECTORS or len(self.ids) < 2 * trained_on:
+            return
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(
+            len(self.ids), min(len(self.ids), KMEANS_SAMPLE), replace=False
+        ))
+        sample = np.asarray(self._matrix[sample_rows], dtype=np.float32)
+        n_lists = int(np.sqrt(len(self.ids)))
+        self._ivf = {
+            'centroids': _kmeans(sample, n_lists),
+            'assignment': np.zeros(0, dtype=np.int32),
+            'trained_on': np.int64(len(self.ids))
+        }
+        self._assign_new(0)
+        logging.info(f"Trained IVF index with {n_lists} lists over {len(self.ids)} vectors")
+
+    def _assign_new(self, start: int):
+        centroids = self._ivf['centroids']
+        assignments = [self._ivf['assignment'][:start]]
+        for offset in range(start, len(self.ids), 8192):
+            chunk = np.asarray(self._matrix[offset:offset + 8192], dtype=np.float32)
+            assignments.append(np.argmax(chunk @ centroids.T, axis=1).astype(np.int32))
+        self._ivf['assignment'] = np.concatenate(assignments)
+        np.savez(self.ivf_path, **self._ivf)
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: Optional[set] = None) -> List[Dict]:
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        query /= max(np.linalg.norm(query), 1e-12)
+        with self._lock:
+            if not len(self.ids):
+                return []
+            if self._ivf is not None:
+                lists = np.argsort(-(self._ivf['centroids'] @ query))[:IVF_NPROBE]
+                candidates = np.flatnonzero(np.isin(self._ivf['assignment'], lists))
+            else:
+                candidates = np.arange(len(self.ids))
+            scores = np.empty(len(candidates), dtype=np.float32)
+            for offset in range(0, len(candidates), 65536):
+                rows = candidates[offset:offset + 65536]
+                scores[offset:offset + len(rows)] = np.asarray(self._matrix[rows], dtype=np.float32) @ query
+            order = np.argsort(-scores)
+            hits = []
+            for i in order:
+                meta = self.ids[candidates[i]]
+                if exclude and meta.get('call_id') in exclude:
+                    continue
+                hits.append({**meta, 'score': round(float(scores[i]), 4)})
+                if len(hits) == k:
+                    break
+            return hits
+
+class CallVectorIndex:
+    """Utterance- and call-level embedding stores for similarity search."""
+    def __init__(self, dim: int, index_dir: str = INDEX_DIR):
+        self.utterances = VectorStore('utterances', dim, index_dir)
+        self.calls = VectorStore('calls', dim, index_dir)
+        self._call_rows = {meta['call_id']: i for i, meta in enumerate(self.calls.ids)}
+        # Check-then-append of a call is one step, so concurrent analyses
+        # of the same transcript index it once
+        self._lock = threading.Lock()
+
+    def has_call(self, call_id: str) -> bool:
+        return call_id in self._call_rows
+
+    def add_call(self, call_id: str, vectors: np.ndarray, utterances: List[Dict]):
+        if not len(vectors):
+            return
+        with self._lock:
+            if self.has_call(call_id):
+                return
+            self.utterances.add(vectors, [{'call_id': call_id, **u} for u in utterances])
+            unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            self.calls.add(unit.mean(axis=0, keepdims=True), [{
+                'call_id': call_id, 'utterances': len(utterances)
+            }])
+            self._call_rows[call_id] = len(self.calls) - 1
+
+    def call_vector(self, call_id: str) -> Optional[np.ndarray]:
+        row = self._call_rows.get(call_id)
+        return self.calls.vector(row) if row is not None else None
+
+    def stats(self) -> Dict:
+        return {'utterances': len(self.utterances), 'calls': len(self.calls)}
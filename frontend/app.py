@@ -1,19 +1,18 @@
 # app.py
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
-import numpy as np
 import requests
 import json
+import hashlib
+import gzip
 import re
 import os
-import sqlite3
 from datetime import datetime
 import traceback
-from werkzeug.security import generate_password_hash, check_password_hash
 from typing import Dict, List
+from urllib.parse import quote
 import time
+from auth.database import Database
+from utils.backend_client import BackendClient
 
 # Color scheme
 COLORS = {
@@ -24,77 +23,13 @@ COLORS = {
     'neutral': '#95A5A6'
 }
 
-# Database Management
-class Database:
-    def __init__(self, db_file="data/users.db"):
-        self.db_file = db_file
-        os.makedirs(os.path.dirname(db_file), exist_ok=True)
-        self.init_db()
-
-    def init_db(self):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS analysis_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    filename TEXT,
-                    analysis_data TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            conn.commit()
-
-    def add_user(self, username, email, password):
-        try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
-                    (username, email, generate_password_hash(password))
-                )
-                conn.commit()
-                return True
-        except sqlite3.IntegrityError:
-            return False
-
-    def verify_user(self, username, password):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, password_hash FROM users WHERE username = ?", 
-                (username,)
-            )
-            result = cursor.fetchone()
-            if result and check_password_hash(result[1], password):
-                cursor.execute(
-                    "UPDATE users SET last_login = ? WHERE id = ?",
-                    (datetime.now(), result[0])
-                )
-                conn.commit()
-                return result[0]
-        return None
-
-    def get_user_by_email(self, email):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
-            return cursor.fetchone()
-
 # File Storage Management
+# DATA_DIR/user_data, the directory the backend reads stored analyses from
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+USER_DATA_DIR = os.getenv('USER_DATA_DIR', os.path.join(DATA_DIR, 'user_data'))
+
 class FileStorage:
-    def __init__(self, base_dir="data/user_data"):
+    def __init__(self, base_dir=USER_DATA_DIR):
         self.base_dir = base_dir
         os.makedirs(base_dir, exist_ok=True)
     
@@ -238,132 +173,131 @@ def show_register_page():
                 st.error("Username already exists")
                 return False
 
-def call_api(transcript):
-    """Call the analysis API with proper URL."""
-    try:
-        # Get base API URL and construct endpoint
-        base_url = get_api_url()
-        api_url = f"{base_url}/analyze"
-        
-        # Log request details
-        st.debug(f"Making request to: {api_url}")
-        
-        # Make API call with updated headers
-        response = requests.post(
-            api_url,
-            json={'transcript': transcript},
-            headers={
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Origin': 'https://call-sentiment-analysis-production.up.railway.app'
-            },
-            timeout=30
+def expand_compact_response(response_data):
+    """Rebuild the per-utterance rows the UI works with from /analyze's
+    compact view (columnar timeline, speakers as timeline indices), with
+    the key names the UI uses (sentiment, timestamp, speaker)."""
+    columns = response_data.pop('timeline', None) or {}
+    sentiments = [
+        {'score': score, 'confidence': confidence, 'emotion': emotion, 'key_phrases': key_phrases}
+        for score, confidence, emotion, key_phrases in zip(
+            columns.get('score', []), columns.get('confidence', []),
+            columns.get('emotion', []), columns.get('key_phrases', [])
         )
-        
-        # Debug logging
-        st.debug(f"Response status: {response.status_code}")
-        st.debug(f"Response headers: {dict(response.headers)}")
-        
-        # Handle response
-        if response.status_code == 200:
-            return process_api_response(response.json())
-        else:
-            st.error(f"API Error: {response.status_code}")
-            st.error(f"Error details: {response.text}")
-            return None
-            
-    except requests.exceptions.RequestException as e:
-        st.error(f"Connection Error: {str(e)}")
-        st.info(f"""
-        Please check:
-        1. Backend service is running
-        2. API URL is correct (currently: {api_url})
-        3. Network connection is stable
-        """)
-        return None
-    except Exception as e:
-        st.error(f"Error: {str(e)}")
-        return None
-
-def process_api_response(response_data):
-    """Process and normalize API response data."""
-    # Map mood to sentiment for consistency
+    ]
+    response_data['timeline'] = [
+        {'timestamp': when, 'speaker': who, 'sentiment': sentiment, 'topics': topics}
+        for when, who, sentiment, topics in zip(
+            columns.get('when', []), columns.get('who', []), sentiments, columns.get('topics', [])
+        )
+    ]
+    for speaker_data in response_data.get('speaker_analysis', {}).values():
+        index = speaker_data.pop('timeline_index', [])
+        speaker_data['avg_sentiment'] = speaker_data.pop('avg_mood', 0.0)
+        speaker_data['messages'] = [sentiments[i] for i in index]
+        speaker_data['emotions'] = [sentiments[i]['emotion'] for i in index]
     if 'overall_mood' in response_data:
         response_data['overall_sentiment'] = response_data.pop('overall_mood')
-    
-    if 'timeline' in response_data:
-        for entry in response_data['timeline']:
-            if 'mood' in entry:
-                entry['sentiment'] = entry.pop('mood')
-            
-            # Ensure timestamp mapping
-            if 'when' in entry:
-                entry['timestamp'] = entry.pop('when')
-            if 'who' in entry:
-                entry['speaker'] = entry.pop('who')
-    
-    # Ensure speaker analysis mood mapping
-    if 'speaker_analysis' in response_data:
-        for speaker_data in response_data['speaker_analysis'].values():
-            if 'avg_mood' in speaker_data:
-                speaker_data['avg_sentiment'] = speaker_data.pop('avg_mood')
-    
     return response_data
 
-def parse_transcript(text: str) -> List[Dict]:
-    lines = text.split('\n')
-    transcript = []
-    current_speaker = None
-    current_text = []
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        speaker_match = re.match(r'\[(.*?)\s+(\d{2}:\d{2})\]', line)
-        if speaker_match:
-            if current_speaker and current_text:
-                transcript.append({
-                    'speaker': current_speaker,
-                    'timestamp': timestamp,
-                    'text': ' '.join(current_text)
-                })
-            
-            speaker, timestamp = speaker_match.groups()
-            current_speaker = speaker.strip()
-            timestamp = f"[{timestamp}]"
-            current_text = [line[speaker_match.end():].strip()]
-        elif current_speaker:
-            current_text.append(line)
+# Timeline Rendering
+# Long calls come back with a small pyramid descriptor instead of every
+# point; the chart then fetches, per zoom window, the finest resolution the
+# backend can fit in MAX_CHART_POINTS. Above WEBGL_POINT_THRESHOLD traces
+# switch to WebGL.
+MAX_CHART_POINTS = int(os.getenv('TIMELINE_MAX_POINTS', 2000))
+WEBGL_POINT_THRESHOLD = int(os.getenv('TIMELINE_WEBGL_THRESHOLD', 1000))
+
+TIMELINE_COLORS = {
+    'Customer': COLORS['accent'],
+    'Sales Agent': COLORS['primary']
+}
+
+def format_seconds(seconds) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{seconds:02d}"
+
+# plotly and pandas are imported inside the chart functions so the login
+# page renders without paying for them
+
+def _timeline_trace(points, **kwargs):
+    import plotly.graph_objects as go
+    trace = go.Scattergl if points > WEBGL_POINT_THRESHOLD else go.Scatter
+    return trace(**kwargs)
+
+def _aggregate_timeline_traces(fig, series):
+    bucketed = series['resolution'] == 'level'
+    total = sum(len(data['t']) for data in series['speakers'].values())
     
-    if current_speaker and current_text:
-        transcript.append({
-            'speaker': current_speaker,
-            'timestamp': timestamp,
-            'text': ' '.join(current_text)
-        })
+    for speaker, data in series['speakers'].items():
+        if bucketed:
+            y = data['mean']
+            customdata = [
+                [format_seconds(t), low, high, count]
+                for t, low, high, count in zip(data['t'], data['min'], data['max'], data['count'])
+            ]
+            hover = (
+                "<b>%{customdata[0]}</b><br>" +
+                "Mean Sentiment: %{y:.2f}<br>" +
+                "Range: %{customdata[1]:.2f} to %{customdata[2]:.2f}<br>" +
+                "Messages: %{customdata[3]}<extra></extra>"
+            )
+        else:
+            y = data['score']
+            customdata = [[format_seconds(t)] for t in data['t']]
+            hover = "<b>%{customdata[0]}</b><br>Sentiment: %{y:.2f}<extra></extra>"
+        
+        fig.add_trace(_timeline_trace(
+            total,
+            x=data['t'],
+            y=y,
+            name=speaker,
+            mode='lines',
+            line=dict(color=TIMELINE_COLORS.get(speaker, COLORS['neutral'])),
+            hovertemplate=hover,
+            customdata=customdata
+        ))
     
-    return transcript
+    title = f"{series['bucket_seconds']}s buckets" if bucketed else "downsampled"
+    return f"Time (seconds, {title})"
 
-def show_sentiment_timeline(timeline_data):
+def show_sentiment_timeline(timeline_data, series=None):
+    """Chart the timeline, or the window of it fetched from the backend."""
+    import plotly.graph_objects as go
+    import pandas as pd
+    fig = go.Figure()
+    
+    if series is not None and series['resolution'] != 'raw':
+        return _style_timeline(fig, _aggregate_timeline_traces(fig, series))
+    
+    if series is not None:
+        # Every point in the window: times from the backend, details from our copy
+        points = sorted(
+            (i, t)
+            for data in series['speakers'].values()
+            for i, t in zip(data['index'], data['t'])
+            if i < len(timeline_data)
+        )
+    else:
+        points = [(i, None) for i in range(len(timeline_data))]
     df = pd.DataFrame([
         {
-            'time': t.get('timestamp', t.get('when', 'Unknown')),
+            'time': (
+                seconds if seconds is not None
+                else t.get('timestamp', t.get('when', 'Unknown'))
+            ),
             'speaker': t.get('speaker', t.get('who', 'Unknown')),
             'sentiment': t.get('sentiment', t.get('mood', {})).get('score', 0.0),
             'confidence': t.get('sentiment', t.get('mood', {})).get('confidence', 0.0),
             'emotion': t.get('sentiment', t.get('mood', {})).get('emotion', 'neutral'),
             'text': t.get('text', '')[:100]
         }
-        for t in timeline_data
+        for t, seconds in ((timeline_data[i], seconds) for i, seconds in points)
     ])
+    if df.empty:
+        return _style_timeline(fig, "Time")
     
-    fig = go.Figure()
-    colors = {
-        'Customer': COLORS['accent'],
-        'Sales Agent': COLORS['primary']
-    }
+    webgl = len(df) > WEBGL_POINT_THRESHOLD
     
     # Calculate rolling averages for smoother lines
     window_size = 3
@@ -373,17 +307,18 @@ def show_sentiment_timeline(timeline_data):
             window=window_size, center=True, min_periods=1
         ).mean()
         
-        fig.add_trace(go.Scatter(
+        fig.add_trace(_timeline_trace(
+            len(df),
             x=speaker_data['time'],
             y=speaker_data['smooth_sentiment'],
             name=speaker,
-            mode='lines+markers',
+            mode='lines' if webgl else 'lines+markers',
+            # WebGL traces do not support spline smoothing
             line=dict(
-                color=colors.get(speaker, COLORS['neutral']),
-                shape='spline',
-                smoothing=0.3
+                color=TIMELINE_COLORS.get(speaker, COLORS['neutral']),
+                **({} if webgl else {'shape': 'spline', 'smoothing': 0.3})
             ),
-            marker=dict(size=8),
+            **({} if webgl else {'marker': dict(size=8)}),
             hovertemplate=(
                 "<b>%{x}</b><br>" +
                 "Sentiment: %{y:.2f}<br>" +
@@ -394,6 +329,9 @@ def show_sentiment_timeline(timeline_data):
             customdata=speaker_data[['confidence', 'emotion', 'text']].values
         ))
     
+    return _style_timeline(fig, "Time (seconds)" if series is not None else "Time")
+
+def _style_timeline(fig, xaxis_title):
     fig.update_layout(
         title={
             'text': "Conversation Sentiment Timeline",
@@ -402,7 +340,7 @@ def show_sentiment_timeline(timeline_data):
             'xanchor': 'center',
             'yanchor': 'top'
         },
-        xaxis_title="Time",
+        xaxis_title=xaxis_title,
         yaxis_title="Sentiment Score",
         yaxis=dict(
             range=[-1, 1],
@@ -418,6 +356,8 @@ def show_sentiment_timeline(timeline_data):
 
 def show_topic_analysis(results):
     """Display topic analysis with improved visualization."""
+    import plotly.express as px
+    import pandas as pd
     st.markdown("### Topic Distribution")
     topic_data = pd.DataFrame({
         'Topic': [k.title() for k in results['topics'].keys()],
@@ -505,23 +445,137 @@ def show_user_history():
                         'analysis',
                         file['filename']
                     )
-                    with open(analysis_path) as f:
-                        analysis_data = json.load(f)
-                        show_analysis_results(analysis_data)
+                    cache_key = f"{analysis_path}:{os.path.getmtime(analysis_path)}"
+                    analysis_data = load_analysis_file(cache_key, analysis_path)
+                    show_analysis_results(
+                        analysis_data,
+                        cache_key=cache_key,
+                        analysis_ref=(st.session_state.user_id, file['filename'][:-len('_analysis.json')])
+                    )
                         
-def get_api_url():
-    """Get the API URL based on the environment"""
-    base_url = os.getenv(
-        'BACKEND_URL',
-        'http://call-sentiment-analysis.railway.internal:8080'
-    ).rstrip('/')
-    
-    # Log the URL for debugging
-    st.debug(f"Base API URL: {base_url}")
-    return base_url
+# Result Caching
+# Streamlit reruns main() on every interaction, so parsing, the backend call
+# and figure construction are memoized on the upload's content hash.
+CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_ENTRIES', 32))
+
+API_TIMEOUT = 30
+UPLOAD_GZIP_LEVEL = 6
 
-def show_analysis_results(results):
-    """Display complete analysis results."""
+API_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json',
+    'Origin': 'https://call-sentiment-analysis-production.up.railway.app',
+    # Lets the backend drop work we have already stopped waiting for
+    'X-Request-Timeout': str(API_TIMEOUT)
+}
+
+class AnalysisAPIError(Exception):
+    """Non-200 response from /analyze. Raised so the failure is not cached."""
+    def __init__(self, status_code, headers, body):
+        super().__init__(f"API Error: {status_code}")
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+def upload_digest(raw_bytes: bytes) -> str:
+    return hashlib.sha256(raw_bytes).hexdigest()
+
+def get_processed_uploads() -> Dict:
+    """Per-session record of uploads already saved to disk, keyed by digest."""
+    if 'processed_uploads' not in st.session_state:
+        st.session_state.processed_uploads = {}
+    return st.session_state.processed_uploads
+
+def trim_processed_uploads(processed: Dict):
+    while len(processed) > CACHE_MAX_ENTRIES:
+        processed.pop(next(iter(processed)))
+
+def compress_upload(raw_bytes: bytes) -> bytes:
+    """Gzipped upload body; only called from the cached request_analysis."""
+    return gzip.compress(raw_bytes, compresslevel=UPLOAD_GZIP_LEVEL)
+
+@st.cache_resource
+def get_backend_client() -> BackendClient:
+    """One client per process: BACKEND_URLS replicas on a consistent-hash ring."""
+    return BackendClient()
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def request_analysis(digest: str, _raw_bytes: bytes, file_type: str, user_id=None) -> Dict:
+    """POST the upload as-is (gzipped) to /analyze on the replica that owns
+    its digest; the backend parses raw transcripts. The compact view keeps
+    the response small; it is expanded back into rows here. Only successful
+    responses are cached."""
+    response, replica = get_backend_client().post(
+        '/analyze',
+        key=digest,
+        params={'view': 'compact'},
+        data=compress_upload(_raw_bytes),
+        headers={
+            **API_HEADERS,
+            'Content-Type': 'application/json' if file_type == 'application/json' else 'text/plain',
+            'Content-Encoding': 'gzip',
+            # Uploads from the UI are interactive; the backend fair-shares per user
+            'X-Priority': 'interactive',
+            'X-User-Id': str(user_id)
+        },
+        timeout=API_TIMEOUT
+    )
+    if response.status_code != 200:
+        raise AnalysisAPIError(
+            response.status_code, dict(response.headers), response.text
+        )
+    return {
+        'replica': replica,
+        'status_code': response.status_code,
+        'headers': dict(response.headers),
+        'results': expand_compact_response(response.json())
+    }
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def load_analysis_file(cache_key: str, _path: str) -> Dict:
+    """Load a stored analysis. The key carries the mtime so edits invalidate it."""
+    with open(_path) as f:
+        return json.load(f)
+
+class TimelineUnavailable(Exception):
+    """The backend could not serve a timeline window. Raised so it is not cached."""
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _fetch_timeline_window(cache_key: str, user_id, analysis_id: str, window) -> Dict:
+    params = {'max_points': MAX_CHART_POINTS}
+    if window:
+        params['from'], params['to'] = window
+    try:
+        response, _ = get_backend_client().get(
+            f"/analyses/{user_id}/{quote(analysis_id, safe='')}/timeline",
+            key=analysis_id,
+            params=params,
+            headers={'Accept': 'application/json'},
+            timeout=API_TIMEOUT
+        )
+    except requests.exceptions.RequestException as e:
+        raise TimelineUnavailable(str(e))
+    if response.status_code != 200:
+        raise TimelineUnavailable(f"HTTP {response.status_code}")
+    return response.json()
+
+def fetch_timeline_window(cache_key: str, user_id, analysis_id: str, window):
+    """The stored analysis' timeline at the resolution that fits the zoom
+    window, or None to chart the full local timeline instead."""
+    try:
+        return _fetch_timeline_window(cache_key, user_id, analysis_id, window)
+    except TimelineUnavailable:
+        return None
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def build_timeline_figure(cache_key: str, window, resolution, _timeline_data: List[Dict], _series=None):
+    """cache_data, not cache_resource: every session and rerun gets its own
+    copy of the figure, so changes to it don't leak between sessions."""
+    return show_sentiment_timeline(_timeline_data, _series)
+
+def show_analysis_results(results, cache_key=None, analysis_ref=None):
+    """Display complete analysis results. analysis_ref is the stored
+    analysis' (user_id, analysis_id), used to fetch long timelines by window."""
     # Display metrics
     col1, col2, col3 = st.columns(3)
     
@@ -565,10 +619,24 @@ def show_analysis_results(results):
     
     with tab1:
         if timeline:
-            st.plotly_chart(
-                show_sentiment_timeline(timeline),
-                use_container_width=True
+            pyramid = results.get('timeline_pyramid')
+            window, series = None, None
+            if pyramid and pyramid['duration'] > 0 and analysis_ref is not None:
+                # Narrowing the window swaps in finer resolution detail
+                window = st.slider(
+                    "Zoom (seconds)",
+                    0,
+                    pyramid['duration'],
+                    (0, pyramid['duration']),
+                    key=f"timeline_zoom_{cache_key}"
+                )
+                series = fetch_timeline_window(cache_key, *analysis_ref, window)
+            resolution = (series['resolution'], series['bucket_seconds']) if series else None
+            fig = (
+                build_timeline_figure(cache_key, window, resolution, timeline, series) if cache_key
+                else show_sentiment_timeline(timeline, series)
             )
+            st.plotly_chart(fig, use_container_width=True)
         
         # Show key phrases
         st.markdown("### 🔑 Key Phrases")
@@ -702,127 +770,120 @@ def main():
                 }
                 st.text(f"Analyzing: {file_details['Filename']}")
                 
-                # Save file
-                storage = FileStorage()
-                filename = storage.save_transcript(
-                    st.session_state.user_id,
-                    uploaded_file,
-                    uploaded_file.name
-                )
+                raw_bytes = uploaded_file.getvalue()
+                digest = upload_digest(raw_bytes)
+                processed = get_processed_uploads()
                 
-                # Parse transcript
-                try:
-                    if uploaded_file.type == "text/plain":
-                        text = uploaded_file.read().decode()
-                        with st.expander("View Raw Transcript"):
-                            st.text(text)
-                        transcript = parse_transcript(text)
-                    else:
-                        transcript = json.load(uploaded_file)
-                    
-                    # Debug view of parsed transcript
-                    with st.expander("View Parsed Transcript"):
-                        st.json(transcript[:5])  # Show first 5 entries
-                    
-                except Exception as e:
-                    st.error(f"Error parsing transcript: {str(e)}")
-                    st.stop()
+                # Save file once per upload, not on every rerun
+                storage = FileStorage()
+                if digest not in processed:
+                    processed[digest] = {
+                        'filename': storage.save_transcript(
+                            st.session_state.user_id,
+                            uploaded_file,
+                            uploaded_file.name
+                        ),
+                        'analysis_saved': False
+                    }
+                    trim_processed_uploads(processed)
+                filename = processed[digest]['filename']
                 
-                if not transcript:
-                    st.error("No valid transcript content found!")
-                    st.stop()
+                # The backend parses the transcript; only show the raw text here
+                if uploaded_file.type == "text/plain":
+                    with st.expander("View Raw Transcript"):
+                        st.text(raw_bytes.decode(errors='replace'))
                 
                 # Analyze transcript
                 with st.spinner("🔍 Analyzing transcript..."):
                     try:
-                        # Get base API URL
-                        base_url = get_api_url()
-                        api_url = f"{base_url}/analyze"
-                        
-                        # Log request details
-                        st.debug(f"Making request to: {api_url}")
-                        
-                        # Make API call with updated headers
-                        response = requests.post(
-                            api_url,
-                            json={'transcript': transcript},
-                            headers={
-                                'Content-Type': 'application/json',
-                                'Accept': 'application/json',
-                                'Origin': 'https://call-sentiment-analysis-production.up.railway.app'
-                            },
-                            timeout=30
+                        api_result = request_analysis(
+                            digest, raw_bytes, uploaded_file.type, st.session_state.user_id
                         )
                         
                         # Debug response
                         with st.expander("Debug: API Response"):
-                            st.write("Request URL:", api_url)
-                            st.write("Request Headers:", {
-                                'Content-Type': 'application/json',
-                                'Accept': 'application/json',
-                                'Origin': 'https://call-sentiment-analysis-production.up.railway.app'
-                            })
-                            st.write("Status Code:", response.status_code)
-                            st.write("Response Headers:", dict(response.headers))
-                            try:
-                                st.json(response.json())
-                            except:
-                                st.text(response.text)
+                            st.write("Backend Replica:", api_result['replica'])
+                            st.write("Request Headers:", API_HEADERS)
+                            st.write("Status Code:", api_result['status_code'])
+                            st.write("Response Headers:", api_result['headers'])
+                            st.json(api_result['results'])
                         
-                        # Handle response
-                        if response.status_code == 200:
-                            try:
-                                results = process_api_response(response.json())
-                                
-                                if results:
-                                    # Save analysis results
+                        try:
+                            results = api_result['results']
+                            
+                            if results:
+                                # Save analysis results once per upload
+                                if not processed[digest]['analysis_saved']:
                                     storage.save_analysis(
                                         st.session_state.user_id,
                                         filename,
                                         results
                                     )
-                                    
-                                    # Show success message
-                                    st.success("✅ Analysis completed successfully!")
-                                    
-                                    # Show results
-                                    show_analysis_results(results)
-                                    
-                                    # Offer download
-                                    st.download_button(
-                                        "💾 Download Analysis Results",
-                                        data=json.dumps(results, indent=2),
-                                        file_name=f"analysis_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-                                        mime="application/json"
-                                    )
-                                else:
-                                    st.error("Error: Received empty results from API")
-                                    st.info("Please try again or contact support if the issue persists.")
-                            except Exception as e:
-                                st.error(f"Error processing API response: {str(e)}")
-                                with st.expander("Debug Details"):
-                                    st.code(traceback.format_exc())
-                        else:
-                            st.error(f"API Error (Status {response.status_code})")
-                            with st.expander("Error Details"):
-                                st.write("Response Headers:", dict(response.headers))
-                                try:
-                                    st.json(response.json())
-                                except:
-                                    st.text(response.text)
-                            
-                            # Provide specific guidance based on status code
-                            if response.status_code == 403:
-                                st.info("""
-                                Access forbidden. This might be due to:
-                                1. CORS configuration issues
-                                2. Missing or invalid authentication
-                                3. Server security settings
-                                """)
-                            elif response.status_code == 404:
-                                st.info("API endpoint not found. Please check the API URL configuration.")
-                            elif response.status_code == 500:
-                                st.info("Server error. Please try again later or contact support.")
+                                    processed[digest]['analysis_saved'] = True
+                                
+                                # Show success message
+                                st.success("✅ Analysis completed successfully!")
+                                
+                                # Show results
+                                show_analysis_results(
+                                    results,
+                                    cache_key=digest,
+                                    analysis_ref=(st.session_state.user_id, os.path.splitext(filename)[0])
+                                )
+                                
+                                # Offer download
+                                st.download_button(
+                                    "💾 Download Analysis Results",
+                                    data=json.dumps(results, indent=2),
+                                    file_name=f"analysis_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+                                    mime="application/json"
+                                )
+                            else:
+                                st.error("Error: Received empty results from API")
+                                st.info("Please try again or contact support if the issue persists.")
+                        except Exception as e:
+                            st.error(f"Error processing API response: {str(e)}")
+                            with st.expander("Debug Details"):
+                                st.code(traceback.format_exc())
+                    
+                    except AnalysisAPIError as e:
+                        st.error(f"API Error (Status {e.status_code})")
+                        with st.expander("Error Details"):
+                            st.write("Response Headers:", e.headers)
+                            try:
+                                st.json(json.loads(e.body))
+                            except:
+                                st.text(e.body)
+                        
+                        # Provide specific guidance based on status code
+                        if e.status_code == 403:
+                            st.info("""
+                            Access forbidden. This might be due to:
+                            1. CORS configuration issues
+                            2. Missing or invalid authentication
+                            3. Server security settings
+                            """)
+                        elif e.status_code == 400:
+                            st.info("The transcript could not be parsed. Please check its format.")
+                        elif e.status_code == 404:
+                            st.info("API endpoint not found. Please check the API URL configuration.")
+                        elif e.status_code in (429, 503):
+                            st.info(
+                                "The analysis service is busy. Please retry in "
+                                f"{e.headers.get('Retry-After', 'a few')} seconds."
+                            )
+                        elif e.status_code == 500:
+                            st.info("Server error. Please try again later or contact support.")
+                        elif e.status_code == 504:
+                            st.info(
+                                f"The analysis did not finish within {API_TIMEOUT} seconds. "
+                                "Please retry in a moment."
+                            )
+                    
+                    except requests.exceptions.ReadTimeout:
+                        # Not retried on another replica: this one may still be scoring it
+                        st.error(f"No response from the analysis service within {API_TIMEOUT} seconds")
+                        st.info("The service is busy or the transcript is very long. Please retry in a moment.")
                             
                     except requests.exceptions.RequestException as e:
                         st.error("Connection Error")
@@ -1,67 +1,166 @@
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+import queue
+from contextlib import contextmanager
 from datetime import datetime
 import os
 
+# Schema migrations, applied in order once per database file and recorded
+# in schema_version so later processes skip them.
+MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS analysis_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            filename TEXT,
+            analysis_data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        '''
+    ]),
+    (2, [
+        'CREATE INDEX IF NOT EXISTS idx_analysis_history_user '
+        'ON analysis_history (user_id, created_at)'
+    ])
+]
+
+PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',  # 16 MB page cache per connection
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA foreign_keys=ON'
+]
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache reuses the compiled form.
+SQL_INSERT_USER = "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)"
+SQL_USER_BY_NAME = "SELECT id, password_hash FROM users WHERE username = ?"
+SQL_USER_BY_EMAIL = "SELECT id FROM users WHERE email = ?"
+SQL_TOUCH_LOGIN = "UPDATE users SET last_login = ? WHERE id = ?"
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 16))
+BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', 30))
+
+class ConnectionPool:
+    """Bounded pool of WAL-mode connections for one database file.
+
+    Streamlit runs every rerun on a fresh thread, so connections are lent
+    out per operation instead of being pinned to threads.
+    """
+    def __init__(self, db_file, size=POOL_SIZE):
+        self.db_file = db_file
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=128
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put_nowait(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction. BEGIN IMMEDIATE takes the write lock up front
+        so concurrent writers queue on busy_timeout instead of deadlocking."""
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def migrate(self):
+        with self.transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+            row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+            current = row[0] or 0
+            for version, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute('INSERT INTO schema_version (version) VALUES (?)', (version,))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_file):
+    """Process-wide pool per database file; migrations run on first use only."""
+    db_file = os.path.abspath(db_file)
+    with _pools_lock:
+        pool = _pools.get(db_file)
+        if pool is None:
+            os.makedirs(os.path.dirname(db_file), exist_ok=True)
+            pool = ConnectionPool(db_file)
+            pool.migrate()
+            _pools[db_file] = pool
+        return pool
+
 class Database:
-    def __init__(self, db_file="data/users.db"):
+    def __init__(self, db_file=os.path.join(os.getenv('DATA_DIR', 'data'), 'users.db')):
         self.db_file = db_file
-        os.makedirs(os.path.dirname(db_file), exist_ok=True)
-        self.init_db()
-
-    def init_db(self):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS analysis_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    filename TEXT,
-                    analysis_data TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            conn.commit()
+        self.pool = get_pool(db_file)
 
     def add_user(self, username, email, password):
+        from werkzeug.security import generate_password_hash
+        password_hash = generate_password_hash(password)
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
-                    (username, email, generate_password_hash(password))
-                )
-                conn.commit()
+            with self.pool.transaction() as conn:
+                conn.execute(SQL_INSERT_USER, (username, email, password_hash))
                 return True
         except sqlite3.IntegrityError:
             return False
 
     def verify_user(self, username, password):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, password_hash FROM users WHERE username = ?", 
-                (username,)
-            )
-            result = cursor.fetchone()
-            
-            if result and check_password_hash(result[1], password):
-                cursor.execute(
-                    "UPDATE users SET last_login = ? WHERE id = ?",
-                    (datetime.now(), result[0])
-                )
-                conn.commit()
-                return result[0]
+        from werkzeug.security import check_password_hash
+        with self.pool.connection() as conn:
+            result = conn.execute(SQL_USER_BY_NAME, (username,)).fetchone()
+
+        # Hash check happens outside any transaction to keep the write lock short
+        if result and check_password_hash(result[1], password):
+            with self.pool.transaction() as conn:
+                conn.execute(SQL_TOUCH_LOGIN, (datetime.now(), result[0]))
+            return result[0]
         return None
 
+    def get_user_by_email(self, email):
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_USER_BY_EMAIL, (email,)).fetchone()
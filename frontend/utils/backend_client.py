@@ -0,0 +1,184 @@
+"""Routes backend calls across replicas by consistent hashing.
+
+The same transcript always goes to the same replica, so per-process
+caches on the backend keep hitting. Each replica owns many points on a
+hash ring, so adding or removing one moves only about 1/N of the keys.
+Replicas that fail are skipped and their keys fall through to the next
+replica on the ring until a health check brings them back.
+
+    BACKEND_URLS=http://localhost:8081,http://localhost:8082 \\
+        python -m utils.backend_client --keys 10000
+"""
+import os
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import requests
+
+VIRTUAL_NODES = 160
+HEALTH_INTERVAL = float(os.getenv('BACKEND_HEALTH_INTERVAL', 10))
+HEALTH_TIMEOUT = 2
+# Statuses that mean "try another replica" rather than "this request is bad".
+# Not 504: the backend sends it once our own deadline has passed, and the
+# replica is healthy, just busy.
+FAILOVER_STATUSES = (502, 503)
+
+def backend_urls() -> List[str]:
+    """BACKEND_URLS (comma-separated), falling back to the single BACKEND_URL."""
+    urls = os.getenv('BACKEND_URLS') or os.getenv(
+        'BACKEND_URL', 'http://call-sentiment-analysis.railway.internal:8080'
+    )
+    return [url.strip().rstrip('/') for url in urls.split(',') if url.strip()]
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+class HashRing:
+    def __init__(self, nodes: List[str], virtual_nodes: int = VIRTUAL_NODES):
+        self.nodes = list(dict.fromkeys(nodes))
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def preference(self, key: str) -> List[str]:
+        """Distinct nodes in ring order starting at the key's position."""
+        if not self.nodes:
+            return []
+        start = bisect.bisect(self._hashes, _hash(key))
+        ordered = []
+        for i in range(len(self._owners)):
+            node = self._owners[(start + i) % len(self._owners)]
+            if node not in ordered:
+                ordered.append(node)
+                if len(ordered) == len(self.nodes):
+                    break
+        return ordered
+
+    def owner(self, key: str) -> Optional[str]:
+        nodes = self.preference(key)
+        return nodes[0] if nodes else None
+
+class ReplicaHealth:
+    """Passive marking on failed requests, active /healthz probes in the background."""
+    def __init__(self, urls: List[str], interval: float = HEALTH_INTERVAL):
+        self.interval = interval
+        self._down: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._urls = urls
+        if interval > 0:
+            threading.Thread(target=self._probe_loop, name='backend-health', daemon=True).start()
+
+    def healthy(self, url: str) -> bool:
+        with self._lock:
+            return url not in self._down
+
+    def mark_down(self, url: str, reason: str):
+        with self._lock:
+            if url not in self._down:
+                logging.warning(f"Backend replica {url} marked down: {reason}")
+            self._down[url] = time.monotonic()
+
+    def mark_up(self, url: str):
+        with self._lock:
+            if self._down.pop(url, None) is not None:
+                logging.info(f"Backend replica {url} is back")
+
+    def probe(self, url: str) -> bool:
+        try:
+            ok = requests.get(f"{url}/healthz", timeout=HEALTH_TIMEOUT).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        if ok:
+            self.mark_up(url)
+        else:
+            self.mark_down(url, 'health check failed')
+        return ok
+
+    def _probe_loop(self):
+        while True:
+            for url in self._urls:
+                self.probe(url)
+            time.sleep(self.interval)
+
+    def snapshot(self) -> Dict[str, bool]:
+        with self._lock:
+            return {url: url not in self._down for url in self._urls}
+
+class BackendClient:
+    def __init__(self, urls: Optional[List[str]] = None, health_interval: float = HEALTH_INTERVAL):
+        self.urls = urls or backend_urls()
+        self.ring = HashRing(self.urls)
+        self.health = ReplicaHealth(self.urls, health_interval)
+
+    def route(self, key: str) -> List[str]:
+        """Replicas to try for a key: healthy ones in ring order, then the
+        rest in case every replica is marked down."""
+        ordered = self.ring.preference(key)
+        healthy = [url for url in ordered if self.health.healthy(url)]
+        return healthy + [url for url in ordered if url not in healthy]
+
+    def request(self, method: str, path: str, key: str, **kwargs) -> Tuple[requests.Response, str]:
+        """Send to the key's replica, failing over along the ring when it
+        can't be reached. Returns (response, replica url); re-raises the last
+        connection error. A read timeout is raised straight away: the replica
+        may still be working on the request, and /analyze isn't idempotent."""
+        last_error = None
+        overloaded = None
+        for url in self.route(key):
+            try:
+                response = requests.request(method, f"{url}{path}", **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                # Includes ConnectTimeout: nothing reached the replica
+                self.health.mark_down(url, type(e).__name__)
+                last_error = e
+                continue
+            if response.status_code in FAILOVER_STATUSES:
+                overloaded = (response, url)
+                continue
+            self.health.mark_up(url)
+            return response, url
+        if overloaded is not None:
+            return overloaded
+        raise last_error or requests.exceptions.ConnectionError('No backend replicas configured')
+
+    def post(self, path: str, key: str, **kwargs) -> Tuple[requests.Response, str]:
+        return self.request('POST', path, key, **kwargs)
+
+    def get(self, path: str, key: str, **kwargs) -> Tuple[requests.Response, str]:
+        return self.request('GET', path, key, **kwargs)
+
+def main():
+    import argparse
+    from collections import Counter
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=10000, help='synthetic keys to place')
+    parser.add_argument('--probe', action='store_true', help='health-check every replica')
+    args = parser.parse_args()
+
+    urls = backend_urls()
+    ring = HashRing(urls)
+    keys = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(args.keys)]
+    owners = {key: ring.owner(key) for key in keys}
+    print(f"{len(urls)} replicas, {args.keys} keys")
+    for url, count in sorted(Counter(owners.values()).items()):
+        print(f"  {url}: {count / args.keys:.1%}")
+
+    if len(urls) > 1:
+        smaller = HashRing(urls[:-1])
+        moved = sum(owners[key] != smaller.owner(key) for key in keys)
+        print(f"Removing {urls[-1]} moves {moved / args.keys:.1%} of keys "
+              f"(ideal {1 / len(urls):.1%})")
+    if args.probe:
+        health = ReplicaHealth(urls, interval=0)
+        for url in urls:
+            print(f"  {url}: {'up' if health.probe(url) else 'down'}")
+
+if __name__ == '__main__':
+    main()
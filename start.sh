@@ -59,13 +59,19 @@ trap cleanup SIGTERM SIGINT
 log "Starting services..."
 
 # Create necessary directories
-mkdir -p data
-log "Created data directory"
+# Absolute, since each service runs from its own directory
+export DATA_DIR="${DATA_DIR:-$(pwd)/data}"
+mkdir -p "$DATA_DIR"
+log "Created data directory $DATA_DIR"
 
 # Start backend service
 cd backend
 log "Starting backend service on port $FLASK_PORT..."
-python app.py &
+if [ "$BACKEND_SERVER" = "asgi" ]; then
+    python asgi.py &
+else
+    python app.py &
+fi
 BACKEND_PID=$!
 cd ..
 